@@ -2,6 +2,9 @@
 ASGI config for BibleTrivia project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. uvicorn or daphne) for the streaming
+endpoints such as the live challenge scoreboard (``challenges/<pk>/live/``),
+which hold one connection per viewer without tying up a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -83,6 +83,16 @@ DATABASES = {
     }
 }
 
+# Cache shared by every worker process: quiz answer keys, question pools
+# and leaderboard snapshots are invalidated by version bumps that all
+# workers must see. Create the table with `python manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'trivia_cache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
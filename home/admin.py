@@ -6,9 +6,11 @@ from .models import (
     CompetitionVenue, CompetitionScheduleItem, CompetitionSponsor, CompetitionPolicy,
     CompetitionFAQ, CompetitionResource, CompetitionSocialLink, UserRanking,
     Challenge, ChallengeParticipant, ChallengeRound, ChallengeRoundAttempt,
+    Tournament, TournamentEntrant, TournamentMatch,
     TestQuiz, TestQuizAttempt, GroupTestQuizAttempt
 )
 from .forms import CompetitionRegistrationWindowForm, CompetitionScheduleItemForm
+from .rescoring import rescore_quiz
 admin.site.register(Question)
 admin.site.register(QuestionCategory)
 admin.site.register(ActivityCategory)
@@ -24,6 +26,16 @@ class TestQuizAdmin(admin.ModelAdmin):
     list_filter = ('difficulty', 'quiz_type', 'participation', 'level', 'is_active')
     search_fields = ('name', 'slug', 'description')
     ordering = ('name',)
+    actions = ('rescore_attempts',)
+
+    @admin.action(description='Re-score stored attempts against current answers')
+    def rescore_attempts(self, request, queryset):
+        responses = attempts = 0
+        for quiz in queryset:
+            result = rescore_quiz(quiz)
+            responses += result.responses_changed
+            attempts += result.attempts_changed
+        self.message_user(request, f'Re-scored {responses} responses across {attempts} attempts.')
 
 @admin.register(TestQuizAttempt)
 class TestQuizAttemptAdmin(admin.ModelAdmin):
@@ -71,6 +83,27 @@ class ChallengeRoundAttemptAdmin(admin.ModelAdmin):
         'user_attempt__quiz__name', 'group_attempt__quiz__name'
     )
     autocomplete_fields = ('challenge', 'round', 'participant', 'user_attempt', 'group_attempt')
+
+class TournamentEntrantInline(admin.TabularInline):
+    model = TournamentEntrant
+    extra = 0
+    fields = ('seed', 'user', 'group', 'wins', 'losses', 'byes', 'eliminated')
+    readonly_fields = fields
+    can_delete = False
+
+@admin.register(Tournament)
+class TournamentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'mode', 'format', 'status', 'current_stage', 'stages', 'created_by', 'created_at')
+    list_filter = ('mode', 'format', 'status')
+    search_fields = ('name', 'created_by__username')
+    inlines = (TournamentEntrantInline,)
+
+@admin.register(TournamentMatch)
+class TournamentMatchAdmin(admin.ModelAdmin):
+    list_display = ('tournament', 'stage', 'position', 'entrant_a', 'entrant_b', 'winner', 'challenge', 'completed_at')
+    list_filter = ('tournament',)
+    ordering = ('tournament', 'stage', 'position')
+    raw_id_fields = ('challenge', 'entrant_a', 'entrant_b', 'winner', 'next_match')
 @admin.register(CompetitionMedia)
 class CompetitionMediaAdmin(admin.ModelAdmin):
     list_display = ('competition', 'title', 'media_type', 'intro_media', 'order', 'is_active', 'created_at')
@@ -0,0 +1,409 @@
+"""
+Tournament brackets built from ordinary challenges.
+
+``create_tournament`` seeds users or groups into one of three formats and
+writes every challenge, round, participant and match it can already
+determine with bulk inserts in a single transaction:
+
+- single elimination: the whole bracket up front, seeded so that 1 meets 2
+  at the earliest in the final; top seeds get byes when the field is not a
+  power of two;
+- round robin: every pairing (circle method), one stage per round;
+- Swiss: the first stage (top half against bottom half); later stages are
+  paired by record, avoiding rematches, when the previous stage finishes.
+
+Every match round is played on the tournament's quiz, or with one quiz per
+round, on the quiz of its round number (kept in the tournament's metadata
+so that Swiss stages paired later use the same quizzes).
+
+Stages are played in order. Round-robin stages are all written up front, but
+only the current stage's matches open; the next stage opens when every
+match of the current one has a winner. A single-elimination match opens as
+soon as both its entrants have won their way in. A player therefore never
+has two matches open at once, and one quiz session only ever counts toward
+one of them.
+
+Each match is a two-participant Challenge. When that challenge is marked
+completed, ``advance_challenge`` (wired in ``home.signals``) records the
+winner, moves them into their next match and closes stages and the
+tournament.
+"""
+import math
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    Challenge, ChallengeParticipant, ChallengeRound, TestQuiz, Tournament, TournamentEntrant, TournamentMatch,
+    TriviaGroup,
+)
+from .standings import compute_standings, valid_participants
+from .visibility import refresh_challenge_visibility
+
+
+class BracketError(Exception):
+    """The tournament cannot be generated from the given entrants or options."""
+
+
+def seed_order(size):
+    """Seeds in bracket slot order for a power-of-two ``size``, e.g. 8 -> 1 8 4 5 2 7 3 6."""
+    order = [1]
+    while len(order) < size:
+        mirror = len(order) * 2 + 1
+        order = [s for seed in order for s in (seed, mirror - seed)]
+    return order
+
+
+def round_robin_schedule(seeds):
+    """Split all pairings of ``seeds`` into stages (circle method); None marks a bye."""
+    seeds = list(seeds)
+    if len(seeds) % 2:
+        seeds.append(None)
+    n = len(seeds)
+    stages = []
+    for _ in range(n - 1):
+        stages.append([(seeds[i], seeds[n - 1 - i]) for i in range(n // 2)])
+        seeds = [seeds[0], seeds[-1], *seeds[1:-1]]
+    return stages
+
+
+def swiss_pairings(ranked, played, had_bye):
+    """
+    Pair entrant ids listed best first. Each takes the best-ranked opponent
+    it has not met yet (or the next one if it has met them all); with an odd
+    field the lowest-ranked entrant without a bye sits out.
+    """
+    ranked = list(ranked)
+    bye = None
+    if len(ranked) % 2:
+        bye = next((e for e in reversed(ranked) if e not in had_bye), ranked[-1])
+        ranked.remove(bye)
+    pairs = []
+    while ranked:
+        a = ranked.pop(0)
+        b = next((e for e in ranked if frozenset((a, e)) not in played), ranked[0])
+        ranked.remove(b)
+        pairs.append((a, b))
+    if bye is not None:
+        pairs.append((bye, None))
+    return pairs
+
+
+def _ready_status(tournament, now):
+    """Status for a match challenge of the current stage whose two entrants are known."""
+    return 'pending' if tournament.scheduled_at and tournament.scheduled_at > now else 'active'
+
+
+def _open_stage(tournament, stage, now):
+    """Open the pending matches of ``stage`` whose two entrants are known."""
+    ready = tournament.matches.filter(stage=stage, entrant_a__isnull=False, entrant_b__isnull=False)
+    Challenge.objects.filter(pk__in=ready.values('challenge_id'), status='pending').update(
+        status=_ready_status(tournament, now), updated_at=now,
+    )
+
+
+def _round_quiz_ids(tournament):
+    """Quiz id of each match round, by round number."""
+    quiz_ids = (tournament.metadata or {}).get('quiz_ids') or [None]
+    rounds = tournament.best_of or 1
+    return {i: quiz_ids[(i - 1) % len(quiz_ids)] for i in range(1, rounds + 1)}
+
+
+def _save_matches(tournament, matches, entrants):
+    """
+    Bulk-create the challenge, rounds and participants of every match that
+    is not a bye, then the matches themselves.
+    """
+    now = timezone.now()
+    quiz_ids = _round_quiz_ids(tournament)
+    playable = [m for m in matches if m.winner_id is None]
+    challenges = Challenge.objects.bulk_create([
+        Challenge(
+            name=f'{tournament.name} - Stage {m.stage}, Match {m.position}',
+            mode=tournament.mode,
+            status=(
+                _ready_status(tournament, now)
+                if m.entrant_a_id and m.entrant_b_id and m.stage == tournament.current_stage else 'pending'
+            ),
+            scheduled_at=tournament.scheduled_at,
+            best_of=tournament.best_of,
+            max_participants=2,
+            created_by_id=tournament.created_by_id,
+            metadata={'tournament_id': tournament.pk, 'stage': m.stage, 'position': m.position},
+        )
+        for m in playable
+    ])
+    for match, challenge in zip(playable, challenges):
+        match.challenge = challenge
+    ChallengeRound.objects.bulk_create([
+        ChallengeRound(challenge=challenge, round_number=i, quiz_id=quiz_id)
+        for challenge in challenges
+        for i, quiz_id in quiz_ids.items()
+    ])
+    ChallengeParticipant.objects.bulk_create([
+        _participant(match.challenge, entrants[entrant_id], role, now)
+        for match in playable
+        for entrant_id, role in ((match.entrant_a_id, 'challenger'), (match.entrant_b_id, 'invitee'))
+        if entrant_id
+    ])
+    TournamentMatch.objects.bulk_create(matches)
+    # Bulk inserts send no post_save, so index the new challenges explicitly
+    transaction.on_commit(partial(refresh_challenge_visibility, *[c.pk for c in challenges]))
+    return matches
+
+
+def _participant(challenge, entrant, role, now):
+    return ChallengeParticipant(
+        challenge=challenge, user_id=entrant.user_id, group_id=entrant.group_id,
+        role=role, is_active=True, joined_at=now,
+    )
+
+
+def _single_elimination(tournament, entrants):
+    by_seed = {e.seed: e for e in entrants}
+    size = 2 ** math.ceil(math.log2(len(entrants)))
+    stages = int(math.log2(size))
+    slots = {
+        (stage, position): [None, None]
+        for stage in range(1, stages + 1)
+        for position in range(1, size // 2 ** stage + 1)
+    }
+    order = seed_order(size)
+    byes = []
+    for position in range(1, size // 2 + 1):
+        a, b = by_seed.get(order[2 * position - 2]), by_seed.get(order[2 * position - 1])
+        slots[(1, position)] = [a, b]
+        if b is None:
+            # The better seed always takes the first slot, so a bye is always b
+            byes.append(a.pk)
+            slots[(2, (position + 1) // 2)][(position - 1) % 2] = a
+
+    now = timezone.now()
+    by_pk = {e.pk: e for e in entrants}
+    created = {}
+    # Later stages first, so every match can point at its already-saved next match
+    for stage in range(stages, 0, -1):
+        matches = []
+        for position in range(1, size // 2 ** stage + 1):
+            a, b = slots[(stage, position)]
+            match = TournamentMatch(tournament=tournament, stage=stage, position=position, entrant_a=a, entrant_b=b)
+            if stage < stages:
+                match.next_match = created[(stage + 1, (position + 1) // 2)]
+                match.next_slot = 'a' if position % 2 else 'b'
+            if stage == 1 and b is None:
+                match.winner, match.completed_at = a, now
+            matches.append(match)
+        _save_matches(tournament, matches, by_pk)
+        created.update({(stage, m.position): m for m in matches})
+    if byes:
+        TournamentEntrant.objects.filter(pk__in=byes).update(byes=F('byes') + 1)
+    return stages
+
+
+def _round_robin(tournament, entrants):
+    by_seed = {e.seed: e for e in entrants}
+    schedule = round_robin_schedule(sorted(by_seed))
+    matches = []
+    for stage, pairings in enumerate(schedule, start=1):
+        games = [(a, b) for a, b in pairings if a is not None and b is not None]
+        for position, (a, b) in enumerate(games, start=1):
+            matches.append(TournamentMatch(
+                tournament=tournament, stage=stage, position=position,
+                entrant_a=by_seed[min(a, b)], entrant_b=by_seed[max(a, b)],
+            ))
+    _save_matches(tournament, matches, {e.pk: e for e in entrants})
+    return len(schedule)
+
+
+def _swiss_stage(tournament, stage, pairs, entrants):
+    """Save one Swiss stage from (entrant_id, entrant_id or None) pairs; byes count as wins."""
+    now = timezone.now()
+    matches = [
+        TournamentMatch(
+            tournament=tournament, stage=stage, position=position,
+            entrant_a_id=a, entrant_b_id=b,
+            winner_id=a if b is None else None,
+            completed_at=now if b is None else None,
+        )
+        for position, (a, b) in enumerate(pairs, start=1)
+    ]
+    _save_matches(tournament, matches, entrants)
+    byes = [a for a, b in pairs if b is None]
+    if byes:
+        TournamentEntrant.objects.filter(pk__in=byes).update(wins=F('wins') + 1, byes=F('byes') + 1)
+    return matches
+
+
+def _swiss(tournament, entrants, stages):
+    ranked = [e.pk for e in entrants]
+    half = len(ranked) // 2
+    pairs = list(zip(ranked[:half], ranked[half:2 * half]))
+    if len(ranked) % 2:
+        pairs.append((ranked[-1], None))
+    _swiss_stage(tournament, 1, pairs, {e.pk: e for e in entrants})
+    return stages or math.ceil(math.log2(len(entrants)))
+
+
+def create_tournament(name, mode, format, entrants, created_by, quizzes, best_of=None, stages=None,
+                      scheduled_at=None):
+    """
+    Create a tournament and its generated matches. ``entrants`` are users
+    (individual mode) or TriviaGroups (group mode), best seed first;
+    ``quizzes`` is the quiz every round is played on, or one quiz per round
+    of a match; ``stages`` sets the number of Swiss rounds (default log2 of
+    the field).
+    """
+    entrants = list(entrants)
+    quizzes = [quizzes] if isinstance(quizzes, TestQuiz) else list(quizzes)
+    if format not in dict(Tournament.FORMAT_CHOICES):
+        raise BracketError(f'Unknown tournament format: {format}')
+    if mode not in dict(Challenge.MODE_CHOICES):
+        raise BracketError(f'Unknown mode: {mode}')
+    if len(entrants) < 2:
+        raise BracketError('A tournament needs at least two entrants.')
+    if len({e.pk for e in entrants}) != len(entrants):
+        raise BracketError('Each entrant may only be seeded once.')
+    if any(isinstance(e, TriviaGroup) != (mode == 'group') for e in entrants):
+        raise BracketError('Group tournaments take groups only; individual tournaments take users only.')
+    if best_of is not None and (best_of <= 0 or best_of % 2 == 0):
+        raise BracketError('best_of should be a positive odd number.')
+    if len(quizzes) not in {1, best_of or 1}:
+        raise BracketError('Give one quiz for every round, or one quiz per round of a match.')
+    if stages is not None and format == 'swiss' and not 1 <= stages < len(entrants):
+        raise BracketError('A Swiss tournament needs between 1 and (entrants - 1) stages.')
+
+    with transaction.atomic():
+        tournament = Tournament.objects.create(
+            name=name, mode=mode, format=format, best_of=best_of,
+            scheduled_at=scheduled_at, created_by=created_by,
+            metadata={'quiz_ids': [quiz.pk for quiz in quizzes]},
+        )
+        owner = 'group' if mode == 'group' else 'user'
+        entrants = TournamentEntrant.objects.bulk_create([
+            TournamentEntrant(tournament=tournament, seed=seed, **{owner: entrant})
+            for seed, entrant in enumerate(entrants, start=1)
+        ])
+        if format == 'single_elimination':
+            tournament.stages = _single_elimination(tournament, entrants)
+        elif format == 'round_robin':
+            tournament.stages = _round_robin(tournament, entrants)
+        else:
+            tournament.stages = _swiss(tournament, entrants, stages)
+        tournament.save(update_fields=['stages'])
+        return tournament
+
+
+def match_winner(match):
+    """
+    Decide a finished match: most rounds won, then total score, then the
+    shorter total time; a full tie goes to the better seed.
+    """
+    entrants = [e for e in (match.entrant_a, match.entrant_b) if e is not None]
+    if len(entrants) < 2 or match.challenge is None:
+        return entrants[0] if entrants else None
+    challenge = match.challenge
+    owner = 'group_id' if challenge.mode == 'group' else 'user_id'
+    participants = list(valid_participants(challenge))
+    standings, round_results = compute_standings(challenge, participants, list(challenge.rounds.all()))
+    rounds_won = defaultdict(int)
+    for result in round_results:
+        if result['best_score']:
+            for participant in result['winners']:
+                rounds_won[participant.pk] += 1
+    record = {
+        getattr(row['participant'], owner): (
+            rounds_won[row['participant'].pk], row['total_score'], -row['total_time'],
+        )
+        for row in standings
+    }
+    return max(entrants, key=lambda e: (*record.get(getattr(e, owner), (0, 0, -math.inf)), -e.seed))
+
+
+def _ranked_entrant_ids(tournament):
+    return list(
+        tournament.entrants.order_by('-wins', 'losses', 'seed').values_list('pk', flat=True)
+    )
+
+
+def _place_in_next_match(match, winner, now):
+    next_match = TournamentMatch.objects.select_related('tournament', 'challenge').get(pk=match.next_match_id)
+    setattr(next_match, f'entrant_{match.next_slot}', winner)
+    next_match.save(update_fields=[f'entrant_{match.next_slot}_id'])
+    if next_match.challenge_id is None:
+        return
+    # A regular save: visibility and standings pick the new participant up
+    _participant(next_match.challenge, winner, 'challenger' if match.next_slot == 'a' else 'invitee', now).save()
+    if next_match.entrant_a_id and next_match.entrant_b_id:
+        Challenge.objects.filter(pk=next_match.challenge_id, status='pending').update(
+            status=_ready_status(next_match.tournament, now), updated_at=now,
+        )
+
+
+def _close_stage(tournament, stage, now):
+    """Move the tournament on once every match of ``stage`` has a winner."""
+    if tournament.matches.filter(stage=stage, winner__isnull=True).exists():
+        return
+    if tournament.format == 'swiss' and stage < tournament.stages:
+        # The conditional update makes sure only one finishing match pairs the next stage
+        if Tournament.objects.filter(pk=tournament.pk, current_stage=stage).update(current_stage=stage + 1, updated_at=now):
+            played = {
+                frozenset((a, b))
+                for a, b in tournament.matches.filter(entrant_b__isnull=False).values_list('entrant_a_id', 'entrant_b_id')
+            }
+            had_bye = set(tournament.matches.filter(entrant_b__isnull=True).values_list('entrant_a_id', flat=True))
+            entrants = {e.pk: e for e in tournament.entrants.all()}
+            pairs = swiss_pairings(_ranked_entrant_ids(tournament), played, had_bye)
+            tournament.current_stage = stage + 1
+            _swiss_stage(tournament, stage + 1, pairs, entrants)
+        return
+    if tournament.matches.filter(winner__isnull=True).exists():
+        if Tournament.objects.filter(pk=tournament.pk, current_stage__lte=stage).update(
+            current_stage=stage + 1, updated_at=now,
+        ):
+            _open_stage(tournament, stage + 1, now)
+        return
+    if tournament.format == 'single_elimination':
+        winner_id = tournament.matches.get(stage=tournament.stages).winner_id
+    else:
+        winner_id = _ranked_entrant_ids(tournament)[0]
+    Tournament.objects.filter(pk=tournament.pk, status='active').update(
+        status='completed', winner_id=winner_id, current_stage=tournament.stages, updated_at=now,
+    )
+
+
+def advance_challenge(challenge_id):
+    """
+    Record the result of a completed tournament challenge and advance the
+    bracket. Safe to call more than once; returns the winning entrant of
+    this call, or None if there was nothing to record.
+    """
+    match = (
+        TournamentMatch.objects
+        .select_related('tournament', 'challenge', 'entrant_a', 'entrant_b')
+        .filter(challenge_id=challenge_id, winner__isnull=True, tournament__status='active')
+        .first()
+    )
+    if match is None:
+        return None
+    winner = match_winner(match)
+    if winner is None:
+        return None
+    now = timezone.now()
+    with transaction.atomic():
+        # Claim the match first; a concurrent call for the same challenge stops here
+        if not TournamentMatch.objects.filter(pk=match.pk, winner__isnull=True).update(winner=winner, completed_at=now):
+            return None
+        TournamentEntrant.objects.filter(pk=winner.pk).update(wins=F('wins') + 1)
+        loser = match.entrant_b if winner.pk == match.entrant_a_id else match.entrant_a
+        if loser is not None:
+            TournamentEntrant.objects.filter(pk=loser.pk).update(
+                losses=F('losses') + 1,
+                eliminated=match.tournament.format == 'single_elimination',
+            )
+        if match.next_match_id:
+            _place_in_next_match(match, winner, now)
+        _close_stage(match.tournament, match.stage, now)
+    return winner
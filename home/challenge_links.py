@@ -0,0 +1,130 @@
+"""
+Linking of quiz attempts to the challenge rounds they were taken for.
+
+When an attempt completes, the taker's active participations are looked
+up (by user for individual challenges, by group for group challenges) and,
+in each of those challenges, the lowest-numbered open round that uses the
+attempt's quiz and that the participant has not played yet gets a
+ChallengeRoundAttempt row in the same transaction. One attempt therefore
+fills at most one round per challenge, however many rounds share its quiz.
+The unique (participant, round) constraint drops a link racing in from a
+concurrent submission for the same round. Standings are then refreshed by
+the attempt_completed receiver.
+"""
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    ChallengeParticipant, ChallengeRound, ChallengeRoundAttempt,
+    TestQuizAttempt, GroupTestQuizAttempt,
+)
+
+
+def _taker(attempt):
+    """Return (challenge mode, participant lookup, link attempt field) for an attempt."""
+    if isinstance(attempt, GroupTestQuizAttempt):
+        return 'group', {'group_id': attempt.group_id}, 'group_attempt'
+    return 'individual', {'user_id': attempt.user_id}, 'user_attempt'
+
+
+def link_attempt_to_rounds(attempt, now=None):
+    """Link a completed attempt to the next open round of each of its taker's challenges; returns the links."""
+    now = now or timezone.now()
+    mode, lookup, attempt_field = _taker(attempt)
+    if not all(lookup.values()):
+        return []
+    participants = dict(
+        ChallengeParticipant.objects
+        .filter(
+            is_active=True,
+            challenge__status='active',
+            challenge__mode=mode,
+            **lookup,
+        )
+        .filter(Q(challenge__expires_at__isnull=True) | Q(challenge__expires_at__gt=now))
+        .values_list('challenge_id', 'pk')
+    )
+    if not participants:
+        return []
+    rounds = list(
+        ChallengeRound.objects
+        .filter(challenge_id__in=list(participants), quiz_id=attempt.quiz_id, completed_at__isnull=True)
+        .filter(Q(started_at__isnull=True) | Q(started_at__lte=now))
+        .exclude(linked_attempts__participant_id__in=list(participants.values()))
+        .order_by('round_number')
+        .values_list('challenge_id', 'pk')
+    )
+    next_round = {}
+    for challenge_id, round_id in rounds:
+        next_round.setdefault(challenge_id, round_id)
+    links = [
+        ChallengeRoundAttempt(
+            challenge_id=challenge_id,
+            round_id=round_id,
+            participant_id=participants[challenge_id],
+            **{attempt_field: attempt},
+        )
+        for challenge_id, round_id in next_round.items()
+    ]
+    # A concurrent submission that claimed the same round keeps it
+    return ChallengeRoundAttempt.objects.bulk_create(links, ignore_conflicts=True)
+
+
+def backfill_challenge_links(challenge):
+    """
+    Link historical completed attempts to a challenge's rounds.
+
+    For every round with a quiz, in round order, each participant's
+    earliest completed attempt on that quiz inside the round's window
+    (round start, else the challenge's schedule or creation, up to the
+    round's completion or the challenge's expiry) that is not linked to
+    another round of the challenge is linked, unless the participant
+    already has a link for the round. One attempt query per round; links
+    are bulk inserted. Returns the number of links created.
+    """
+    participants = list(
+        challenge.participants.filter(
+            **({'user__isnull': False} if challenge.mode == 'individual' else {'group__isnull': False})
+        ).values_list('pk', 'user_id', 'group_id')
+    )
+    if not participants:
+        return 0
+    if challenge.mode == 'individual':
+        attempt_model, owner_field, attempt_field = TestQuizAttempt, 'user_id', 'user_attempt'
+        participant_by_owner = {user_id: pk for pk, user_id, _ in participants}
+    else:
+        attempt_model, owner_field, attempt_field = GroupTestQuizAttempt, 'group_id', 'group_attempt'
+        participant_by_owner = {group_id: pk for pk, _, group_id in participants}
+
+    already_linked = set()
+    used_attempts = set()
+    existing = ChallengeRoundAttempt.objects.filter(challenge=challenge)
+    for participant_id, round_id, attempt_id in existing.values_list('participant_id', 'round_id', attempt_field):
+        already_linked.add((participant_id, round_id))
+        used_attempts.add(attempt_id)
+    links = []
+    for rnd in challenge.rounds.filter(quiz__isnull=False):
+        window = Q(created_at__gte=rnd.started_at or challenge.scheduled_at or challenge.created_at)
+        end = rnd.completed_at or challenge.expires_at
+        if end:
+            window &= Q(created_at__lte=end)
+        attempts = (
+            attempt_model.objects
+            .filter(window, quiz_id=rnd.quiz_id, status='completed', **{f'{owner_field}__in': list(participant_by_owner)})
+            .order_by('created_at', 'pk')
+            .values_list('pk', owner_field)
+        )
+        for attempt_id, owner_id in attempts:
+            participant_id = participant_by_owner[owner_id]
+            if (participant_id, rnd.pk) in already_linked or attempt_id in used_attempts:
+                continue
+            already_linked.add((participant_id, rnd.pk))
+            used_attempts.add(attempt_id)
+            links.append(ChallengeRoundAttempt(
+                challenge=challenge,
+                round=rnd,
+                participant_id=participant_id,
+                **{f'{attempt_field}_id': attempt_id},
+            ))
+    ChallengeRoundAttempt.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+    return len(links)
@@ -0,0 +1,124 @@
+"""
+ChurchRanking: each church's competitive standing rolled up from its groups.
+
+Points and penalty follow GroupRanking incrementally: every group delta is
+added to its church's row with the same insert-or-ignore and F() UPDATE
+(see ``home.rankings``), and challenge wins are counted as groups win
+(``home.ratings``). Active groups, members and the mean rating of rated
+groups are re-derived for the affected churches when groups, memberships
+or group ratings change (``home.signals``). ``rebuild_church_rankings``
+recomputes every church from one grouped query over the groups.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Church, ChurchRanking, TriviaGroup
+
+
+_ROLLUP_FIELDS = ['points', 'penalty', 'active_groups', 'members', 'challenge_wins', 'rating']
+
+
+def _rollup(church_ids=None):
+    """Map church id -> rollup field values, in one grouped query."""
+    members = (
+        get_user_model().objects
+        .filter(trivia_groups__church_id=OuterRef('church_id'))
+        .order_by()
+        .values('trivia_groups__church_id')
+        .annotate(count=Count('pk', distinct=True))
+        .values('count')
+    )
+    groups = TriviaGroup.objects.all()
+    if church_ids is not None:
+        groups = groups.filter(church_id__in=list(church_ids))
+    rows = (
+        groups
+        .order_by()
+        .values('church_id')
+        .annotate(
+            points=Coalesce(Sum('ranking__points'), 0),
+            penalty=Coalesce(Sum('ranking__penalty'), 0),
+            active_groups=Count('pk', filter=Q(is_active=True)),
+            members=Coalesce(Subquery(members, output_field=IntegerField()), 0),
+            challenge_wins=Coalesce(Sum('wins'), 0),
+            rating=Avg('ranking__rating', filter=Q(ranking__rated_challenges__gt=0)),
+        )
+    )
+    return {row.pop('church_id'): row for row in rows}
+
+
+def _store(church_ids, rollup):
+    default_rating = ChurchRanking._meta.get_field('rating').default
+    empty = dict.fromkeys(_ROLLUP_FIELDS, 0)
+    rankings = []
+    for church_id in church_ids:
+        values = {**empty, **rollup.get(church_id, {})}
+        if not values['rating']:
+            values['rating'] = default_rating
+        rankings.append(ChurchRanking(church_id=church_id, updated_at=timezone.now(), **values))
+    ChurchRanking.objects.bulk_create(
+        rankings,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['church'],
+        update_fields=_ROLLUP_FIELDS + ['updated_at'],
+    )
+
+
+def refresh_church_rankings(*church_ids):
+    """Recompute the rollup of the given churches."""
+    # Deferred refreshes may outlive a deleted church
+    church_ids = set(Church.objects.filter(pk__in=[pk for pk in church_ids if pk]).values_list('pk', flat=True))
+    if church_ids:
+        _store(church_ids, _rollup(church_ids))
+
+
+def refresh_group_churches(*group_ids):
+    """Recompute the rollup of the churches of the given groups."""
+    refresh_church_rankings(*TriviaGroup.objects.filter(pk__in=group_ids).values_list('church_id', flat=True))
+
+
+def rebuild_church_rankings():
+    """Recompute every church's rollup; returns the number of churches."""
+    church_ids = list(Church.objects.values_list('pk', flat=True))
+    _store(church_ids, _rollup())
+    return len(church_ids)
+
+
+def _existing_church_of(group_id):
+    """
+    The church id of ``group_id`` if its ChurchRanking row exists. A missing
+    row is built by a full refresh, which already counts the group's
+    change, so there is nothing left to add.
+    """
+    church_id = TriviaGroup.objects.filter(pk=group_id).values_list('church_id', flat=True).first()
+    if church_id and not ChurchRanking.objects.filter(church_id=church_id).exists():
+        refresh_church_rankings(church_id)
+        return None
+    return church_id
+
+
+def apply_church_delta(group_id, points, penalty):
+    """Add a group's (points, penalty) delta, already applied to its GroupRanking, to its church."""
+    church_id = _existing_church_of(group_id)
+    if not church_id:
+        return 0
+    # Floored at zero like the ranking rows (see home.rankings)
+    return ChurchRanking.objects.filter(church_id=church_id).update(
+        points=Greatest(F('points') + points, 0),
+        penalty=Greatest(F('penalty') + penalty, 0),
+        updated_at=timezone.now(),
+    )
+
+
+def apply_church_win(group_id):
+    """Count a challenge win, already recorded on the group, toward its church."""
+    church_id = _existing_church_of(group_id)
+    if not church_id:
+        return 0
+    return ChurchRanking.objects.filter(church_id=church_id).update(
+        challenge_wins=F('challenge_wins') + 1,
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,91 @@
+"""
+Head-to-head records between users and between groups.
+
+Every decided (rated) challenge adds one game to the record of each
+ordered pair of its active participants (the placings ``home.ratings``
+builds; declined or unapproved participants never played): a win, loss or
+draw by rounds won and then total score, plus the score margin. Both directions are stored, so
+"A against B" is a single-row lookup on a unique index. Records are
+written alongside ratings by ``home.ratings`` and rebuilt by its replay.
+"""
+from collections import defaultdict
+
+from django.db.models import F
+
+from .models import GroupHeadToHead, UserHeadToHead
+
+
+_RECORD_FIELDS = ['played', 'wins', 'losses', 'draws', 'margin_total', 'last_played_at']
+
+
+def _model(mode):
+    """(record model, owner field) for a challenge mode."""
+    return (GroupHeadToHead, 'group') if mode == 'group' else (UserHeadToHead, 'user')
+
+
+def pair_results(placings):
+    """
+    Yield (owner id, opponent id, result, margin) for every ordered pair in
+    ``placings`` (owner id -> (rounds won, total score)); result is
+    'wins', 'losses' or 'draws'.
+    """
+    for owner_id, key in placings.items():
+        for opponent_id, other in placings.items():
+            if opponent_id == owner_id:
+                continue
+            result = 'wins' if key > other else 'draws' if key == other else 'losses'
+            yield owner_id, opponent_id, result, key[1] - other[1]
+
+
+def record_head_to_head(mode, placings, when):
+    """Add one decided challenge to the records of its participants."""
+    model, owner = _model(mode)
+    results = list(pair_results(placings))
+    model.objects.bulk_create(
+        [model(**{f'{owner}_id': owner_id, 'opponent_id': opponent_id}) for owner_id, opponent_id, _, _ in results],
+        ignore_conflicts=True,
+    )
+    for owner_id, opponent_id, result, margin in results:
+        model.objects.filter(**{f'{owner}_id': owner_id}, opponent_id=opponent_id).update(
+            played=F('played') + 1,
+            margin_total=F('margin_total') + margin,
+            last_played_at=when,
+            **{result: F(result) + 1},
+        )
+
+
+class HeadToHeadTally:
+    """In-memory records for a replay; ``save`` replaces the stored tables."""
+
+    def __init__(self):
+        self.records = {mode: defaultdict(lambda: [0, 0, 0, 0, 0, None]) for mode in ('individual', 'group')}
+
+    def add(self, mode, placings, when):
+        for owner_id, opponent_id, result, margin in pair_results(placings):
+            record = self.records[mode][(owner_id, opponent_id)]
+            record[0] += 1
+            record[_RECORD_FIELDS.index(result)] += 1
+            record[4] += margin
+            record[5] = when
+
+    def save(self):
+        for mode, records in self.records.items():
+            model, owner = _model(mode)
+            model.objects.all().delete()
+            model.objects.bulk_create(
+                [
+                    model(**{f'{owner}_id': owner_id, 'opponent_id': opponent_id}, **dict(zip(_RECORD_FIELDS, record)))
+                    for (owner_id, opponent_id), record in records.items()
+                ],
+                batch_size=1000,
+            )
+
+
+def head_to_head_records(mode, owner_ids, opponent_ids):
+    """Stored records of any of ``owner_ids`` against any of ``opponent_ids``, as a queryset."""
+    model, owner = _model(mode)
+    return (
+        model.objects
+        .filter(**{f'{owner}_id__in': list(owner_ids)}, opponent_id__in=list(opponent_ids))
+        .select_related(owner, 'opponent')
+    )
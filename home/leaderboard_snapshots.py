@@ -0,0 +1,179 @@
+"""
+Cached leaderboard snapshots.
+
+A snapshot of one board and period holds its top LEADERBOARD_SNAPSHOT_SIZE
+rows as plain dicts, so pages of the board are served from the cache
+without loading every entry. A "my position" inside the top rows is read
+from them; one outside is looked up with a points query and a COUNT
+(``home.leaderboards.position``) and cached under its own key for the life
+of the snapshot. Ranking changes bump a single leaderboard version (see
+``home.signals``); a
+snapshot built under an older version is rebuilt on the next read once it
+is LEADERBOARD_SNAPSHOT_MIN_AGE seconds old, which bounds the rebuild rate
+while points pour in during an event. ``refresh_leaderboards`` rebuilds
+them all ahead of readers.
+
+Rebuilds are single-flight: the reader that wins ``cache.add`` on the
+snapshot's lock rebuilds it while everyone else keeps serving the stale
+snapshot, or, on a cold cache, waits for the winner's result instead of
+running the same aggregates. The lock lives in the cache, so it is only
+shared between processes with a shared backend (the DatabaseCache in
+settings); with LocMemCache each process has its own lock and rebuilds its
+own snapshot.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .leaderboards import BOARDS, PERIODS, board_queryset, entry_points, position
+from .rankings import period_start
+
+
+LEADERBOARD_SNAPSHOT_SIZE = getattr(settings, 'LEADERBOARD_SNAPSHOT_SIZE', 500)
+LEADERBOARD_SNAPSHOT_TIMEOUT = getattr(settings, 'LEADERBOARD_SNAPSHOT_TIMEOUT', 60 * 60)
+LEADERBOARD_SNAPSHOT_MIN_AGE = getattr(settings, 'LEADERBOARD_SNAPSHOT_MIN_AGE', 5)
+# Longest a rebuild may hold the lock, and a cold reader may wait for it
+LEADERBOARD_SNAPSHOT_LOCK_TIMEOUT = getattr(settings, 'LEADERBOARD_SNAPSHOT_LOCK_TIMEOUT', 30)
+
+_VERSION_KEY = 'leaderboard:version'
+_WAIT_STEP = 0.05
+
+
+def get_leaderboard_version():
+    """Return the current leaderboard version, initialising it if missing."""
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        # Seeded from the clock, like the quiz versions in home.scoring
+        cache.add(_VERSION_KEY, int(timezone.now().timestamp() * 1000), None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def bump_leaderboard_version():
+    """Mark every leaderboard snapshot stale."""
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        get_leaderboard_version()
+        try:
+            cache.incr(_VERSION_KEY)
+        except ValueError:
+            pass
+
+
+def _snapshot_key(board, period, now):
+    if period is None:
+        return f'leaderboard:{board}:all'
+    return f'leaderboard:{board}:{period}:{period_start(period, now).isoformat()}'
+
+
+def _row(board, entry):
+    if board == 'individual':
+        return {'id': entry.user_id, 'name': str(entry.user), 'subtitle': ''}
+    if board == 'group':
+        return {
+            'id': entry.group_id,
+            'name': entry.group.name,
+            'subtitle': entry.group.church.name,
+            'wins': entry.group.wins,
+            'competitions': entry.group.total_competitions,
+        }
+    return {'id': entry.pk, 'name': entry.name, 'subtitle': ', '.join(filter(None, [entry.city, entry.country]))}
+
+
+def build_snapshot(board, period=None, now=None, version=None):
+    """Compute the snapshot of ``board`` for ``period`` (one query)."""
+    now = now or timezone.now()
+    rows = [
+        dict(_row(board, entry), points=entry.points, rank=entry.rank)
+        for entry in board_queryset(board, period, now)[:LEADERBOARD_SNAPSHOT_SIZE]
+    ]
+    return {
+        'board': board,
+        'period': period,
+        'version': version,
+        'built_at': time.time(),
+        'rows': rows,
+    }
+
+
+def refresh_snapshot(board, period=None, now=None):
+    """Rebuild and store one snapshot unconditionally; returns it."""
+    now = now or timezone.now()
+    snapshot = build_snapshot(board, period, now, version=get_leaderboard_version())
+    cache.set(_snapshot_key(board, period, now), snapshot, LEADERBOARD_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def refresh_leaderboards(now=None):
+    """Rebuild every board and period snapshot; returns how many were built."""
+    now = now or timezone.now()
+    for board in BOARDS:
+        for period in PERIODS:
+            refresh_snapshot(board, period, now)
+    return len(BOARDS) * len(PERIODS)
+
+
+def _is_fresh(snapshot, version):
+    return snapshot['version'] == version or time.time() - snapshot['built_at'] < LEADERBOARD_SNAPSHOT_MIN_AGE
+
+
+def get_snapshot(board, period=None, now=None):
+    """Return the snapshot of ``board`` for ``period``, rebuilding it at most once at a time."""
+    now = now or timezone.now()
+    key = _snapshot_key(board, period, now)
+    version = get_leaderboard_version()
+    snapshot = cache.get(key)
+    if snapshot is not None and _is_fresh(snapshot, version):
+        return snapshot
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LEADERBOARD_SNAPSHOT_LOCK_TIMEOUT):
+        try:
+            snapshot = build_snapshot(board, period, now, version=version)
+            cache.set(key, snapshot, LEADERBOARD_SNAPSHOT_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return snapshot
+    if snapshot is not None:
+        # Someone else is rebuilding; the stale snapshot will do meanwhile
+        return snapshot
+    deadline = time.monotonic() + LEADERBOARD_SNAPSHOT_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(_WAIT_STEP)
+        # The builder stores the snapshot before releasing the lock
+        locked = cache.get(lock_key) is not None
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+        if not locked:
+            break
+    # The rebuild failed or outlived its lock: build for this request only
+    return build_snapshot(board, period, now, version=version)
+
+
+def _position_key(snapshot, entry_id, now):
+    board_key = _snapshot_key(snapshot['board'], snapshot['period'], now)
+    return f"{board_key}:{snapshot['built_at']}:position:{entry_id}"
+
+
+def snapshot_positions(snapshot, entries, now=None):
+    """[(entry, points, rank)] for model instances on the snapshot's board."""
+    now = now or timezone.now()
+    positions = {row['id']: (row['points'], row['rank']) for row in snapshot['rows']}
+    keys = {entry.pk: _position_key(snapshot, entry.pk, now) for entry in entries if entry.pk not in positions}
+    if keys:
+        cached = cache.get_many(list(keys.values()))
+        missing = [pk for pk, key in keys.items() if key not in cached]
+        if missing:
+            board, period = snapshot['board'], snapshot['period']
+            points = entry_points(board, missing, period, now)
+            found = {
+                keys[pk]: (points.get(pk, 0), position(board, points.get(pk), period, now))
+                for pk in missing
+            }
+            cache.set_many(found, LEADERBOARD_SNAPSHOT_TIMEOUT)
+            cached.update(found)
+        positions.update({pk: cached[key] for pk, key in keys.items()})
+    return [(entry, *positions[entry.pk]) for entry in entries]
@@ -0,0 +1,94 @@
+"""
+Leaderboards over the ranking tables.
+
+The all-time individual and group boards read UserRanking / GroupRanking
+in ``points`` order off the (points DESC, id) index; the weekly, monthly
+and season boards read the current period's RankingBucket rows off the
+(granularity, period_start, points DESC) indexes. Rows are numbered with a
+``RANK()`` window, so tied entries share a rank and pages are plain
+LIMIT/OFFSET slices of one ordered query. The all-time church board reads
+the ChurchRanking rollup; the period church boards sum their groups'
+buckets per church.
+
+A "my position" lookup never ranks the whole board: an entry's rank is one
+plus the number of entries with more points, which is a single COUNT over
+the points index.
+"""
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import Rank
+from django.utils import timezone
+
+from .models import Church, GroupRanking, RankingBucket, TriviaGroup, UserRanking
+from .rankings import GRANULARITIES, period_start
+
+
+BOARDS = ('individual', 'group', 'church')
+# None is the all-time board
+PERIODS = (None,) + GRANULARITIES
+
+# Field identifying an entry of each board in _entries()
+_ENTRY_KEYS = {'individual': 'user_id', 'group': 'group_id', 'church': 'pk'}
+
+
+def _entries(board, period=None, now=None):
+    """Board entries with a ``points`` value, unranked and unordered."""
+    if period is None:
+        if board == 'church':
+            return (
+                Church.objects
+                .filter(is_active=True, ranking__points__gt=0)
+                .annotate(points=F('ranking__points'))
+            )
+        model = GroupRanking if board == 'group' else UserRanking
+        return model.objects.filter(points__gt=0)
+    start = period_start(period, now or timezone.now())
+    if board == 'church':
+        in_period = Q(
+            trivia_groups__ranking_buckets__granularity=period,
+            trivia_groups__ranking_buckets__period_start=start,
+        )
+        return (
+            Church.objects
+            .filter(is_active=True)
+            .annotate(points=Sum('trivia_groups__ranking_buckets__points', filter=in_period))
+            .filter(points__gt=0)
+        )
+    owner = 'group' if board == 'group' else 'user'
+    return RankingBucket.objects.filter(
+        **{f'{owner}__isnull': False}, granularity=period, period_start=start, points__gt=0,
+    )
+
+
+def board_queryset(board, period=None, now=None):
+    """Entries of ``board`` for ``period`` ranked by points, best first, each with a ``rank``."""
+    queryset = _entries(board, period, now).annotate(rank=Window(Rank(), order_by=F('points').desc()))
+    if board == 'group':
+        queryset = queryset.select_related('group__church')
+    elif board == 'individual':
+        queryset = queryset.select_related('user')
+    return queryset.order_by('-points', 'pk')
+
+
+def position(board, points, period=None, now=None):
+    """Rank an entry with ``points`` would have on ``board``."""
+    if not points:
+        return None
+    return _entries(board, period, now).filter(points__gt=points).count() + 1
+
+
+def entry_points(board, entry_ids, period=None, now=None):
+    """{entry id: points} for the given entries of ``board`` that have points, in one query."""
+    key = _ENTRY_KEYS[board]
+    return dict(_entries(board, period, now).filter(**{f'{key}__in': list(entry_ids)}).values_list(key, 'points'))
+
+
+def user_entries(board, user):
+    """What ``user`` is on ``board``: themselves, their groups or their groups' churches."""
+    if not user.is_authenticated:
+        return []
+    groups = TriviaGroup.objects.filter(members=user)
+    if board == 'individual':
+        return [user]
+    if board == 'group':
+        return list(groups.order_by('name'))
+    return list(Church.objects.filter(pk__in=groups.values('church_id'), is_active=True).order_by('name'))
@@ -0,0 +1,176 @@
+"""
+Scheduled status changes of challenges.
+
+Pending challenges that are due (no ``scheduled_at``, or one that has
+come) and have enough active participants become ``active``; approving a
+participant applies the same rule to its challenge at once
+(``activate_if_due``). Active challenges in which every active participant
+has an attempt linked to every round become ``completed``; pending or
+active challenges past ``expires_at`` become ``expired``. All of them run
+per mode off the (mode, status) and scheduled_at indexes: due primary keys
+are read in batches and moved with one conditional UPDATE per batch, so a
+challenge changed by someone else in the meantime is left alone.
+
+UPDATEs send no post_save, so the pass itself runs what the Challenge
+receivers in ``home.signals`` would: completed challenges are rated
+(``home.ratings``), and completed or expired tournament matches are
+decided on what was played (``home.brackets``).
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .brackets import advance_challenge
+from .models import Challenge, ChallengeParticipant, ChallengeRound, ChallengeRoundAttempt, TournamentMatch
+from .ratings import record_challenge_outcome
+
+
+# Active participants a scheduled challenge needs before it opens
+CHALLENGE_MIN_PARTICIPANTS = getattr(settings, 'CHALLENGE_MIN_PARTICIPANTS', 2)
+
+LifecycleResult = namedtuple(
+    'LifecycleResult', ['activated', 'completed', 'expired', 'batches', 'advanced', 'seconds'],
+)
+
+
+def _move_in_batches(candidates, from_statuses, to_status, now, batch_size):
+    """UPDATE ``candidates`` (a pk values_list) to ``to_status``; returns (changed pks, batches)."""
+    changed = []
+    batches = 0
+    while True:
+        batch = list(candidates[:batch_size])
+        if not batch:
+            return changed, batches
+        batches += 1
+        # Re-check the status so a challenge changed meanwhile is left alone
+        moved = list(Challenge.objects.filter(pk__in=batch, status__in=from_statuses).values_list('pk', flat=True))
+        Challenge.objects.filter(pk__in=moved, status__in=from_statuses).update(status=to_status, updated_at=now)
+        changed.extend(moved)
+        if len(batch) < batch_size:
+            return changed, batches
+
+
+def _due_for_activation(challenges, now):
+    """
+    Pending ``challenges`` that are due, unexpired and have enough active
+    participants. Tournament matches of a stage the bracket has not reached
+    yet wait for ``brackets`` to open them.
+    """
+    return (
+        challenges
+        .filter(status='pending')
+        .exclude(tournament_match__stage__gt=F('tournament_match__tournament__current_stage'))
+        .filter(Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now))
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        .annotate(active_participants=Count('participants', filter=Q(participants__is_active=True)))
+        .filter(active_participants__gte=CHALLENGE_MIN_PARTICIPANTS)
+    )
+
+
+def activate_if_due(challenge_id, now=None):
+    """Open one challenge if it is due, e.g. once a participant is approved; True if it opened."""
+    now = now or timezone.now()
+    due = _due_for_activation(Challenge.objects.filter(pk=challenge_id), now).values_list('pk', flat=True)
+    changed, _ = _move_in_batches(due, ['pending'], 'active', now, 1)
+    return bool(changed)
+
+
+def activate_due_challenges(now=None, batch_size=1000):
+    """Open pending challenges that are due; returns (number activated, batches)."""
+    now = now or timezone.now()
+    activated = batches = 0
+    for mode, _ in Challenge.MODE_CHOICES:
+        candidates = (
+            _due_for_activation(Challenge.objects.filter(mode=mode), now)
+            .order_by('scheduled_at', 'pk')
+            .values_list('pk', flat=True)
+        )
+        changed, mode_batches = _move_in_batches(candidates, ['pending'], 'active', now, batch_size)
+        activated += len(changed)
+        batches += mode_batches
+    return activated, batches
+
+
+def _count(queryset):
+    """Correlated COUNT of ``queryset`` rows (filtered on OuterRef('pk')), 0 when there are none."""
+    counted = queryset.order_by().values('challenge').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def complete_played_challenges(now=None, batch_size=1000):
+    """
+    Complete active challenges in which every active participant has an
+    attempt linked to every round; returns (completed pks, batches).
+    Links are unique per (participant, round), so counts are enough.
+    """
+    now = now or timezone.now()
+    completed = []
+    batches = 0
+    for mode, _ in Challenge.MODE_CHOICES:
+        candidates = (
+            Challenge.objects
+            .filter(mode=mode, status='active')
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+            .annotate(
+                round_count=_count(ChallengeRound.objects.filter(challenge=OuterRef('pk'))),
+                player_count=_count(ChallengeParticipant.objects.filter(challenge=OuterRef('pk'), is_active=True)),
+                link_count=_count(ChallengeRoundAttempt.objects.filter(
+                    challenge=OuterRef('pk'), round__isnull=False, participant__is_active=True,
+                )),
+            )
+            .filter(round_count__gt=0, player_count__gte=2, link_count=F('round_count') * F('player_count'))
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        changed, mode_batches = _move_in_batches(candidates, ['active'], 'completed', now, batch_size)
+        completed.extend(changed)
+        batches += mode_batches
+    return completed, batches
+
+
+def expire_stale_challenges(now=None, batch_size=1000):
+    """Expire pending and active challenges past ``expires_at``; returns (expired pks, batches)."""
+    now = now or timezone.now()
+    expired = []
+    batches = 0
+    for mode, _ in Challenge.MODE_CHOICES:
+        candidates = (
+            Challenge.objects
+            .filter(mode=mode, status__in=['pending', 'active'], expires_at__lte=now)
+            .order_by('expires_at', 'pk')
+            .values_list('pk', flat=True)
+        )
+        changed, mode_batches = _move_in_batches(candidates, ['pending', 'active'], 'expired', now, batch_size)
+        expired.extend(changed)
+        batches += mode_batches
+    return expired, batches
+
+
+def run_challenge_lifecycle(now=None, batch_size=1000):
+    """Run one activation, completion and expiry pass; returns a LifecycleResult with batch metrics."""
+    started = time.monotonic()
+    now = now or timezone.now()
+    # Expire first so a challenge that is both due and stale never opens
+    expired, expire_batches = expire_stale_challenges(now, batch_size)
+    activated, activate_batches = activate_due_challenges(now, batch_size)
+    completed, complete_batches = complete_played_challenges(now, batch_size)
+    # UPDATEs send no post_save, so the Challenge receivers' work is done here
+    for challenge_id in completed:
+        record_challenge_outcome(challenge_id, now)
+    advanced = 0
+    undecided = list(
+        TournamentMatch.objects
+        .filter(challenge_id__in=completed + expired, winner__isnull=True)
+        .values_list('challenge_id', flat=True)
+    )
+    for challenge_id in undecided:
+        if advance_challenge(challenge_id) is not None:
+            advanced += 1
+    return LifecycleResult(
+        activated, len(completed), len(expired), activate_batches + complete_batches + expire_batches, advanced,
+        time.monotonic() - started,
+    )
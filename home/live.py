@@ -0,0 +1,166 @@
+"""
+Live challenge scoreboards pushed over Server-Sent Events.
+
+Whenever a challenge's materialized standings change, one JSON snapshot is
+built and published to the challenge's topic; every open viewer streams
+that same snapshot. The broker is pluggable through
+``settings.LIVE_SCOREBOARD_BROKER`` (a dotted path to a class exposing
+``publish``, ``last`` and an async ``subscribe``).
+
+Deployment: streams are only held open under the ASGI application
+(``BibleTrivia.asgi``). Under WSGI each held stream would pin a worker
+thread for as long as the viewer stays, so the view sends one fresh
+snapshot with a ``retry`` hint instead and the browser's EventSource
+polls every LIVE_SCOREBOARD_RETRY seconds. The default broker keeps topics
+in process memory and only reaches viewers of the process that saved the
+attempt, so it is only correct when the whole site runs as a single ASGI
+process; configure a shared backend (e.g. Redis pub/sub) otherwise.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import ChallengeStanding
+from .standings import compute_standings, stored_round_scores, valid_participants
+
+
+LIVE_SCOREBOARD_BROKER = getattr(settings, 'LIVE_SCOREBOARD_BROKER', 'home.live.InProcessBroker')
+# Seconds between keep-alive comments on idle streams
+LIVE_SCOREBOARD_HEARTBEAT = getattr(settings, 'LIVE_SCOREBOARD_HEARTBEAT', 15)
+# Seconds between reconnects when the scoreboard is polled under WSGI
+LIVE_SCOREBOARD_RETRY = getattr(settings, 'LIVE_SCOREBOARD_RETRY', 5)
+
+
+class _Subscription:
+    """One viewer's mailbox; only the newest snapshot is kept."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.message = None
+
+    def push(self, message):
+        self.message = message
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # Viewer's event loop already closed
+            pass
+
+
+class InProcessBroker:
+    """Topic fan-out within one process; publish() may be called from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._last = {}
+
+    def publish(self, topic, message):
+        with self._lock:
+            self._last[topic] = message
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            subscription.push(message)
+        return len(subscribers)
+
+    def last(self, topic):
+        """Most recent message on a topic, so new viewers start without a recomputation."""
+        with self._lock:
+            return self._last.get(topic)
+
+    async def subscribe(self, topic, timeout=None):
+        """Yield messages published to ``topic``; yields None after ``timeout`` idle seconds."""
+        subscription = _Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                subscription.event.clear()
+                yield subscription.message
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(LIVE_SCOREBOARD_BROKER)()
+    return _broker
+
+
+def challenge_topic(challenge_id):
+    return f'challenge:{challenge_id}'
+
+
+def _display_name(participant):
+    if participant.user_id:
+        return participant.user.get_full_name() or participant.user.username
+    return participant.group.name if participant.group_id else ''
+
+
+def build_scoreboard(challenge):
+    """Serialize a challenge's stored standings and per-round winners."""
+    participants = list(valid_participants(challenge))
+    rounds = list(challenge.rounds.order_by('round_number'))
+    _, round_results = compute_standings(challenge, participants, rounds, stored_round_scores(challenge))
+    standings = (
+        ChallengeStanding.objects
+        .filter(challenge=challenge)
+        .select_related('participant__user', 'participant__group')
+        .order_by('rank', 'participant_id')
+    )
+    return {
+        'challenge_id': challenge.pk,
+        'status': challenge.status,
+        'standings': [
+            {
+                'participant_id': row.participant_id,
+                'name': _display_name(row.participant),
+                'rank': row.rank,
+                'total_score': row.total_score,
+                'total_time': row.total_time,
+                'rounds_won': row.rounds_won,
+            }
+            for row in standings
+        ],
+        'rounds': [
+            {
+                'round_number': rr['round'].round_number,
+                'best_score': rr['best_score'] or 0,
+                'winners': [_display_name(p) for p in rr['winners']] if rr['best_score'] else [],
+            }
+            for rr in round_results
+        ],
+    }
+
+
+def scoreboard_message(challenge):
+    """The scoreboard as the JSON payload of one event."""
+    return json.dumps(build_scoreboard(challenge))
+
+
+def publish_scoreboard(challenge):
+    """Build the scoreboard once and push it to every viewer of the challenge."""
+    message = scoreboard_message(challenge)
+    get_broker().publish(challenge_topic(challenge.pk), message)
+    return message
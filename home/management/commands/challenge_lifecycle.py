@@ -0,0 +1,36 @@
+"""
+Activate scheduled challenges, complete fully played ones and expire stale ones.
+
+Run it from cron, or keep it running with ``--interval`` as a background loop:
+
+    python manage.py challenge_lifecycle
+    python manage.py challenge_lifecycle --interval 30 --batch-size 500
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.lifecycle import run_challenge_lifecycle
+
+
+class Command(BaseCommand):
+    help = 'Move due challenges to active, fully played ones to completed and expired ones to expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Challenges updated per UPDATE statement')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        while True:
+            result = run_challenge_lifecycle(batch_size=options['batch_size'])
+            if result.activated or result.completed or result.expired or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Activated {result.activated}, completed {result.completed}, expired {result.expired} challenges '
+                    f'({result.advanced} tournament matches decided) in {result.batches} batches, '
+                    f'{result.seconds * 1000:.0f} ms'
+                ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,95 @@
+"""
+Generate a tournament bracket of challenges for groups or users.
+
+Entrants are seeded in the order given (best first), by rating, or at random.
+Rounds are played on the --quiz given, or, with one --quiz per round of a
+match, on the quiz of their round number:
+
+    python manage.py create_tournament "Regional Cup" --format single_elimination --quiz gospels \
+        --group lions --group eagles --group doves --created-by admin@example.com
+    python manage.py create_tournament "Youth League" --format round_robin --mode individual --quiz psalms \
+        --user a@example.com --user b@example.com --user c@example.com --created-by admin@example.com
+    python manage.py create_tournament "Open" --format swiss --stages 4 --seed-by rating ...
+"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from home.brackets import BracketError, create_tournament
+from home.models import GroupRanking, TestQuiz, Tournament, TriviaGroup, UserRanking
+from home.ratings import RATING_INITIAL
+
+
+class Command(BaseCommand):
+    help = 'Create a single-elimination, round-robin or Swiss tournament with all of its challenges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name')
+        parser.add_argument('--format', required=True, choices=[key for key, _ in Tournament.FORMAT_CHOICES])
+        parser.add_argument('--mode', default='group', choices=['group', 'individual'])
+        parser.add_argument('--group', action='append', dest='groups', default=[],
+                            help='Group slug, best seed first (repeatable; group mode)')
+        parser.add_argument('--user', action='append', dest='users', default=[],
+                            help='User email, best seed first (repeatable; individual mode)')
+        parser.add_argument('--seed-by', choices=['given', 'rating', 'random'], default='given')
+        parser.add_argument('--created-by', required=True, help='Email of the organiser')
+        parser.add_argument('--quiz', action='append', dest='quizzes', required=True,
+                            help='Quiz slug for every round, or repeated once per round of a match')
+        parser.add_argument('--best-of', type=int, default=None, help='Rounds per match (odd)')
+        parser.add_argument('--stages', type=int, default=None, help='Number of Swiss rounds')
+        parser.add_argument('--scheduled-at', default=None, help='ISO datetime the matches open')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            organiser = User.objects.get(email=options['created_by'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['created_by']}")
+
+        quizzes_by_slug = TestQuiz.objects.in_bulk(options['quizzes'], field_name='slug')
+        missing = [slug for slug in options['quizzes'] if slug not in quizzes_by_slug]
+        if missing:
+            raise CommandError(f"Unknown quiz(es): {', '.join(missing)}")
+        quizzes = [quizzes_by_slug[slug] for slug in options['quizzes']]
+
+        if options['mode'] == 'group':
+            keys, by_key = options['groups'], TriviaGroup.objects.in_bulk(options['groups'], field_name='slug')
+        else:
+            keys, by_key = options['users'], User.objects.in_bulk(options['users'], field_name='email')
+        missing = [key for key in keys if key not in by_key]
+        if missing:
+            raise CommandError(f"Unknown entrant(s): {', '.join(missing)}")
+        entrants = [by_key[key] for key in keys]
+        if options['seed_by'] == 'random':
+            random.shuffle(entrants)
+        elif options['seed_by'] == 'rating':
+            model = GroupRanking if options['mode'] == 'group' else UserRanking
+            owner = 'group_id' if options['mode'] == 'group' else 'user_id'
+            ratings = dict(
+                model.objects.filter(**{f'{owner}__in': [e.pk for e in entrants]}).values_list(owner, 'rating')
+            )
+            # Stable sort: unrated entrants keep their given order at the default rating
+            entrants.sort(key=lambda e: -ratings.get(e.pk, RATING_INITIAL))
+
+        scheduled_at = None
+        if options['scheduled_at']:
+            scheduled_at = parse_datetime(options['scheduled_at'])
+            if scheduled_at is None:
+                raise CommandError(f"Invalid --scheduled-at: {options['scheduled_at']}")
+            if timezone.is_naive(scheduled_at):
+                scheduled_at = timezone.make_aware(scheduled_at)
+
+        try:
+            tournament = create_tournament(
+                options['name'], options['mode'], options['format'], entrants, organiser, quizzes,
+                best_of=options['best_of'], stages=options['stages'], scheduled_at=scheduled_at,
+            )
+        except BracketError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Created tournament {tournament.pk} with {tournament.matches.count()} matches '
+            f'over {tournament.stages} stages'
+        ))
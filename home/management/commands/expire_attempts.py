@@ -0,0 +1,45 @@
+"""
+Move overdue ``started`` quiz attempts to ``expired``.
+
+Run it from cron, or keep it running with ``--interval`` as a background loop:
+
+    python manage.py expire_attempts
+    python manage.py expire_attempts --interval 60 --stale-hours 24
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from home.models import TestQuizAttempt, GroupTestQuizAttempt
+from home.submissions import expire_overdue_attempts
+
+
+class Command(BaseCommand):
+    help = 'Expire started quiz attempts that are past their deadline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Attempts updated per UPDATE statement')
+        parser.add_argument('--stale-hours', type=float, default=0,
+                            help='Also expire untimed attempts left started for this many hours (0 disables)')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'], options['stale_hours'])
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size, stale_hours):
+        now = timezone.now()
+        stale_before = now - timedelta(hours=stale_hours) if stale_hours else None
+        for model in (TestQuizAttempt, GroupTestQuizAttempt):
+            expired = expire_overdue_attempts(model, now=now, batch_size=batch_size, stale_before=stale_before)
+            if expired:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Expired {expired} {model._meta.verbose_name_plural.lower()}'
+                ))
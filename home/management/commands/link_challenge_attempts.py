@@ -0,0 +1,34 @@
+"""
+Link historical quiz attempts to the challenge rounds they were taken for.
+
+    python manage.py link_challenge_attempts                 # active and completed challenges
+    python manage.py link_challenge_attempts --challenge 12
+"""
+from django.core.management.base import BaseCommand
+
+from home.challenge_links import backfill_challenge_links
+from home.models import Challenge
+from home.standings import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = 'Backfill ChallengeRoundAttempt links from existing attempts and rebuild standings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--challenge', type=int, action='append', dest='challenges', default=[],
+                            help='Challenge id to backfill (repeatable; default: active and completed)')
+
+    def handle(self, *args, **options):
+        challenges = Challenge.objects.order_by('pk')
+        if options['challenges']:
+            challenges = challenges.filter(pk__in=options['challenges'])
+        else:
+            challenges = challenges.filter(status__in=['active', 'completed'])
+        total = 0
+        for challenge in challenges.iterator():
+            created = backfill_challenge_links(challenge)
+            if created:
+                rebuild_standings(challenge)
+                self.stdout.write(f'Challenge {challenge.pk}: linked {created} attempts')
+            total += created
+        self.stdout.write(self.style.SUCCESS(f'Linked {total} attempts'))
@@ -0,0 +1,28 @@
+"""
+Recompute materialized challenge round scores and standings from linked attempts.
+
+    python manage.py rebuild_challenge_standings            # every challenge
+    python manage.py rebuild_challenge_standings --challenge 12
+"""
+from django.core.management.base import BaseCommand
+
+from home.models import Challenge
+from home.standings import rebuild_standings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ChallengeRoundScore and ChallengeStanding rows from linked attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--challenge', type=int, action='append', dest='challenges', default=[],
+                            help='Challenge id to rebuild (repeatable; default: all)')
+
+    def handle(self, *args, **options):
+        challenges = Challenge.objects.order_by('pk')
+        if options['challenges']:
+            challenges = challenges.filter(pk__in=options['challenges'])
+        rebuilt = 0
+        for challenge in challenges.iterator():
+            rebuild_standings(challenge)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt standings for {rebuilt} challenges'))
@@ -0,0 +1,21 @@
+"""
+Recompute the ChallengeVisibility index from challenges, participants and groups.
+
+    python manage.py rebuild_challenge_visibility
+    python manage.py rebuild_challenge_visibility --batch-size 200
+"""
+from django.core.management.base import BaseCommand
+
+from home.visibility import rebuild_visibility
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ChallengeVisibility rows used by the challenge list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Challenges recomputed per transaction')
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_visibility(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt visibility for {rebuilt} challenges'))
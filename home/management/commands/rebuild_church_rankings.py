@@ -0,0 +1,16 @@
+"""
+Recompute every church's ChurchRanking rollup from its groups.
+
+    python manage.py rebuild_church_rankings
+"""
+from django.core.management.base import BaseCommand
+
+from home.church_rankings import rebuild_church_rankings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ChurchRanking rollup of every church'
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_church_rankings()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rankings for {rebuilt} churches'))
@@ -0,0 +1,33 @@
+"""
+Recompute user, group and church rankings and their period buckets from
+the stored responses, replacing the live totals in one transaction.
+
+    python manage.py rebuild_rankings
+    python manage.py rebuild_rankings --workers 4 --chunk-size 5000
+    python manage.py rebuild_rankings --dry-run
+"""
+from django.core.management.base import BaseCommand
+
+from home.ranking_rebuild import rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild UserRanking, GroupRanking, ranking buckets and church rankings from responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Owner ids aggregated per query')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Aggregate the id ranges in this many processes (default: in process)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Aggregate and report without writing')
+
+    def handle(self, *args, **options):
+        result = rebuild_rankings(
+            chunk_size=options['chunk_size'], workers=options['workers'], dry_run=options['dry_run'],
+        )
+        verb = 'Would rebuild' if options['dry_run'] else 'Rebuilt'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.users} user and {result.groups} group rankings with {result.buckets} buckets '
+            f'from {result.ranges} id ranges in {result.seconds * 1000:.0f} ms'
+        ))
@@ -0,0 +1,33 @@
+"""
+Rebuild the cached leaderboard snapshots of every board and period.
+
+Run it from cron, or keep it running with ``--interval`` so readers never
+find a cold or stale snapshot:
+
+    python manage.py refresh_leaderboards
+    python manage.py refresh_leaderboards --interval 30
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.leaderboard_snapshots import refresh_leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached leaderboard snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            built = refresh_leaderboards()
+            if not options['interval']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Rebuilt {built} leaderboard snapshots in {(time.monotonic() - started) * 1000:.0f} ms'
+                ))
+                return
+            time.sleep(options['interval'])
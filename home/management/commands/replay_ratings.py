@@ -0,0 +1,23 @@
+"""
+Recompute ratings, head-to-head records and group records from challenge history.
+
+    python manage.py replay_ratings
+    python manage.py replay_ratings --chunk-size 5000
+"""
+from django.core.management.base import BaseCommand
+
+from home.ratings import replay_ratings
+
+
+class Command(BaseCommand):
+    help = 'Replay every decided challenge in order to rebuild ratings, head-to-head and TriviaGroup records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Challenges whose standings are read per query')
+
+    def handle(self, *args, **options):
+        result = replay_ratings(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {result.outcomes} challenges: {result.users} user and {result.groups} group ratings'
+        ))
@@ -0,0 +1,40 @@
+"""
+Re-grade stored quiz responses after answers or points were edited.
+
+    python manage.py rescore_attempts                 # every quiz
+    python manage.py rescore_attempts --quiz my-quiz  # by slug (repeatable)
+    python manage.py rescore_attempts --dry-run
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from home.models import TestQuiz
+from home.rescoring import rescore_quiz
+
+
+class Command(BaseCommand):
+    help = 'Re-score stored attempts and rankings against the current answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', action='append', dest='quizzes', default=[],
+                            help='Quiz slug to re-score (repeatable; default: all quizzes)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Responses read and written per chunk')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        quizzes = TestQuiz.objects.order_by('pk')
+        if options['quizzes']:
+            quizzes = quizzes.filter(slug__in=options['quizzes'])
+            missing = set(options['quizzes']) - set(quizzes.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f"Unknown quiz slug(s): {', '.join(sorted(missing))}")
+
+        verb = 'would change' if options['dry_run'] else 'changed'
+        for quiz in quizzes.iterator():
+            result = rescore_quiz(quiz, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+            self.stdout.write(
+                f'{quiz.slug}: checked {result.responses_checked} responses; '
+                f'{verb} {result.responses_changed} responses in {result.attempts_changed} attempts'
+            )
+        self.stdout.write(self.style.SUCCESS('Re-scoring finished'))
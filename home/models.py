@@ -4,9 +4,6 @@ from django.core.exceptions import ValidationError
 from django.db.models import Q
 from django.utils.text import slugify
 from django.conf import settings
-from django.utils import timezone
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 # Create your models here.
 
 
@@ -1000,6 +997,7 @@ class TestQuizAttempt(TimeStampedModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_attempts', null=True, blank=True)
     attempt_number = models.PositiveIntegerField(default=1, help_text='Incremented per user per quiz')
     session_id = models.CharField(max_length=40, blank=True, null=True, help_text='for unauthenticated users')
+    shuffle_seed = models.CharField(max_length=32, blank=True, help_text='Seed used to order choices for this attempt')
     # Results
     score = models.PositiveIntegerField(default=0)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='started')
@@ -1007,6 +1005,8 @@ class TestQuizAttempt(TimeStampedModel):
     # Timestamps and duration
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+    deadline = models.DateTimeField(blank=True, null=True, help_text='Server-side cutoff from the quiz time limit')
+    submission_token = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text='Single-use token from the take form; replays retried submits')
 
    
 
@@ -1038,6 +1038,7 @@ class GroupTestQuizAttempt(TimeStampedModel):
     group = models.ForeignKey(TriviaGroup, on_delete=models.CASCADE, related_name='quiz_attempts')
     initiated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='initiated_group_quiz_attempts')
     attempt_number = models.PositiveIntegerField(default=1, help_text='Incremented per group per quiz')
+    shuffle_seed = models.CharField(max_length=32, blank=True, help_text='Seed used to order choices for this attempt')
 
     # Results
     score = models.PositiveIntegerField(default=0)
@@ -1046,6 +1047,8 @@ class GroupTestQuizAttempt(TimeStampedModel):
     # Timestamps and duration
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+    deadline = models.DateTimeField(blank=True, null=True, help_text='Server-side cutoff from the quiz time limit')
+    submission_token = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text='Single-use token from the take form; replays retried submits')
 
     class Meta:
         ordering = ['-created_at']
@@ -1062,6 +1065,34 @@ class GroupTestQuizAttempt(TimeStampedModel):
         return f"Attempt #{self.attempt_number} - {self.group} - {self.quiz.name}"
 
 
+class UserAttemptCounter(models.Model):
+    """Next attempt number per (quiz, user), allocated with a single UPDATE."""
+    quiz = models.ForeignKey(TestQuiz, on_delete=models.CASCADE, related_name='user_attempt_counters')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_attempt_counters')
+    count = models.PositiveIntegerField(default=0, help_text='Attempt numbers handed out so far')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('quiz', 'user')]
+
+    def __str__(self):
+        return f"UserAttemptCounter({self.quiz_id}, {self.user_id}) = {self.count}"
+
+
+class GroupAttemptCounter(models.Model):
+    """Next attempt number per (quiz, group), allocated with a single UPDATE."""
+    quiz = models.ForeignKey(TestQuiz, on_delete=models.CASCADE, related_name='group_attempt_counters')
+    group = models.ForeignKey(TriviaGroup, on_delete=models.CASCADE, related_name='quiz_attempt_counters')
+    count = models.PositiveIntegerField(default=0, help_text='Attempt numbers handed out so far')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('quiz', 'group')]
+
+    def __str__(self):
+        return f"GroupAttemptCounter({self.quiz_id}, {self.group_id}) = {self.count}"
+
+
 class UserResponse(TimeStampedModel):
     """
     Stores a user's response to a specific question within a TestQuizAttempt.
@@ -1174,8 +1205,19 @@ class UserRanking(models.Model):
     points = models.PositiveIntegerField(default=0)
     penalty = models.PositiveIntegerField(default=0)
     metadata = models.JSONField(default=dict, blank=True)
+    # Glicko rating from decided challenges; maintained by home.ratings
+    rating = models.FloatField(default=1500)
+    rating_deviation = models.FloatField(default=350)
+    rated_challenges = models.PositiveIntegerField(default=0)
+    last_rated_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-rating"], name="userranking_rating_idx"),
+            models.Index(fields=["-points", "id"], name="userranking_points_idx"),
+        ]
+
     def __str__(self):
         return f"UserRanking({self.user_id})"
 
@@ -1185,61 +1227,98 @@ class GroupRanking(models.Model):
     points = models.PositiveIntegerField(default=0)
     penalty = models.PositiveIntegerField(default=0)
     metadata = models.JSONField(default=dict, blank=True)
+    # Glicko rating from decided challenges; maintained by home.ratings
+    rating = models.FloatField(default=1500)
+    rating_deviation = models.FloatField(default=350)
+    rated_challenges = models.PositiveIntegerField(default=0)
+    last_rated_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-rating"], name="groupranking_rating_idx"),
+            models.Index(fields=["-points", "id"], name="groupranking_points_idx"),
+        ]
+
     def __str__(self):
         return f"GroupRanking({self.group_id})"
 
 
-def _bump_monthly_points(meta: dict, dt, delta_points: int):
-    """Increment metadata bucket with top-level keys like {'YYYY-MM': points}."""
-    try:
-        month_key = dt.strftime('%Y-%m')
-        current = int((meta or {}).get(month_key, 0))
-        meta[month_key] = current + int(delta_points)
-    except Exception:
-        pass
-    return meta
-
-
-@receiver(post_save, sender='home.UserResponse')
-def update_user_ranking_on_response(sender, instance, created, **kwargs):
-    if not created:
-        return
-    # Only individual attempts should count toward user ranking
-    try:
-        ranking, _ = UserRanking.objects.get_or_create(user=instance.attempt.user)
-    except Exception:
-        return
-    delta = int(instance.points_awarded or 0)
-    ranking.points = int(ranking.points) + delta
-    # Compute penalty from response metadata if present
-    meta = instance.metadata or {}
-    wrong = int(meta.get('wrong_selected', 0) or 0)
-    qpen = int(meta.get('question_penalty', 0) or 0)
-    ranking.penalty = int(ranking.penalty) + (wrong * qpen)
-    ranking.metadata = _bump_monthly_points(ranking.metadata or {}, timezone.now(), delta)
-    ranking.save(update_fields=['points', 'penalty', 'metadata', 'updated_at'])
-
-
-@receiver(post_save, sender='home.GroupResponse')
-def update_group_ranking_on_response(sender, instance, created, **kwargs):
-    if not created:
-        return
-    # Group attempts count strictly toward group ranking only
-    try:
-        ranking, _ = GroupRanking.objects.get_or_create(group=instance.group)
-    except Exception:
-        return
-    delta = int(instance.points_awarded or 0)
-    ranking.points = int(ranking.points) + delta
-    # Compute penalty from response metadata if present
-    meta = instance.metadata or {}
-    wrong = int(meta.get('wrong_selected', 0) or 0)
-    qpen = int(meta.get('question_penalty', 0) or 0)
-    ranking.penalty = int(ranking.penalty) + (wrong * qpen)
-    ranking.metadata = _bump_monthly_points(ranking.metadata or {}, timezone.now(), delta)
-    ranking.save(update_fields=['points', 'penalty', 'metadata', 'updated_at'])
+class ChurchRanking(models.Model):
+    """
+    Competitive standing of a church, rolled up from its groups: summed
+    GroupRanking points and penalty, challenge wins, active groups, distinct
+    members and the mean rating of its rated groups. Maintained by
+    home.church_rankings.
+    """
+    church = models.OneToOneField('Church', on_delete=models.CASCADE, related_name='ranking')
+    points = models.PositiveIntegerField(default=0)
+    penalty = models.PositiveIntegerField(default=0)
+    active_groups = models.PositiveIntegerField(default=0)
+    members = models.PositiveIntegerField(default=0)
+    challenge_wins = models.PositiveIntegerField(default=0)
+    rating = models.FloatField(default=1500)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-points", "id"], name="churchranking_points_idx"),
+            models.Index(fields=["-rating"], name="churchranking_rating_idx"),
+        ]
+
+    def __str__(self):
+        return f"ChurchRanking({self.church_id})"
+
+
+class RankingBucket(models.Model):
+    """
+    Points and penalty of one user or group (exactly one is set) within one
+    period: the week (starting Monday), month or season starting on
+    ``period_start``. Maintained alongside UserRanking / GroupRanking by
+    home.rankings.
+    """
+    GRANULARITY_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('season', 'Season'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='ranking_buckets')
+    group = models.ForeignKey('TriviaGroup', on_delete=models.CASCADE, null=True, blank=True, related_name='ranking_buckets')
+    granularity = models.CharField(max_length=6, choices=GRANULARITY_CHOICES)
+    period_start = models.DateField()
+    points = models.PositiveIntegerField(default=0)
+    penalty = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'granularity', 'period_start'],
+                condition=models.Q(user__isnull=False),
+                name='uniq_user_ranking_bucket',
+            ),
+            models.UniqueConstraint(
+                fields=['group', 'granularity', 'period_start'],
+                condition=models.Q(group__isnull=False),
+                name='uniq_group_ranking_bucket',
+            ),
+        ]
+        indexes = [
+            # Period boards: one period's entries in points order
+            models.Index(
+                fields=['granularity', 'period_start', '-points'],
+                condition=models.Q(user__isnull=False),
+                name='rankingbucket_user_board_idx',
+            ),
+            models.Index(
+                fields=['granularity', 'period_start', '-points'],
+                condition=models.Q(group__isnull=False),
+                name='rankingbucket_group_board_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"RankingBucket({self.user_id or self.group_id}, {self.granularity} {self.period_start})"
 
 
 class Challenge(TimeStampedModel):
@@ -1373,6 +1452,8 @@ class ChallengeRoundAttempt(TimeStampedModel):
                 (Q(user_attempt__isnull=False) & Q(group_attempt__isnull=True)) |
                 (Q(user_attempt__isnull=True) & Q(group_attempt__isnull=False))
             ), name='chk_one_attempt_linked'),
+            # A participant's first attempt per round is the only one that counts
+            models.UniqueConstraint(fields=['participant', 'round'], name='uniq_round_attempt_participant_round'),
         ]
 
     def clean(self):
@@ -1381,4 +1462,233 @@ class ChallengeRoundAttempt(TimeStampedModel):
             if self.challenge.mode == 'individual' and not self.user_attempt:
                 raise models.ValidationError('Individual mode requires a user_attempt.')
             if self.challenge.mode == 'group' and not self.group_attempt:
-                raise models.ValidationError('Group mode requires a group_attempt.')
\ No newline at end of file
+                raise models.ValidationError('Group mode requires a group_attempt.')
+
+
+class ChallengeRoundScore(models.Model):
+    """
+    Materialized score of one participant in one challenge round, summed
+    from its linked attempts. Maintained by home.standings.
+    """
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='round_scores')
+    round = models.ForeignKey(ChallengeRound, on_delete=models.CASCADE, null=True, blank=True, related_name='scores')
+    participant = models.ForeignKey(ChallengeParticipant, on_delete=models.CASCADE, related_name='round_scores')
+    score = models.PositiveIntegerField(default=0)
+    total_time = models.PositiveIntegerField(default=0, help_text='Seconds')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["challenge"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['participant', 'round'], name='uniq_round_score_participant_round'),
+        ]
+
+    def __str__(self):
+        return f"ChallengeRoundScore({self.participant_id}, {self.round_id}) = {self.score}"
+
+
+class ChallengeStanding(models.Model):
+    """
+    Materialized overall standing of a challenge participant: rank by total
+    score, then total time (smaller is better). Maintained by home.standings.
+    """
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='standings')
+    participant = models.OneToOneField(ChallengeParticipant, on_delete=models.CASCADE, related_name='standing')
+    rank = models.PositiveIntegerField(default=0)
+    total_score = models.PositiveIntegerField(default=0)
+    total_time = models.PositiveIntegerField(default=0, help_text='Seconds')
+    rounds_won = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['challenge', 'rank']
+        indexes = [
+            models.Index(fields=["challenge", "rank"]),
+        ]
+
+    def __str__(self):
+        return f"ChallengeStanding({self.challenge_id}, #{self.rank}, {self.participant_id})"
+
+
+class ChallengeVisibility(models.Model):
+    """
+    Denormalized index of the challenges a user can see and why: one row
+    per (user, challenge, reason). Maintained by home.visibility.
+    """
+    REASON_CHOICES = [
+        ('creator', 'Creator'),
+        ('participant', 'Participant'),
+        ('member', 'Group member'),
+        ('captain', 'Group captain'),
+        ('patron', 'Group patron'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='visible_challenges')
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='visibility')
+    reason = models.CharField(max_length=12, choices=REASON_CHOICES)
+
+    class Meta:
+        verbose_name_plural = 'challenge visibility'
+        indexes = [
+            models.Index(fields=["challenge"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'challenge', 'reason'], name='uniq_challenge_visibility'),
+        ]
+
+    def __str__(self):
+        return f"ChallengeVisibility({self.user_id}, {self.challenge_id}, {self.reason})"
+
+
+class Tournament(TimeStampedModel):
+    """
+    A bracket of challenges between users or groups. Matches are generated
+    and advanced by home.brackets.
+    """
+    FORMAT_CHOICES = [
+        ('single_elimination', 'Single elimination'),
+        ('round_robin', 'Round robin'),
+        ('swiss', 'Swiss'),
+    ]
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    name = models.CharField(max_length=200)
+    mode = models.CharField(max_length=12, choices=Challenge.MODE_CHOICES)
+    format = models.CharField(max_length=20, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='active')
+    best_of = models.PositiveIntegerField(null=True, blank=True, help_text='Rounds per match; null for single-round')
+    stages = models.PositiveIntegerField(default=1, help_text='Number of stages (bracket rounds) in the tournament')
+    current_stage = models.PositiveIntegerField(default=1)
+    scheduled_at = models.DateTimeField(null=True, blank=True)
+    winner = models.ForeignKey('TournamentEntrant', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='created_tournaments')
+    metadata = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Tournament({self.id}, {self.format}, {self.status})"
+
+
+class TournamentEntrant(models.Model):
+    """A seeded user or group in a tournament, with its running record."""
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='entrants')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='tournament_entries')
+    group = models.ForeignKey('TriviaGroup', on_delete=models.CASCADE, null=True, blank=True, related_name='tournament_entries')
+    seed = models.PositiveIntegerField()
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    byes = models.PositiveIntegerField(default=0)
+    eliminated = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['tournament', 'seed']
+        constraints = [
+            models.UniqueConstraint(fields=['tournament', 'seed'], name='uniq_tournament_entrant_seed'),
+        ]
+
+    def __str__(self):
+        return f"TournamentEntrant({self.tournament_id}, #{self.seed}, {self.user or self.group})"
+
+
+class TournamentMatch(models.Model):
+    """
+    One pairing in a tournament stage, played as a two-participant
+    challenge. A bye has no challenge and is won by its only entrant. In
+    single elimination the winner moves into ``next_match`` at ``next_slot``.
+    """
+    SLOT_CHOICES = [
+        ('a', 'A'),
+        ('b', 'B'),
+    ]
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='matches')
+    stage = models.PositiveIntegerField()
+    position = models.PositiveIntegerField()
+    challenge = models.OneToOneField(Challenge, on_delete=models.SET_NULL, null=True, blank=True, related_name='tournament_match')
+    entrant_a = models.ForeignKey(TournamentEntrant, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    entrant_b = models.ForeignKey(TournamentEntrant, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    winner = models.ForeignKey(TournamentEntrant, on_delete=models.CASCADE, null=True, blank=True, related_name='matches_won')
+    next_match = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='feeder_matches')
+    next_slot = models.CharField(max_length=1, choices=SLOT_CHOICES, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['tournament', 'stage', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['tournament', 'stage', 'position'], name='uniq_tournament_match_position'),
+        ]
+
+    def __str__(self):
+        return f"TournamentMatch({self.tournament_id}, stage {self.stage}, #{self.position})"
+
+
+class ChallengeOutcome(models.Model):
+    """
+    A completed challenge as consumed by home.ratings: recorded once, in the
+    order challenges were decided, so ratings can be replayed from history.
+    """
+    challenge = models.OneToOneField(Challenge, on_delete=models.CASCADE, related_name='outcome')
+    mode = models.CharField(max_length=12, choices=Challenge.MODE_CHOICES)
+    decided_at = models.DateTimeField()
+    winner = models.ForeignKey(ChallengeParticipant, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    rated = models.BooleanField(default=False, help_text='False when no participant scored, so ratings were left alone')
+
+    class Meta:
+        ordering = ['decided_at', 'id']
+        indexes = [
+            models.Index(fields=["decided_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"ChallengeOutcome({self.challenge_id}, {self.decided_at:%Y-%m-%d})"
+
+
+class HeadToHeadRecord(models.Model):
+    """Common fields of a head-to-head record, seen from one side of the pair."""
+    played = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    draws = models.PositiveIntegerField(default=0)
+    margin_total = models.IntegerField(default=0, help_text='Sum of (own score - opponent score)')
+    last_played_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_margin(self):
+        return round(self.margin_total / self.played, 1) if self.played else 0
+
+
+class UserHeadToHead(HeadToHeadRecord):
+    """A user's record against another user in decided challenges. Maintained by home.head_to_head."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='head_to_head')
+    opponent = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'opponent'], name='uniq_user_head_to_head'),
+        ]
+
+    def __str__(self):
+        return f"UserHeadToHead({self.user_id} v {self.opponent_id}: {self.wins}-{self.losses}-{self.draws})"
+
+
+class GroupHeadToHead(HeadToHeadRecord):
+    """A group's record against another group in decided challenges. Maintained by home.head_to_head."""
+    group = models.ForeignKey('TriviaGroup', on_delete=models.CASCADE, related_name='head_to_head')
+    opponent = models.ForeignKey('TriviaGroup', on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'opponent'], name='uniq_group_head_to_head'),
+        ]
+
+    def __str__(self):
+        return f"GroupHeadToHead({self.group_id} v {self.opponent_id}: {self.wins}-{self.losses}-{self.draws})"
@@ -0,0 +1,37 @@
+"""
+Keyset ("seek") pagination over (created_at, pk), newest first.
+
+A page is fetched with ``WHERE (created_at, pk) < cursor`` instead of an
+OFFSET, so deep pages cost the same as the first one and no COUNT(*) is
+needed. Cursors are opaque strings of the form ``<microseconds>_<pk>``.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(obj):
+    return f'{(obj.created_at - _EPOCH) // timedelta(microseconds=1)}_{obj.pk}'
+
+
+def decode_cursor(cursor):
+    """Return (created_at, pk) for a cursor, or None if it is malformed."""
+    try:
+        micros, pk = (int(part) for part in (cursor or '').split('_'))
+    except ValueError:
+        return None
+    return _EPOCH + timedelta(microseconds=micros), pk
+
+
+def keyset_page(queryset, cursor, page_size):
+    """Return (objects, next_cursor) for the page after ``cursor`` (first page if None)."""
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    objects = list(queryset.order_by('-created_at', '-pk')[:page_size + 1])
+    next_cursor = encode_cursor(objects[page_size - 1]) if len(objects) > page_size else None
+    return objects[:page_size], next_cursor
@@ -0,0 +1,143 @@
+"""
+Random question sampling for quick-created quizzes.
+
+The ids of active questions are cached per (activity, difficulty), split
+by level (a question is filed under its ``level`` and every entry of its
+``allowed_levels``). Sampling k questions unions the id arrays of the
+requested activities, draws k ids without replacement and fetches only
+those rows, so the cost does not grow with the size of the question bank.
+Arrays live under a global pool version that ``home.signals`` bumps when a
+question or its activities change.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Question
+
+
+QUESTION_POOL_CACHE_TIMEOUT = getattr(settings, 'QUESTION_POOL_CACHE_TIMEOUT', 60 * 60)
+
+_POOL_VERSION_KEY = 'question_pool:version'
+ALL_LEVELS = 'All'
+
+
+def get_pool_version():
+    version = cache.get(_POOL_VERSION_KEY)
+    if version is None:
+        # Seeded from the clock, as with quiz versions in home.scoring
+        cache.add(_POOL_VERSION_KEY, int(timezone.now().timestamp() * 1000), None)
+        version = cache.get(_POOL_VERSION_KEY)
+    return version
+
+
+def bump_pool_version():
+    """Invalidate every cached candidate array."""
+    try:
+        cache.incr(_POOL_VERSION_KEY)
+    except ValueError:
+        get_pool_version()
+        try:
+            cache.incr(_POOL_VERSION_KEY)
+        except ValueError:
+            pass
+
+
+def _pool_cache_key(version, activity_id, difficulty):
+    return f'question_pool:v{version}:{activity_id}:{difficulty}'
+
+
+def _load_pools(activity_ids, version):
+    """Read {activity_id: {difficulty: {level: [ids]}}} with one query and cache it."""
+    pools = {
+        activity_id: {difficulty: {} for difficulty, _ in Question.DIFFICULTY_CHOICES}
+        for activity_id in activity_ids
+    }
+    rows = (
+        Question.objects
+        .filter(is_active=True, activities__in=activity_ids)
+        .order_by('pk')
+        .values_list('activities', 'difficulty', 'pk', 'level', 'allowed_levels')
+    )
+    for activity_id, difficulty, pk, level, allowed_levels in rows:
+        by_level = pools[activity_id].setdefault(difficulty, {})
+        for lvl in {level or ALL_LEVELS, *(allowed_levels or ())}:
+            by_level.setdefault(lvl, []).append(pk)
+    cache.set_many(
+        {
+            _pool_cache_key(version, activity_id, difficulty): by_level
+            for activity_id, by_difficulty in pools.items()
+            for difficulty, by_level in by_difficulty.items()
+        },
+        QUESTION_POOL_CACHE_TIMEOUT,
+    )
+    return pools
+
+
+def candidate_ids(activity_ids, difficulties, level=None):
+    """
+    Return {difficulty: [question ids]} of active questions in any of the
+    given activities. With a ``level``, only questions filed under that
+    level or under 'All' are kept.
+    """
+    activity_ids = sorted({int(a) for a in activity_ids})
+    version = get_pool_version()
+    keys = {
+        (activity_id, difficulty): _pool_cache_key(version, activity_id, difficulty)
+        for activity_id in activity_ids
+        for difficulty in difficulties
+    }
+    cached = cache.get_many(keys.values())
+    missing = sorted({activity_id for (activity_id, _), key in keys.items() if key not in cached})
+    loaded = _load_pools(missing, version) if missing else {}
+
+    candidates = {}
+    for difficulty in difficulties:
+        arrays = []
+        for activity_id in activity_ids:
+            if activity_id in loaded:
+                by_level = loaded[activity_id].get(difficulty, {})
+            else:
+                by_level = cached[keys[(activity_id, difficulty)]]
+            if level is None:
+                arrays.extend(by_level.values())
+            else:
+                arrays.extend(by_level.get(lvl, []) for lvl in {level, ALL_LEVELS})
+        if len(arrays) == 1:
+            candidates[difficulty] = arrays[0]
+        else:
+            # Questions in several activities or levels appear once
+            candidates[difficulty] = list(dict.fromkeys(pk for array in arrays for pk in array))
+    return candidates
+
+
+def sample_questions(activity_ids, counts, level=None, rng=random):
+    """
+    Draw ``counts[difficulty]`` random questions per difficulty without
+    replacement. A difficulty short of questions is made up from whatever
+    the other difficulties have left. Returns (questions, selected_counts).
+    """
+    pools = candidate_ids(activity_ids, list(counts), level=level)
+    chosen = {}
+    shortage = 0
+    for difficulty, need in counts.items():
+        pool = pools.get(difficulty, [])
+        take = min(len(pool), max(need, 0))
+        chosen[difficulty] = rng.sample(pool, take)
+        shortage += max(need, 0) - take
+    if shortage:
+        taken = {pk for ids in chosen.values() for pk in ids}
+        remaining = [
+            (difficulty, pk)
+            for difficulty, pool in pools.items()
+            for pk in pool
+            if pk not in taken
+        ]
+        for difficulty, pk in rng.sample(remaining, min(shortage, len(remaining))):
+            chosen[difficulty].append(pk)
+
+    ids = [pk for ids in chosen.values() for pk in ids]
+    questions = list(Question.objects.filter(pk__in=ids, is_active=True))
+    return questions, {difficulty: len(ids) for difficulty, ids in chosen.items()}
@@ -0,0 +1,73 @@
+"""
+Serialized, cached render payload for a TestQuiz.
+
+The payload holds everything the quiz pages need to render (questions,
+choices, allow_multiple flags, counts, time limit) as plain dicts. It is
+built once per quiz version and shared by the take, detail and results
+views; it is invalidated together with the answer key (see
+``home.scoring.bump_quiz_version``).
+"""
+from django.core.cache import cache
+
+from .models import Question, TestQuiz
+from .scoring import get_quiz_version, QUIZ_CACHE_TIMEOUT
+
+
+def build_quiz_payload(quiz, version=None):
+    """Serialize a quiz's questions and choices (two queries)."""
+    questions = (
+        Question.objects
+        .filter(test_quizzes__id=quiz.pk)
+        # Same question order as the answer key (home.scoring.build_answer_key)
+        .order_by('-created_at', 'id')
+        .prefetch_related('choices')
+    )
+    items = []
+    for q in questions:
+        choices = [
+            {
+                'id': c.id,
+                'choice_text': c.choice_text,
+                'is_correct': c.is_correct,
+                'explanation': c.explanation,
+            }
+            for c in q.choices.all()
+        ]
+        correct_count = sum(1 for c in choices if c['is_correct'])
+        items.append({
+            'id': q.id,
+            'question_text': q.question_text,
+            'question_type': q.question_type,
+            'bible_reference': q.bible_reference,
+            'explanation': q.explanation,
+            'difficulty': q.difficulty,
+            'points': q.points,
+            'penalty': q.penalty,
+            'allow_multiple': q.question_type == 'multiple' or correct_count > 1,
+            'choices': choices,
+        })
+    question_count = len(items)
+    return {
+        'quiz_id': quiz.pk,
+        'version': version,
+        'time_limit': quiz.time_limit,
+        'question_count': question_count,
+        'estimated_duration': quiz.time_limit or question_count,
+        'total_points': sum(item['points'] for item in items),
+        'questions': items,
+        'allow_multiple_ids': [item['id'] for item in items if item['allow_multiple']],
+    }
+
+
+def get_quiz_payload(quiz):
+    """Return the cached payload for a quiz (instance or id), building it on a miss."""
+    quiz_id = getattr(quiz, 'pk', quiz)
+    version = get_quiz_version(quiz_id)
+    key = f'quiz:{quiz_id}:payload:v{version}'
+    payload = cache.get(key)
+    if payload is None:
+        if not isinstance(quiz, TestQuiz):
+            quiz = TestQuiz.objects.get(pk=quiz_id)
+        payload = build_quiz_payload(quiz, version=version)
+        cache.set(key, payload, QUIZ_CACHE_TIMEOUT)
+    return payload
@@ -0,0 +1,211 @@
+"""
+Full rebuild of UserRanking / GroupRanking, their RankingBucket periods and
+the ChurchRanking rollup from the stored responses.
+
+Live rankings are maintained incrementally (``home.rankings``), so a lost
+signal or deleted rows leave them drifting with no way back. The rebuild
+reduces the responses of completed attempts to one (owner, day) -> (points,
+penalty) row per owner and day with grouped SQL, one query per page of
+``chunk_size`` owners (paged over the owner ids that actually have
+completed attempts, so sparse ids cost no empty queries); penalties are
+summed in SQL from the same ``wrong_selected`` and ``question_penalty``
+metadata that ``ranking_delta`` reads. With ``workers`` the pages are
+aggregated by a process pool. The day rows are folded into totals and
+week / month / season buckets in memory.
+
+The whole rebuild runs in one transaction that first takes a write lock on
+the ranking tables (LOCK TABLE on PostgreSQL, the database write lock on
+SQLite). Live deltas (``home.rankings``) wait for it, so an attempt either
+committed before the lock and is aggregated, or has its delta applied on
+top of the rebuilt totals afterwards; none is lost to the swap. Readers,
+including the aggregation workers, are not blocked and see the old
+standings until the new totals and buckets replace them at commit
+(ratings on the ranking rows are kept). Submissions stall for the length
+of the rebuild (on SQLite, up to the connection's busy timeout before they
+fail), so run it when they are quiet.
+"""
+import multiprocessing
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import F, IntegerField, Sum, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, TruncDate
+from django.utils import timezone
+
+from .church_rankings import rebuild_church_rankings
+from .leaderboard_snapshots import bump_leaderboard_version
+from .models import (
+    ChurchRanking, GroupRanking, GroupResponse, GroupTestQuizAttempt, RankingBucket, TestQuizAttempt, UserRanking,
+    UserResponse,
+)
+from .rankings import period_starts
+
+
+RebuildResult = namedtuple('RebuildResult', ['users', 'groups', 'buckets', 'ranges', 'seconds'])
+
+# (ranking owner, response model, ranking model)
+REBUILD_TARGETS = (
+    ('user', UserResponse, UserRanking),
+    ('group', GroupResponse, GroupRanking),
+)
+_RESPONSE_MODELS = {owner: response_model for owner, response_model, _ in REBUILD_TARGETS}
+_ATTEMPT_MODELS = {'user': TestQuizAttempt, 'group': GroupTestQuizAttempt}
+
+
+def _metadata_int(key):
+    return Coalesce(Cast(KT(f'metadata__{key}'), IntegerField()), Value(0))
+
+
+def aggregate_range(owner, low, high):
+    """[(owner id, day, points, penalty)] for owners with ``low <= id < high``, in one grouped query."""
+    attempt_owner = f'attempt__{owner}_id'
+    rows = (
+        _RESPONSE_MODELS[owner].objects
+        .filter(**{'attempt__status': 'completed', f'{attempt_owner}__gte': low, f'{attempt_owner}__lt': high})
+        .annotate(
+            owner_id=F(attempt_owner),
+            # Live rankings fall back to the time of the update for attempts without completed_at
+            day=TruncDate(Coalesce('attempt__completed_at', 'attempt__updated_at')),
+        )
+        .order_by()
+        .values('owner_id', 'day')
+        .annotate(
+            points=Coalesce(Sum('points_awarded'), 0),
+            penalty=Coalesce(Sum(_metadata_int('wrong_selected') * _metadata_int('question_penalty')), 0),
+        )
+        .values_list('owner_id', 'day', 'points', 'penalty')
+    )
+    return list(rows)
+
+
+def _aggregate_task(task):
+    owner, low, high = task
+    return owner, aggregate_range(owner, low, high)
+
+
+def _init_worker():
+    # Workers are spawned, so they start without Django or any connection
+    import django
+    django.setup()
+
+
+def _ranges(chunk_size):
+    """
+    (owner, low, high) owner id ranges, each covering ``chunk_size`` owners
+    with completed attempts, paged over those owners' ids.
+    """
+    tasks = []
+    for owner, _, _ in REBUILD_TARGETS:
+        field = f'{owner}_id'
+        owner_ids = (
+            _ATTEMPT_MODELS[owner].objects
+            .filter(status='completed', **{f'{field}__isnull': False})
+            .order_by(field)
+            .values_list(field, flat=True)
+            .distinct()
+        )
+        last = 0
+        while True:
+            page = list(owner_ids.filter(**{f'{field}__gt': last})[:chunk_size])
+            if not page:
+                break
+            tasks.append((owner, page[0], page[-1] + 1))
+            last = page[-1]
+    return tasks
+
+
+def _lock_rankings():
+    """Block live ranking deltas until the current transaction ends; readers are not blocked."""
+    connection = connections[UserRanking.objects.db]
+    if connection.vendor == 'postgresql':
+        tables = ', '.join(
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (UserRanking, GroupRanking, RankingBucket, ChurchRanking)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE')
+    else:
+        # Any write takes SQLite's database-wide write lock, even one that matches no rows
+        UserRanking.objects.filter(pk=-1).update(points=F('points'))
+
+
+def _swap(totals, buckets):
+    now = timezone.now()
+    with transaction.atomic():
+        for owner, _, model in REBUILD_TARGETS:
+            model.objects.update(points=0, penalty=0, updated_at=now)
+            model.objects.bulk_create(
+                [
+                    model(**{f'{owner}_id': owner_id}, points=points, penalty=penalty, updated_at=now)
+                    for (row_owner, owner_id), (points, penalty) in totals.items()
+                    if row_owner == owner
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=[owner],
+                update_fields=['points', 'penalty', 'updated_at'],
+            )
+        RankingBucket.objects.all().delete()
+        RankingBucket.objects.bulk_create(
+            [
+                RankingBucket(
+                    **{f'{owner}_id': owner_id}, granularity=granularity, period_start=start,
+                    points=points, penalty=penalty,
+                )
+                for (owner, owner_id, granularity, start), (points, penalty) in buckets.items()
+            ],
+            batch_size=1000,
+        )
+        rebuild_church_rankings()
+        transaction.on_commit(bump_leaderboard_version)
+
+
+def _aggregate(chunk_size, workers):
+    """(totals, buckets, tasks) folded from every owner range."""
+    tasks = _ranges(chunk_size)
+    if workers > 1 and len(tasks) > 1:
+        # Spawned, not forked: children must not inherit the locked connection
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+            results = list(pool.map(_aggregate_task, tasks))
+    else:
+        results = [_aggregate_task(task) for task in tasks]
+
+    totals = defaultdict(lambda: [0, 0])
+    buckets = defaultdict(lambda: [0, 0])
+    for owner, rows in results:
+        for owner_id, day, points, penalty in rows:
+            total = totals[(owner, owner_id)]
+            total[0] += points
+            total[1] += penalty
+            for granularity, start in period_starts(day).items():
+                bucket = buckets[(owner, owner_id, granularity, start)]
+                bucket[0] += points
+                bucket[1] += penalty
+    return totals, buckets, tasks
+
+
+def rebuild_rankings(chunk_size=1000, workers=0, dry_run=False):
+    """
+    Recompute every ranking, bucket and church rollup from the responses.
+    ``workers`` > 1 aggregates the owner id ranges in that many processes.
+    Returns a RebuildResult.
+    """
+    started = time.monotonic()
+    with transaction.atomic():
+        if not dry_run:
+            # Held until the swap commits, so no live delta lands in between
+            _lock_rankings()
+        totals, buckets, tasks = _aggregate(chunk_size, workers)
+        if not dry_run:
+            _swap(totals, buckets)
+    return RebuildResult(
+        sum(1 for owner, _ in totals if owner == 'user'),
+        sum(1 for owner, _ in totals if owner == 'group'),
+        len(buckets),
+        len(tasks),
+        time.monotonic() - started,
+    )
@@ -0,0 +1,113 @@
+"""
+Ranking maintenance for UserRanking / GroupRanking and their RankingBucket
+periods.
+
+Rankings are updated once per completed attempt: points and penalty are
+summed across all of the attempt's responses and applied in a single
+UPDATE built from F() expressions, so concurrent submissions never
+overwrite each other's totals. The same totals are added to the attempt's
+week, month and season buckets with one insert-or-ignore and one UPDATE
+over the three rows, and group totals to their church's ChurchRanking.
+Negative corrections (see ``home.rescoring``) floor every total at zero: a
+bucket created empty for a period that predates the buckets has nothing
+left to subtract from.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .church_rankings import apply_church_delta
+from .models import UserRanking, GroupRanking, RankingBucket
+
+
+# Seasons are consecutive runs of this many months, starting in January
+RANKING_SEASON_MONTHS = getattr(settings, 'RANKING_SEASON_MONTHS', 3)
+
+GRANULARITIES = ('week', 'month', 'season')
+
+
+def period_start(granularity, when):
+    """First day of the week (Monday), month or season containing ``when``."""
+    day = timezone.localtime(when).date() if isinstance(when, datetime.datetime) else when
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'season':
+        return day.replace(month=day.month - (day.month - 1) % RANKING_SEASON_MONTHS, day=1)
+    return day.replace(day=1)
+
+
+def period_starts(when):
+    """{granularity: period start} for every bucket ``when`` falls in."""
+    return {granularity: period_start(granularity, when) for granularity in GRANULARITIES}
+
+
+def ranking_delta(responses):
+    """Sum (points, penalty) over response rows using their penalty metadata."""
+    points = 0
+    penalty = 0
+    for resp in responses:
+        points += int(resp.points_awarded or 0)
+        meta = resp.metadata or {}
+        wrong = int(meta.get('wrong_selected', 0) or 0)
+        qpen = int(meta.get('question_penalty', 0) or 0)
+        penalty += wrong * qpen
+    return points, penalty
+
+
+def _added(field, delta):
+    """``field + delta`` floored at zero, for the unsigned total columns."""
+    return Greatest(F(field) + delta, 0)
+
+
+def _apply_delta(model, lookup, points, penalty, when):
+    # Insert-or-ignore then increment: no read-modify-write window
+    model.objects.bulk_create([model(**lookup)], ignore_conflicts=True)
+    updated = model.objects.filter(**lookup).update(
+        points=_added('points', points),
+        penalty=_added('penalty', penalty),
+        updated_at=timezone.now(),
+    )
+    starts = period_starts(when)
+    RankingBucket.objects.bulk_create(
+        [RankingBucket(**lookup, granularity=g, period_start=start) for g, start in starts.items()],
+        ignore_conflicts=True,
+    )
+    periods = Q()
+    for granularity, start in starts.items():
+        periods |= Q(granularity=granularity, period_start=start)
+    RankingBucket.objects.filter(periods, **lookup).update(
+        points=_added('points', points),
+        penalty=_added('penalty', penalty),
+        updated_at=timezone.now(),
+    )
+    if model is GroupRanking:
+        apply_church_delta(lookup['group_id'], points, penalty)
+    return updated
+
+
+def apply_attempt_ranking(attempt, responses):
+    """
+    Apply a completed attempt's totals to its ranking row.
+    Individual attempts count toward UserRanking; group attempts count
+    strictly toward GroupRanking.
+    """
+    points, penalty = ranking_delta(responses)
+    when = attempt.completed_at or timezone.now()
+    group_id = getattr(attempt, 'group_id', None)
+    if group_id:
+        return _apply_delta(GroupRanking, {'group_id': group_id}, points, penalty, when)
+    if getattr(attempt, 'user_id', None):
+        return _apply_delta(UserRanking, {'user_id': attempt.user_id}, points, penalty, when)
+    return 0
+
+
+def apply_ranking_correction(owner, owner_id, points, penalty, when):
+    """
+    Apply a signed (points, penalty) correction to a 'user' or 'group'
+    ranking row, e.g. after historical attempts are re-scored.
+    """
+    model = GroupRanking if owner == 'group' else UserRanking
+    return _apply_delta(model, {f'{owner}_id': owner_id}, points, penalty, when)
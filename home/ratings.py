@@ -0,0 +1,289 @@
+"""
+Glicko ratings for users and groups from decided challenges.
+
+A completed challenge is recorded once as a ChallengeOutcome. Its active
+participants are ordered by rounds won (the best-of majority), then total
+score, from the materialized standings; declined or unapproved participants
+are left out. Every pair of placed participants counts as one game (win,
+loss or draw) and all games of a challenge are rated together against the
+pre-challenge ratings (Glicko-1, one rating period per challenge).
+Ratings live on UserRanking / GroupRanking, indexed by rating. The same
+games feed the head-to-head records (home.head_to_head), and group
+challenges also update TriviaGroup's competition record and the groups'
+ChurchRanking rollups. ``average_score`` is capped at the largest
+value its DecimalField holds, so a group averaging more cannot make the
+whole update fail.
+
+``record_challenge_outcome`` applies one challenge incrementally (wired in
+``home.signals``); ``replay_ratings`` recomputes everything from the
+outcome history in decided order, e.g. after changing the constants.
+"""
+import math
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .church_rankings import apply_church_win, rebuild_church_rankings, refresh_group_churches
+from .head_to_head import HeadToHeadTally, record_head_to_head
+from .models import (
+    Challenge, ChallengeOutcome, ChallengeStanding, GroupRanking, TriviaGroup, UserRanking,
+)
+from .standings import rebuild_standings, valid_participants
+
+
+RATING_INITIAL = getattr(settings, 'RATING_INITIAL', 1500.0)
+RATING_INITIAL_DEVIATION = getattr(settings, 'RATING_INITIAL_DEVIATION', 350.0)
+RATING_MIN_DEVIATION = getattr(settings, 'RATING_MIN_DEVIATION', 30.0)
+# Deviation regained per idle day: roughly a year from settled back to new
+RATING_DEVIATION_GROWTH = getattr(settings, 'RATING_DEVIATION_GROWTH', 18.0)
+
+_Q = math.log(10) / 400
+
+Rating = namedtuple('Rating', ['rating', 'deviation', 'challenges', 'last_rated_at'])
+NEW_RATING = Rating(RATING_INITIAL, RATING_INITIAL_DEVIATION, 0, None)
+
+ReplayResult = namedtuple('ReplayResult', ['outcomes', 'users', 'groups'])
+
+_RATING_FIELDS = ['rating', 'rating_deviation', 'rated_challenges', 'last_rated_at']
+
+_average_score_field = TriviaGroup._meta.get_field('average_score')
+# Largest value the column holds, e.g. 999.99 for max_digits=5, decimal_places=2
+AVERAGE_SCORE_MAX = (
+    Decimal(10) ** (_average_score_field.max_digits - _average_score_field.decimal_places)
+    - Decimal(10) ** -_average_score_field.decimal_places
+)
+
+
+def _g(deviation):
+    return 1 / math.sqrt(1 + 3 * _Q ** 2 * deviation ** 2 / math.pi ** 2)
+
+
+def _aged_deviation(rating, when):
+    """Deviation grown for the time since the last rated challenge."""
+    if rating.last_rated_at is None:
+        return rating.deviation
+    days = max((when - rating.last_rated_at).total_seconds() / 86400, 0)
+    return min(math.sqrt(rating.deviation ** 2 + RATING_DEVIATION_GROWTH ** 2 * days), RATING_INITIAL_DEVIATION)
+
+
+def glicko_update(player, results, when):
+    """Return ``player``'s new Rating after ``results``, a list of (opponent Rating, score 0/0.5/1)."""
+    if not results:
+        return player
+    deviation = _aged_deviation(player, when)
+    information = 0.0
+    surprise = 0.0
+    for opponent, score in results:
+        g = _g(_aged_deviation(opponent, when))
+        expected = 1 / (1 + 10 ** (-g * (player.rating - opponent.rating) / 400))
+        information += _Q ** 2 * g ** 2 * expected * (1 - expected)
+        surprise += g * (score - expected)
+    precision = 1 / deviation ** 2 + information
+    return Rating(
+        player.rating + _Q / precision * surprise,
+        max(math.sqrt(1 / precision), RATING_MIN_DEVIATION),
+        player.challenges + 1,
+        when,
+    )
+
+
+def rate_challenge(ratings, placings, when):
+    """
+    Rate one challenge. ``placings`` maps owner id -> (rounds won, total
+    score); ``ratings`` maps owner id -> current Rating. Returns the new
+    Rating of every placed owner.
+    """
+    updated = {}
+    for owner_id, key in placings.items():
+        results = [
+            (ratings.get(other_id, NEW_RATING), 1.0 if key > other_key else 0.5 if key == other_key else 0.0)
+            for other_id, other_key in placings.items()
+            if other_id != owner_id
+        ]
+        updated[owner_id] = glicko_update(ratings.get(owner_id, NEW_RATING), results, when)
+    return updated
+
+
+def _owner(mode):
+    """(ranking model, owner field) for a challenge mode."""
+    return (GroupRanking, 'group') if mode == 'group' else (UserRanking, 'user')
+
+
+def _standing_rows(challenge_ids):
+    """
+    Map challenge id -> [(participant id, user id, group id, rounds won, total
+    score)] for the active participants; declined or unapproved ones are
+    neither placed, rated nor counted in group records.
+    """
+    rows = defaultdict(list)
+    standings = (
+        ChallengeStanding.objects
+        .filter(challenge_id__in=challenge_ids, participant__is_active=True)
+        .order_by('challenge_id', 'rank', 'participant_id')
+        .values_list(
+            'challenge_id', 'participant_id', 'participant__user_id', 'participant__group_id',
+            'rounds_won', 'total_score',
+        )
+    )
+    for challenge_id, *row in standings:
+        rows[challenge_id].append(tuple(row))
+    return rows
+
+
+def _decide(mode, rows):
+    """Return (placings by owner id, winning participant id or None, rated?) for standing rows."""
+    owner_index = 2 if mode == 'group' else 1
+    placings = {row[owner_index]: (row[3], row[4]) for row in rows if row[owner_index]}
+    keys = sorted(((row[3], row[4]), row[0]) for row in rows)
+    winner_id = None
+    if len(keys) == 1 or (len(keys) > 1 and keys[-1][0] > keys[-2][0]):
+        winner_id = keys[-1][1]
+    rated = len(placings) >= 2 and any(score for _, score in placings.values())
+    return placings, winner_id, rated
+
+
+def _load_ratings(model, owner, owner_ids, lock=False):
+    model.objects.bulk_create([model(**{f'{owner}_id': pk}) for pk in owner_ids], ignore_conflicts=True)
+    rows = model.objects.filter(**{f'{owner}_id__in': list(owner_ids)})
+    if lock:
+        rows = rows.select_for_update()
+    return {getattr(row, f'{owner}_id'): row for row in rows}
+
+
+def _store_ratings(model, rankings, ratings):
+    for owner_id, rating in ratings.items():
+        ranking = rankings[owner_id]
+        ranking.rating, ranking.rating_deviation, ranking.rated_challenges, ranking.last_rated_at = rating
+    model.objects.bulk_update([rankings[pk] for pk in ratings], _RATING_FIELDS, batch_size=1000)
+
+
+def _record_group_results(rows, winner_id):
+    # One UPDATE per group; F() keeps concurrent challenges from overwriting each other
+    for participant_id, _, group_id, _, total_score in rows:
+        if not group_id:
+            continue
+        TriviaGroup.objects.filter(pk=group_id).update(
+            total_competitions=F('total_competitions') + 1,
+            wins=F('wins') + (1 if participant_id == winner_id else 0),
+            total_points=F('total_points') + total_score,
+            average_score=Least(
+                ExpressionWrapper(
+                    (F('total_points') + total_score) * Value(1.0) / (F('total_competitions') + 1),
+                    output_field=DecimalField(max_digits=5, decimal_places=2),
+                ),
+                Value(AVERAGE_SCORE_MAX),
+            ),
+        )
+        if participant_id == winner_id:
+            apply_church_win(group_id)
+
+
+def record_challenge_outcome(challenge_id, now=None):
+    """
+    Record a completed challenge and apply it to ratings and group records.
+    Each challenge is applied once; returns the new ChallengeOutcome or None.
+    """
+    challenge = Challenge.objects.filter(pk=challenge_id, status='completed').first()
+    if challenge is None or ChallengeOutcome.objects.filter(challenge=challenge).exists():
+        return None
+    now = now or timezone.now()
+    if challenge.standings.count() != valid_participants(challenge).count():
+        rebuild_standings(challenge)
+    rows = _standing_rows([challenge.pk])[challenge.pk]
+    placings, winner_id, rated = _decide(challenge.mode, rows)
+    with transaction.atomic():
+        outcome, created = ChallengeOutcome.objects.get_or_create(
+            challenge=challenge,
+            defaults={'mode': challenge.mode, 'decided_at': now, 'winner_id': winner_id, 'rated': rated},
+        )
+        if not created:
+            return None
+        if rated:
+            model, owner = _owner(challenge.mode)
+            rankings = _load_ratings(model, owner, placings, lock=True)
+            current = {
+                pk: Rating(r.rating, r.rating_deviation, r.rated_challenges, r.last_rated_at)
+                for pk, r in rankings.items()
+            }
+            _store_ratings(model, rankings, rate_challenge(current, placings, now))
+            record_head_to_head(challenge.mode, placings, now)
+            if challenge.mode == 'group':
+                refresh_group_churches(*placings)
+        if challenge.mode == 'group':
+            _record_group_results(rows, winner_id)
+    return outcome
+
+
+def replay_ratings(chunk_size=2000):
+    """
+    Recompute every rating, head-to-head and group record from the outcome
+    history.
+
+    Completed challenges without an outcome are recorded first (decided at
+    their last update). Outcomes are then re-decided from the current
+    standings and replayed in decided order in memory, ``chunk_size``
+    challenges per standings query; the results are written in one
+    transaction. Returns a ReplayResult.
+    """
+    ChallengeOutcome.objects.bulk_create(
+        [
+            ChallengeOutcome(challenge_id=pk, mode=mode, decided_at=updated_at)
+            for pk, mode, updated_at in Challenge.objects
+            .filter(status='completed', outcome__isnull=True)
+            .values_list('pk', 'mode', 'updated_at')
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    outcomes = list(ChallengeOutcome.objects.order_by('decided_at', 'pk'))
+    ratings = {'individual': {}, 'group': {}}
+    group_records = defaultdict(lambda: [0, 0, 0])  # competitions, wins, points
+    head_to_head = HeadToHeadTally()
+    changed_outcomes = []
+    for start in range(0, len(outcomes), chunk_size):
+        chunk = outcomes[start:start + chunk_size]
+        rows_by_challenge = _standing_rows([o.challenge_id for o in chunk])
+        for outcome in chunk:
+            rows = rows_by_challenge.get(outcome.challenge_id, [])
+            placings, winner_id, rated = _decide(outcome.mode, rows)
+            if (outcome.winner_id, outcome.rated) != (winner_id, rated):
+                outcome.winner_id, outcome.rated = winner_id, rated
+                changed_outcomes.append(outcome)
+            if rated:
+                ratings[outcome.mode].update(rate_challenge(ratings[outcome.mode], placings, outcome.decided_at))
+                head_to_head.add(outcome.mode, placings, outcome.decided_at)
+            if outcome.mode == 'group':
+                for participant_id, _, group_id, _, total_score in rows:
+                    if group_id:
+                        record = group_records[group_id]
+                        record[0] += 1
+                        record[1] += participant_id == winner_id
+                        record[2] += total_score
+
+    with transaction.atomic():
+        ChallengeOutcome.objects.bulk_update(changed_outcomes, ['winner', 'rated'], batch_size=1000)
+        head_to_head.save()
+        for mode, by_owner in ratings.items():
+            model, owner = _owner(mode)
+            model.objects.update(
+                rating=RATING_INITIAL, rating_deviation=RATING_INITIAL_DEVIATION,
+                rated_challenges=0, last_rated_at=None,
+            )
+            _store_ratings(model, _load_ratings(model, owner, by_owner), by_owner)
+        TriviaGroup.objects.update(total_competitions=0, wins=0, total_points=0, average_score=0)
+        groups = list(TriviaGroup.objects.filter(pk__in=list(group_records)))
+        for group in groups:
+            group.total_competitions, group.wins, group.total_points = group_records[group.pk]
+            group.average_score = min(
+                round(Decimal(group.total_points) / group.total_competitions, 2), AVERAGE_SCORE_MAX,
+            )
+        TriviaGroup.objects.bulk_update(
+            groups, ['total_competitions', 'wins', 'total_points', 'average_score'], batch_size=1000,
+        )
+        rebuild_church_rankings()
+    return ReplayResult(len(outcomes), len(ratings['individual']), len(ratings['group']))
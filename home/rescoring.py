@@ -0,0 +1,145 @@
+"""
+Re-scoring of stored attempts after a quiz's answers or points change.
+
+Responses are streamed per quiz in primary-key order (keyset pagination),
+together with their selected-choice rows, and re-graded with the same
+``score_selection`` rules used at submission time. Each chunk is written
+in one transaction: changed responses via bulk_update, their attempts'
+scores via one set-based UPDATE, and the signed difference is applied to
+the ranking rows of completed attempts (challenge standings linking those
+attempts are refreshed in the same transaction). An interrupted run can simply be
+started again; chunks already written no longer differ.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import TestQuizAttempt, GroupTestQuizAttempt, UserResponse, GroupResponse
+from .leaderboard_snapshots import bump_leaderboard_version
+from .rankings import apply_ranking_correction
+from .scoring import build_answer_key, get_quiz_version, score_selection
+from .standings import refresh_for_attempts
+
+
+RescoreResult = namedtuple('RescoreResult', ['responses_checked', 'responses_changed', 'attempts_changed'])
+
+# (response model, attempt model, ranking owner)
+RESCORE_TARGETS = (
+    (UserResponse, TestQuizAttempt, 'user'),
+    (GroupResponse, GroupTestQuizAttempt, 'group'),
+)
+
+
+def _selected_choices(response_model, response_ids):
+    m2m_field = response_model._meta.get_field('selected_choices')
+    through = m2m_field.remote_field.through
+    source, target = m2m_field.m2m_field_name(), m2m_field.m2m_reverse_field_name()
+    selected = defaultdict(list)
+    rows = through.objects.filter(**{f'{source}_id__in': response_ids}).values_list(f'{source}_id', f'{target}_id')
+    for response_id, choice_id in rows:
+        selected[response_id].append(choice_id)
+    return selected
+
+
+def _regrade_chunk(answer_key, response_model, rows):
+    """Return (changed responses, {attempt_id: (points delta, penalty delta)})."""
+    selected = _selected_choices(response_model, [row[0] for row in rows])
+    changed = []
+    deltas = defaultdict(lambda: [0, 0])
+    for response_id, attempt_id, question_id, old_points, metadata in rows:
+        entry = answer_key.entries.get(question_id)
+        if entry is None or entry.question_type == 'open':
+            # Question left the quiz, or is marked by hand: keep what was stored
+            continue
+        points, _, wrong_selected = score_selection(entry, selected.get(response_id))
+        metadata = dict(metadata or {})
+        old_points = int(old_points or 0)
+        old_penalty = int(metadata.get('wrong_selected', 0) or 0) * int(metadata.get('question_penalty', 0) or 0)
+        if (
+            points == old_points
+            and metadata.get('wrong_selected') == wrong_selected
+            and metadata.get('question_penalty') == entry.penalty
+        ):
+            continue
+        metadata.update(wrong_selected=wrong_selected, question_penalty=entry.penalty)
+        changed.append(response_model(pk=response_id, points_awarded=points, metadata=metadata))
+        delta = deltas[attempt_id]
+        delta[0] += points - old_points
+        delta[1] += wrong_selected * entry.penalty - old_penalty
+    return changed, deltas
+
+
+def _write_chunk(response_model, attempt_model, owner, changed, deltas):
+    now = timezone.now()
+    with transaction.atomic():
+        response_model.objects.bulk_update(changed, ['points_awarded', 'metadata'])
+        # Attempt scores are recomputed from their responses in one statement
+        response_total = (
+            response_model.objects
+            .filter(attempt=OuterRef('pk'))
+            .order_by()
+            .values('attempt')
+            .annotate(total=Sum('points_awarded'))
+            .values('total')
+        )
+        attempt_model.objects.filter(pk__in=list(deltas)).update(
+            score=Coalesce(Subquery(response_total, output_field=IntegerField()), Value(0)),
+            updated_at=now,
+        )
+        # Rankings only ever counted completed attempts
+        corrections = defaultdict(lambda: [0, 0, None])
+        completed = (
+            attempt_model.objects
+            .filter(pk__in=list(deltas), status='completed')
+            .values_list('pk', f'{owner}_id', 'completed_at')
+        )
+        for attempt_id, owner_id, completed_at in completed:
+            if owner_id is None:
+                continue
+            when = completed_at or now
+            # Keyed by day so every week, month and season bucket gets its own share
+            correction = corrections[(owner_id, timezone.localtime(when).date())]
+            correction[0] += deltas[attempt_id][0]
+            correction[1] += deltas[attempt_id][1]
+            correction[2] = when
+        for (owner_id, _), (points, penalty, when) in corrections.items():
+            if points or penalty:
+                apply_ranking_correction(owner, owner_id, points, penalty, when)
+        if corrections:
+            transaction.on_commit(bump_leaderboard_version)
+        # Challenge standings that link these attempts
+        refresh_for_attempts(f'{owner}_attempt', deltas)
+
+
+def rescore_quiz(quiz, chunk_size=2000, dry_run=False):
+    """
+    Re-grade every stored response on ``quiz`` against its current answers.
+    Memory use is bounded by ``chunk_size``; returns a RescoreResult.
+    """
+    answer_key = build_answer_key(quiz.pk, version=get_quiz_version(quiz.pk))
+    checked = changed_total = attempts_total = 0
+    for response_model, attempt_model, owner in RESCORE_TARGETS:
+        responses = (
+            response_model.objects
+            .filter(attempt__quiz_id=quiz.pk)
+            .order_by('pk')
+            .values_list('pk', 'attempt_id', 'question_id', 'points_awarded', 'metadata')
+        )
+        last_pk = 0
+        while True:
+            rows = list(responses.filter(pk__gt=last_pk)[:chunk_size])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            checked += len(rows)
+            changed, deltas = _regrade_chunk(answer_key, response_model, rows)
+            if not changed:
+                continue
+            changed_total += len(changed)
+            attempts_total += len(deltas)
+            if not dry_run:
+                _write_chunk(response_model, attempt_model, owner, changed, deltas)
+    return RescoreResult(checked, changed_total, attempts_total)
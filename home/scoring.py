@@ -0,0 +1,143 @@
+"""
+Compiled answer keys and in-memory scoring for TestQuiz submissions.
+
+An answer key maps every question on a quiz to what the scorer needs
+(type, points, penalty, correct and valid choice ids). It is built with a
+single query and kept in the Django cache under a per-quiz version number.
+Editing a question, a choice or the quiz's question list bumps the version
+(see ``home.signals``), so stale keys are simply never read again. The
+version only reaches every worker process through a shared cache backend
+(``CACHES`` in the settings).
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Question
+
+
+QUIZ_CACHE_TIMEOUT = getattr(settings, 'QUIZ_CACHE_TIMEOUT', 60 * 60)
+
+AnswerKeyEntry = namedtuple(
+    'AnswerKeyEntry',
+    ['question_type', 'points', 'penalty', 'correct_ids', 'valid_ids'],
+)
+AnswerKey = namedtuple('AnswerKey', ['quiz_id', 'version', 'question_ids', 'entries'])
+
+
+def _version_cache_key(quiz_id):
+    return f'quiz:{quiz_id}:version'
+
+
+def get_quiz_version(quiz_id):
+    """Return the current cache version for a quiz, initialising it if missing."""
+    key = _version_cache_key(quiz_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never restarts at a
+        # version that still has a stale entry sitting in the cache.
+        cache.add(key, int(timezone.now().timestamp() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_quiz_version(*quiz_ids):
+    """Invalidate every cached artefact for the given quizzes."""
+    for quiz_id in {qid for qid in quiz_ids if qid}:
+        key = _version_cache_key(quiz_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            get_quiz_version(quiz_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                pass
+
+
+def build_answer_key(quiz_id, version=None):
+    """Compile the answer key for a quiz with one LEFT JOIN query."""
+    rows = (
+        Question.objects
+        .filter(test_quizzes__id=quiz_id)
+        .order_by('-created_at', 'id', 'choices__id')
+        .values_list('id', 'question_type', 'points', 'penalty', 'choices__id', 'choices__is_correct')
+    )
+    question_ids = []
+    fields = {}
+    correct = {}
+    valid = {}
+    for qid, qtype, points, penalty, choice_id, is_correct in rows:
+        if qid not in fields:
+            question_ids.append(qid)
+            fields[qid] = (qtype, int(points or 0), int(penalty or 0))
+            correct[qid] = set()
+            valid[qid] = set()
+        if choice_id is None:
+            continue
+        valid[qid].add(choice_id)
+        if is_correct:
+            correct[qid].add(choice_id)
+    entries = {
+        qid: AnswerKeyEntry(
+            question_type=fields[qid][0],
+            points=fields[qid][1],
+            penalty=fields[qid][2],
+            correct_ids=frozenset(correct[qid]),
+            valid_ids=frozenset(valid[qid]),
+        )
+        for qid in question_ids
+    }
+    return AnswerKey(quiz_id=quiz_id, version=version, question_ids=tuple(question_ids), entries=entries)
+
+
+def get_answer_key(quiz):
+    """Return the cached answer key for a quiz (instance or id), building it on a miss."""
+    quiz_id = getattr(quiz, 'pk', quiz)
+    version = get_quiz_version(quiz_id)
+    key = f'quiz:{quiz_id}:answer_key:v{version}'
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = build_answer_key(quiz_id, version=version)
+        cache.set(key, answer_key, QUIZ_CACHE_TIMEOUT)
+    return answer_key
+
+
+def _parse_ids(raw_ids):
+    ids = set()
+    for raw in raw_ids or []:
+        try:
+            ids.add(int(raw))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def score_selection(entry, raw_ids):
+    """
+    Score submitted choice ids against an answer key entry.
+
+    Returns (points_awarded, selected_choice_ids, wrong_selected). Ids that do
+    not belong to the question are ignored. With penalty == 0 multiple-select
+    questions earn proportional credit; otherwise each wrong pick subtracts
+    the penalty, floored at zero.
+    """
+    selected_set = _parse_ids(raw_ids) & entry.valid_ids
+    if not selected_set:
+        return 0, [], 0
+    selected_ids = sorted(selected_set)
+    correct_selected = len(selected_set & entry.correct_ids)
+    wrong_selected = len(selected_set - entry.correct_ids)
+    denom = len(entry.correct_ids)
+    if denom == 0:
+        return 0, selected_ids, wrong_selected
+    if entry.penalty == 0:
+        pts = int(round(entry.points * (correct_selected / denom))) if correct_selected > 0 else 0
+    else:
+        base = entry.points * (correct_selected / denom)
+        pts = int(round(base - (entry.penalty * wrong_selected)))
+        if pts < 0:
+            pts = 0
+    return pts, selected_ids, wrong_selected
@@ -0,0 +1,50 @@
+"""
+Deterministic, seeded shuffling of quiz choices.
+
+Choice order is derived from a per-taker seed instead of ORDER BY RANDOM(),
+so it works on prefetched choices, stays stable across reloads, and can be
+reproduced later from the seed stored on the attempt.
+"""
+import random
+import secrets
+
+
+def new_shuffle_seed():
+    return secrets.token_hex(8)
+
+
+def _session_key(quiz_id, group_id=None):
+    return f'quiz_shuffle_seed:{quiz_id}:{group_id or "individual"}'
+
+
+def get_session_seed(session, quiz_id, group_id=None):
+    """Return the taker's seed for this quiz, creating it on first render."""
+    key = _session_key(quiz_id, group_id)
+    seed = session.get(key)
+    if not seed:
+        seed = new_shuffle_seed()
+        session[key] = seed
+    return seed
+
+
+def pop_session_seed(session, quiz_id, group_id=None):
+    """Consume the seed on submission so the next attempt gets a fresh order."""
+    return session.pop(_session_key(quiz_id, group_id), None)
+
+
+def _item_id(obj):
+    if isinstance(obj, dict):
+        return obj['id']
+    return getattr(obj, 'pk', obj)
+
+
+def seeded_shuffle(items, seed, salt=''):
+    """
+    Return a new list with ``items`` shuffled deterministically for (seed, salt).
+    Accepts model instances or serialized dicts; both shuffle identically.
+    """
+    items = sorted(items, key=_item_id)
+    if not seed:
+        return items
+    random.Random(f'{seed}:{salt}').shuffle(items)
+    return items
@@ -0,0 +1,210 @@
+"""
+Signals for quiz and question pool cache invalidation, attempt completion,
+challenge standings, challenge visibility, tournament brackets, ratings,
+church rankings, leaderboard snapshots and live scoreboards.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver, Signal
+
+from .models import (
+    Question, Choice, TestQuiz, TestQuizAttempt, GroupTestQuizAttempt, TriviaGroup,
+    Challenge, ChallengeParticipant, ChallengeRoundAttempt,
+)
+from .rankings import apply_attempt_ranking
+from .scoring import bump_quiz_version
+from .brackets import advance_challenge
+from .church_rankings import refresh_church_rankings, refresh_group_churches
+from .leaderboard_snapshots import bump_leaderboard_version
+from .live import publish_scoreboard
+from .question_sampler import bump_pool_version
+from .ratings import record_challenge_outcome
+from .standings import refresh_challenge_rounds, refresh_for_attempts, standings_changed
+from .visibility import refresh_challenge_visibility, refresh_group_visibility
+
+
+# Sent inside the submission transaction once an attempt and all of its
+# responses are stored. Arguments: attempt, responses.
+attempt_completed = Signal()
+
+
+def _quiz_ids_for_question(question_id):
+    return list(
+        TestQuiz.questions.through.objects
+        .filter(question_id=question_id)
+        .values_list('testquiz_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=TestQuiz)
+def invalidate_quiz_on_save(sender, instance, **kwargs):
+    bump_quiz_version(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def invalidate_quizzes_on_question_save(sender, instance, created, **kwargs):
+    if created:
+        return
+    bump_quiz_version(*_quiz_ids_for_question(instance.pk))
+
+
+@receiver(pre_delete, sender=Question)
+def invalidate_quizzes_on_question_delete(sender, instance, **kwargs):
+    # Through rows are cascaded away without m2m_changed, so look them up first
+    bump_quiz_version(*_quiz_ids_for_question(instance.pk))
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_quizzes_on_choice_change(sender, instance, **kwargs):
+    bump_quiz_version(*_quiz_ids_for_question(instance.question_id))
+
+
+@receiver(m2m_changed, sender=TestQuiz.questions.through)
+def invalidate_quiz_on_questions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Remember which quizzes lose this question before the rows disappear
+        instance._cleared_quiz_ids = _quiz_ids_for_question(instance.pk)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_quiz_version(instance.pk)
+    elif action == 'post_clear':
+        bump_quiz_version(*getattr(instance, '_cleared_quiz_ids', []))
+    else:
+        bump_quiz_version(*(pk_set or []))
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_pools(sender, instance, **kwargs):
+    bump_pool_version()
+
+
+@receiver(m2m_changed, sender=Question.activities.through)
+def invalidate_question_pools_on_activities_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_pool_version()
+
+
+@receiver(attempt_completed)
+def update_ranking_on_attempt_completed(sender, attempt, responses, **kwargs):
+    if apply_attempt_ranking(attempt, responses):
+        transaction.on_commit(bump_leaderboard_version)
+
+
+def _attempt_field(attempt):
+    return 'group_attempt' if isinstance(attempt, GroupTestQuizAttempt) else 'user_attempt'
+
+
+@receiver(attempt_completed)
+def refresh_standings_on_attempt_completed(sender, attempt, **kwargs):
+    transaction.on_commit(partial(refresh_for_attempts, _attempt_field(attempt), [attempt.pk]))
+
+
+@receiver(post_save, sender=TestQuizAttempt)
+@receiver(post_save, sender=GroupTestQuizAttempt)
+def refresh_standings_on_attempt_save(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(partial(refresh_for_attempts, _attempt_field(instance), [instance.pk]))
+
+
+@receiver(post_save, sender=ChallengeRoundAttempt)
+@receiver(post_delete, sender=ChallengeRoundAttempt)
+def refresh_standings_on_link_change(sender, instance, **kwargs):
+    # Deferred to commit: during a cascading delete the challenge may be gone by then
+    transaction.on_commit(partial(
+        refresh_challenge_rounds, instance.challenge_id, {(instance.participant_id, instance.round_id)}
+    ))
+
+
+@receiver(post_save, sender=ChallengeParticipant)
+@receiver(post_delete, sender=ChallengeParticipant)
+def refresh_standings_on_participant_change(sender, instance, **kwargs):
+    transaction.on_commit(partial(refresh_challenge_rounds, instance.challenge_id, set()))
+
+
+@receiver(standings_changed)
+def publish_scoreboard_on_standings_changed(sender, challenge, **kwargs):
+    # One snapshot per change, shared by every open viewer
+    transaction.on_commit(partial(publish_scoreboard, challenge))
+
+
+@receiver(post_save, sender=Challenge)
+def refresh_visibility_on_challenge_save(sender, instance, **kwargs):
+    transaction.on_commit(partial(refresh_challenge_visibility, instance.pk))
+
+
+@receiver(post_save, sender=ChallengeParticipant)
+@receiver(post_delete, sender=ChallengeParticipant)
+def refresh_visibility_on_participant_change(sender, instance, **kwargs):
+    # Deferred like standings: during a cascading delete the challenge may be gone by then
+    transaction.on_commit(partial(refresh_challenge_visibility, instance.challenge_id))
+
+
+@receiver(post_save, sender=TriviaGroup)
+def refresh_visibility_on_group_save(sender, instance, created, **kwargs):
+    # Captain or patron may have changed; a new group takes part in nothing yet
+    if not created:
+        transaction.on_commit(partial(refresh_group_visibility, instance.pk))
+
+
+def _members_changed_group_ids(instance, action, reverse, pk_set):
+    """Groups whose members changed in a members m2m_changed, or None before the change."""
+    if action == 'pre_clear' and reverse:
+        # user.trivia_groups.clear(): remember the groups before the rows disappear
+        instance._cleared_group_ids = list(instance.trivia_groups.values_list('pk', flat=True))
+        return None
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return None
+    if not reverse:
+        return [instance.pk]
+    if action == 'post_clear':
+        return getattr(instance, '_cleared_group_ids', [])
+    return list(pk_set or [])
+
+
+@receiver(m2m_changed, sender=TriviaGroup.members.through)
+def refresh_visibility_on_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    group_ids = _members_changed_group_ids(instance, action, reverse, pk_set)
+    if group_ids is not None:
+        transaction.on_commit(partial(refresh_group_visibility, *group_ids))
+
+
+@receiver(pre_save, sender=TriviaGroup)
+def remember_group_church(sender, instance, **kwargs):
+    # A group moved to another church leaves its old church's rollup behind
+    instance._previous_church_id = (
+        TriviaGroup.objects.filter(pk=instance.pk).values_list('church_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=TriviaGroup)
+@receiver(post_delete, sender=TriviaGroup)
+def refresh_church_ranking_on_group_change(sender, instance, **kwargs):
+    church_ids = {instance.church_id, getattr(instance, '_previous_church_id', None)}
+    transaction.on_commit(partial(refresh_church_rankings, *church_ids))
+
+
+@receiver(m2m_changed, sender=TriviaGroup.members.through)
+def refresh_church_ranking_on_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    group_ids = _members_changed_group_ids(instance, action, reverse, pk_set)
+    if group_ids is not None:
+        transaction.on_commit(partial(refresh_group_churches, *group_ids))
+
+
+@receiver(post_save, sender=Challenge)
+def advance_tournament_on_challenge_completed(sender, instance, **kwargs):
+    if instance.status == 'completed':
+        transaction.on_commit(partial(advance_challenge, instance.pk))
+
+
+@receiver(post_save, sender=Challenge)
+def rate_challenge_on_completed(sender, instance, **kwargs):
+    if instance.status == 'completed':
+        transaction.on_commit(partial(record_challenge_outcome, instance.pk))
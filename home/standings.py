@@ -0,0 +1,221 @@
+"""
+Challenge standings computed from linked attempts.
+
+A challenge's ChallengeRoundAttempt rows are reduced in one grouped query
+to (participant, round) -> (score, time). Those sums are materialized in
+ChallengeRoundScore and ranked into ChallengeStanding; when a link is
+added or removed, or a linked attempt's score changes, only that
+participant's round is re-summed and the challenge's (small) standings
+table is re-ranked from the stored round scores. ``standings_changed``
+is sent after every re-rank.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Q, Sum
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Challenge, ChallengeParticipant, ChallengeRoundAttempt, ChallengeRoundScore, ChallengeStanding
+
+
+# Sent after a challenge's standings were re-ranked. Arguments: challenge.
+standings_changed = Signal()
+
+
+def _attempt_field(challenge):
+    return 'user_attempt' if challenge.mode == 'individual' else 'group_attempt'
+
+
+def round_scores(challenge, **link_filters):
+    """
+    Map (participant_id, round_id) -> (score, seconds) for a challenge's
+    linked attempts, optionally narrowed by ``link_filters``.
+    """
+    attempt = _attempt_field(challenge)
+    duration = ExpressionWrapper(
+        F(f'{attempt}__completed_at') - F(f'{attempt}__created_at'),
+        output_field=DurationField(),
+    )
+    rows = (
+        ChallengeRoundAttempt.objects
+        .filter(challenge=challenge, **{f'{attempt}__isnull': False}, **link_filters)
+        .values('participant_id', 'round_id')
+        .annotate(
+            score=Sum(f'{attempt}__score'),
+            time=Sum(duration, filter=Q(**{f'{attempt}__completed_at__isnull': False})),
+        )
+        .order_by()
+    )
+    return {
+        (row['participant_id'], row['round_id']): (
+            row['score'] or 0,
+            int(row['time'].total_seconds()) if row['time'] else 0,
+        )
+        for row in rows
+    }
+
+
+def compute_standings(challenge, participants, rounds, scores=None):
+    """
+    Return (standings, round_results) for the given participants and rounds.
+
+    Standings are ordered by total score, then total time (smaller is
+    better); each round lists every participant's score and the winners.
+    """
+    if scores is None:
+        scores = round_scores(challenge)
+    totals = {}
+    for (participant_id, _), (score, seconds) in scores.items():
+        total = totals.setdefault(participant_id, [0, 0])
+        total[0] += score
+        total[1] += seconds
+    standings = [
+        {
+            'participant': p,
+            'total_score': totals.get(p.id, (0, 0))[0],
+            'total_time': totals.get(p.id, (0, 0))[1],
+        }
+        for p in participants
+    ]
+    standings.sort(key=lambda x: (-x['total_score'], x['total_time']))
+
+    round_results = []
+    for r in rounds:
+        round_row = {'round': r, 'scores': []}
+        best_score = None
+        winners = []
+        for p in participants:
+            score = scores.get((p.id, r.id), (0, 0))[0]
+            round_row['scores'].append({'participant': p, 'score': score})
+            if best_score is None or score > best_score:
+                best_score = score
+                winners = [p]
+            elif score == best_score:
+                winners.append(p)
+        round_row['best_score'] = best_score
+        round_row['winners'] = winners
+        round_results.append(round_row)
+    return standings, round_results
+
+
+def valid_participants(challenge):
+    """Participants that match the challenge mode."""
+    qs = challenge.participants.select_related('user', 'group')
+    if challenge.mode == 'individual':
+        return qs.filter(user__isnull=False)
+    return qs.filter(group__isnull=False)
+
+
+def stored_round_scores(challenge):
+    """Map (participant_id, round_id) -> (score, seconds) from ChallengeRoundScore."""
+    return {
+        (participant_id, round_id): (score, seconds)
+        for participant_id, round_id, score, seconds in ChallengeRoundScore.objects
+        .filter(challenge=challenge)
+        .values_list('participant_id', 'round_id', 'score', 'total_time')
+    }
+
+
+def refresh_standings(challenge):
+    """
+    Re-rank a challenge from its stored round scores.
+
+    Ranks follow total score, then total time; equal totals share a rank.
+    A round is won by every participant holding its best (non-zero) score.
+    """
+    participant_ids = list(valid_participants(challenge).values_list('pk', flat=True))
+    ChallengeStanding.objects.bulk_create(
+        [ChallengeStanding(challenge=challenge, participant_id=pid) for pid in participant_ids],
+        ignore_conflicts=True,
+    )
+    scores = stored_round_scores(challenge)
+    totals = defaultdict(lambda: [0, 0])
+    best = defaultdict(int)
+    for (participant_id, round_id), (score, seconds) in scores.items():
+        totals[participant_id][0] += score
+        totals[participant_id][1] += seconds
+        if round_id is not None:
+            best[round_id] = max(best[round_id], score)
+    rounds_won = defaultdict(int)
+    for (participant_id, round_id), (score, _) in scores.items():
+        if round_id is not None and best[round_id] > 0 and score == best[round_id]:
+            rounds_won[participant_id] += 1
+
+    standings = list(ChallengeStanding.objects.filter(challenge=challenge, participant_id__in=participant_ids))
+    standings.sort(key=lambda st: (-totals[st.participant_id][0], totals[st.participant_id][1]))
+    now = timezone.now()
+    previous = None
+    for position, standing in enumerate(standings, start=1):
+        key = tuple(totals[standing.participant_id])
+        if key != previous:
+            rank = position
+            previous = key
+        standing.rank = rank
+        standing.total_score, standing.total_time = key
+        standing.rounds_won = rounds_won[standing.participant_id]
+        standing.updated_at = now
+    ChallengeStanding.objects.bulk_update(
+        standings, ['rank', 'total_score', 'total_time', 'rounds_won', 'updated_at']
+    )
+    # Participants that left or no longer match the mode drop out of the table
+    ChallengeStanding.objects.filter(challenge=challenge).exclude(participant_id__in=participant_ids).delete()
+    standings_changed.send(sender=Challenge, challenge=challenge)
+    return standings
+
+
+def refresh_round_score(challenge, participant_id, round_id):
+    """Re-sum one participant's linked attempts for one round into ChallengeRoundScore."""
+    summed = round_scores(challenge, participant_id=participant_id, round_id=round_id)
+    if (participant_id, round_id) not in summed:
+        ChallengeRoundScore.objects.filter(participant_id=participant_id, round_id=round_id).delete()
+        return None
+    score, seconds = summed[(participant_id, round_id)]
+    row, _ = ChallengeRoundScore.objects.update_or_create(
+        participant_id=participant_id,
+        round_id=round_id,
+        defaults={'challenge': challenge, 'score': score, 'total_time': seconds},
+    )
+    return row
+
+
+def refresh_challenge_rounds(challenge_id, pairs):
+    """Refresh the given (participant_id, round_id) pairs, then re-rank the challenge once."""
+    challenge = Challenge.objects.filter(pk=challenge_id).first()
+    if challenge is None:
+        return
+    existing = set(ChallengeParticipant.objects.filter(pk__in={pid for pid, _ in pairs}).values_list('pk', flat=True))
+    with transaction.atomic():
+        for participant_id, round_id in pairs:
+            if participant_id in existing:
+                refresh_round_score(challenge, participant_id, round_id)
+        refresh_standings(challenge)
+
+
+def refresh_for_attempts(attempt_field, attempt_ids):
+    """Refresh every challenge round that links one of the given attempts."""
+    links = (
+        ChallengeRoundAttempt.objects
+        .filter(**{f'{attempt_field}_id__in': list(attempt_ids)})
+        .values_list('challenge_id', 'participant_id', 'round_id')
+        .distinct()
+    )
+    by_challenge = defaultdict(set)
+    for challenge_id, participant_id, round_id in links:
+        by_challenge[challenge_id].add((participant_id, round_id))
+    for challenge_id, pairs in by_challenge.items():
+        refresh_challenge_rounds(challenge_id, pairs)
+
+
+def rebuild_standings(challenge):
+    """Recompute a challenge's round scores and standings from scratch."""
+    with transaction.atomic():
+        ChallengeRoundScore.objects.filter(challenge=challenge).delete()
+        ChallengeRoundScore.objects.bulk_create([
+            ChallengeRoundScore(
+                challenge=challenge, participant_id=participant_id, round_id=round_id,
+                score=score, total_time=seconds,
+            )
+            for (participant_id, round_id), (score, seconds) in round_scores(challenge).items()
+        ])
+        return refresh_standings(challenge)
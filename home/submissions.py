@@ -0,0 +1,365 @@
+"""
+Quiz submission pipeline: grade POST data in memory, then persist the attempt,
+its responses and their selected-choice rows in one transaction using
+bulk inserts, so the statement count does not grow with the question count.
+
+Large quizzes can also be taken stepwise: a ``started`` attempt is opened on
+first render, each page of answers is saved into it as the taker goes, and
+the final submission only finalizes the score.
+
+Timed quizzes get a server-side deadline when the attempt starts; late
+submissions are rejected (single page) or truncated to the pages saved in
+time (stepwise), and abandoned attempts are moved to ``expired`` in bulk by
+``expire_overdue_attempts``.
+
+Each single-page render carries a submission token that is stored on the
+attempt under a unique index, so a retried or double-clicked submit finds
+the attempt it already created instead of scoring it again.
+
+Completed attempts are linked to the taker's open challenge rounds inside
+the same transaction (see ``home.challenge_links``).
+"""
+import secrets
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import (
+    TestQuizAttempt, GroupTestQuizAttempt, UserResponse, GroupResponse,
+    UserAttemptCounter, GroupAttemptCounter,
+)
+from .challenge_links import link_attempt_to_rounds
+from .scoring import score_selection
+from .signals import attempt_completed
+
+
+QUIZ_PAGE_SIZE = getattr(settings, 'QUIZ_PAGE_SIZE', 10)
+# Quizzes with more questions than this are served stepwise to signed-in takers
+QUIZ_STEPWISE_THRESHOLD = getattr(settings, 'QUIZ_STEPWISE_THRESHOLD', 30)
+# Submissions arriving this many seconds after the deadline are still accepted
+QUIZ_DEADLINE_GRACE_SECONDS = getattr(settings, 'QUIZ_DEADLINE_GRACE_SECONDS', 30)
+
+GradedAnswer = namedtuple(
+    'GradedAnswer',
+    ['question_id', 'points_awarded', 'selected_ids', 'text_answer', 'wrong_selected', 'question_penalty'],
+)
+
+
+class AttemptLimitReached(Exception):
+    """The taker has used all of the quiz's ``max_attempts``."""
+
+
+def _counter_for(quiz, user=None, group=None):
+    if group is not None:
+        return GroupAttemptCounter, GroupTestQuizAttempt, {'quiz': quiz, 'group': group}
+    return UserAttemptCounter, TestQuizAttempt, {'quiz': quiz, 'user': user}
+
+
+def has_attempts_left(quiz, user=None, group=None):
+    """Cheap pre-check against the counter row; allocation is the real guard."""
+    if not quiz.max_attempts:
+        return True
+    counter_model, _, lookup = _counter_for(quiz, user, group)
+    used = counter_model.objects.filter(**lookup).values_list('count', flat=True).first()
+    return used is None or used < quiz.max_attempts
+
+
+def allocate_attempt_number(quiz, user=None, group=None):
+    """
+    Reserve the next attempt number for a user (or group) on a quiz.
+
+    One conditional UPDATE increments the counter only while it is below
+    ``quiz.max_attempts`` (0 means unlimited), so concurrent submits get
+    distinct numbers and can never exceed the limit. Call it inside the
+    transaction that creates the attempt. Raises AttemptLimitReached.
+    """
+    counter_model, attempt_model, lookup = _counter_for(quiz, user, group)
+    counters = counter_model.objects.filter(**lookup)
+    if quiz.max_attempts:
+        counters = counters.filter(count__lt=quiz.max_attempts)
+    for seeded in (False, True):
+        if counters.update(count=F('count') + 1, updated_at=timezone.now()):
+            return counter_model.objects.filter(**lookup).values_list('count', flat=True).get()
+        if seeded or counter_model.objects.filter(**lookup).exists():
+            raise AttemptLimitReached
+        # First allocation for this pair: seed from attempts recorded before counters existed
+        last = attempt_model.objects.filter(**lookup).aggregate(last=Max('attempt_number'))['last'] or 0
+        counter_model.objects.bulk_create([counter_model(count=last, **lookup)], ignore_conflicts=True)
+
+
+def attempt_deadline(quiz, started_at=None):
+    """Return the cutoff for an attempt started at ``started_at``; None if the quiz is untimed."""
+    if not quiz.time_limit:
+        return None
+    return (started_at or timezone.now()) + timedelta(minutes=quiz.time_limit)
+
+
+def is_past_deadline(deadline, now=None):
+    """True once ``deadline`` plus the grace period has passed."""
+    if deadline is None:
+        return False
+    return (now or timezone.now()) > deadline + timedelta(seconds=QUIZ_DEADLINE_GRACE_SECONDS)
+
+
+def _started_key(quiz_id, group_id=None):
+    return f'quiz_started_at:{quiz_id}:{group_id or "individual"}'
+
+
+def get_session_started_at(session, quiz, group_id=None):
+    """
+    Return when the taker started the current take of ``quiz``, recording it
+    on first render. A start whose deadline has passed belonged to a take
+    that was never submitted, so the clock restarts.
+    """
+    key = _started_key(quiz.id, group_id)
+    value = session.get(key)
+    if value:
+        started_at = datetime.fromisoformat(value)
+        if not is_past_deadline(attempt_deadline(quiz, started_at)):
+            return started_at
+    started_at = timezone.now()
+    session[key] = started_at.isoformat()
+    return started_at
+
+
+def pop_session_started_at(session, quiz_id, group_id=None):
+    """Consume the start time on submission; None if the page was never rendered."""
+    value = session.pop(_started_key(quiz_id, group_id), None)
+    return datetime.fromisoformat(value) if value else None
+
+
+def new_submission_token():
+    return secrets.token_hex(16)
+
+
+def find_submitted_attempt(token, quiz, user=None, group=None):
+    """Return the attempt already saved for a submission token, scoped to its taker."""
+    if not token:
+        return None
+    if group is not None:
+        qs = GroupTestQuizAttempt.objects.filter(quiz=quiz, group=group)
+    else:
+        qs = TestQuizAttempt.objects.filter(quiz=quiz, user=user)
+    return qs.filter(submission_token=token).first()
+
+
+def grade_submission(answer_key, data, question_ids=None):
+    """
+    Score submitted form data against an answer key; returns a list of GradedAnswer.
+    Pass ``question_ids`` to grade a single page of a stepwise attempt.
+    """
+    graded = []
+    for question_id in (answer_key.question_ids if question_ids is None else question_ids):
+        entry = answer_key.entries[question_id]
+        if entry.question_type == 'open':
+            text_answer = (data.get(f'question_{question_id}_text', '') or '').strip()
+            graded.append(GradedAnswer(question_id, 0, [], text_answer, 0, entry.penalty))
+            continue
+        pts, selected_ids, wrong_selected = score_selection(entry, data.getlist(f'question_{question_id}'))
+        graded.append(GradedAnswer(question_id, pts, selected_ids, '', wrong_selected, entry.penalty))
+    return graded
+
+
+def _bulk_create_responses(response_model, attempt, graded, **response_fields):
+    responses = [
+        response_model(
+            attempt=attempt,
+            question_id=answer.question_id,
+            text_answer=answer.text_answer or None,
+            points_awarded=answer.points_awarded,
+            metadata={
+                'wrong_selected': answer.wrong_selected,
+                'question_penalty': answer.question_penalty,
+            },
+            **response_fields,
+        )
+        for answer in graded
+    ]
+    response_model.objects.bulk_create(responses)
+    if any(resp.pk is None for resp in responses):
+        # Backends that cannot return ids from a bulk insert
+        ids = dict(response_model.objects.filter(attempt=attempt).values_list('question_id', 'id'))
+        for resp in responses:
+            resp.pk = ids[resp.question_id]
+
+    m2m_field = response_model._meta.get_field('selected_choices')
+    through = m2m_field.remote_field.through
+    source, target = m2m_field.m2m_field_name(), m2m_field.m2m_reverse_field_name()
+    through.objects.bulk_create([
+        through(**{f'{source}_id': resp.pk, f'{target}_id': choice_id})
+        for resp, answer in zip(responses, graded)
+        for choice_id in answer.selected_ids
+    ])
+    return responses
+
+
+def save_user_attempt(quiz, user, graded, **attempt_fields):
+    """Persist a completed individual attempt and all its responses atomically."""
+    with transaction.atomic():
+        next_num = allocate_attempt_number(quiz, user=user)
+        attempt = TestQuizAttempt.objects.create(
+            quiz=quiz,
+            user=user,
+            attempt_number=next_num,
+            status='completed',
+            score=sum(answer.points_awarded for answer in graded),
+            completed_at=timezone.now(),
+            **attempt_fields,
+        )
+        responses = _bulk_create_responses(UserResponse, attempt, graded)
+        link_attempt_to_rounds(attempt)
+        attempt_completed.send(sender=TestQuizAttempt, attempt=attempt, responses=responses)
+    return attempt
+
+
+def save_group_attempt(quiz, group, user, graded, **attempt_fields):
+    """Persist a completed group attempt and all its responses atomically."""
+    with transaction.atomic():
+        next_num = allocate_attempt_number(quiz, group=group)
+        attempt = GroupTestQuizAttempt.objects.create(
+            quiz=quiz,
+            group=group,
+            initiated_by=user,
+            attempt_number=next_num,
+            status='completed',
+            score=sum(answer.points_awarded for answer in graded),
+            completed_at=timezone.now(),
+            **attempt_fields,
+        )
+        responses = _bulk_create_responses(GroupResponse, attempt, graded, group=group, responded_by=user)
+        link_attempt_to_rounds(attempt)
+        attempt_completed.send(sender=GroupTestQuizAttempt, attempt=attempt, responses=responses)
+    return attempt
+
+
+def get_started_attempt(quiz, user, group=None):
+    """Return the taker's in-progress attempt for a quiz, if any."""
+    if group is not None:
+        qs = GroupTestQuizAttempt.objects.filter(quiz=quiz, group=group, status='started')
+    else:
+        qs = TestQuizAttempt.objects.filter(quiz=quiz, user=user, status='started')
+    return qs.order_by('-created_at').first()
+
+
+def start_attempt(quiz, user, group=None, **attempt_fields):
+    """Open a ``started`` attempt that stepwise pages are saved into."""
+    attempt_fields.setdefault('deadline', attempt_deadline(quiz))
+    with transaction.atomic():
+        next_num = allocate_attempt_number(quiz, user=user, group=group)
+        if group is not None:
+            return GroupTestQuizAttempt.objects.create(
+                quiz=quiz,
+                group=group,
+                initiated_by=user,
+                attempt_number=next_num,
+                status='started',
+                **attempt_fields,
+            )
+        return TestQuizAttempt.objects.create(
+            quiz=quiz,
+            user=user,
+            attempt_number=next_num,
+            status='started',
+            **attempt_fields,
+        )
+
+
+def _response_fields(attempt, user):
+    if isinstance(attempt, GroupTestQuizAttempt):
+        return {'group_id': attempt.group_id, 'responded_by': user}
+    return {}
+
+
+def save_page_responses(attempt, user, graded):
+    """Replace the stored answers for one page of a started attempt."""
+    response_model = attempt.responses.model
+    with transaction.atomic():
+        response_model.objects.filter(
+            attempt=attempt, question_id__in=[answer.question_id for answer in graded]
+        ).delete()
+        return _bulk_create_responses(response_model, attempt, graded, **_response_fields(attempt, user))
+
+
+def saved_answers(attempt):
+    """Map question id -> (selected choice ids, text answer) for a started attempt."""
+    response_model = attempt.responses.model
+    m2m_field = response_model._meta.get_field('selected_choices')
+    through = m2m_field.remote_field.through
+    source, target = m2m_field.m2m_field_name(), m2m_field.m2m_reverse_field_name()
+    answers = {
+        question_id: (set(), text or '')
+        for question_id, text in attempt.responses.values_list('question_id', 'text_answer')
+    }
+    selected = through.objects.filter(**{f'{source}__attempt': attempt}).values_list(
+        f'{source}__question_id', f'{target}_id'
+    )
+    for question_id, choice_id in selected:
+        answers.setdefault(question_id, (set(), ''))[0].add(choice_id)
+    return answers
+
+
+def finalize_attempt(attempt, user, answer_key):
+    """
+    Complete a stepwise attempt: store empty responses for unanswered
+    questions, stamp the score and fire attempt_completed. Returns the
+    attempt's responses, or None if it is no longer ``started``.
+    """
+    response_model = attempt.responses.model
+    model = type(attempt)
+    now = timezone.now()
+    with transaction.atomic():
+        # Claim the attempt first: a double-submitted final page cannot
+        # complete it twice, and one the sweeper expired stays expired
+        if not model.objects.filter(pk=attempt.pk, status='started').update(status='completed', completed_at=now):
+            return None
+        answered = set(attempt.responses.values_list('question_id', flat=True))
+        missing = [
+            GradedAnswer(question_id, 0, [], '', 0, answer_key.entries[question_id].penalty)
+            for question_id in answer_key.question_ids
+            if question_id not in answered
+        ]
+        if missing:
+            _bulk_create_responses(response_model, attempt, missing, **_response_fields(attempt, user))
+        responses = list(attempt.responses.only('id', 'question_id', 'points_awarded', 'metadata'))
+        attempt.score = sum(int(resp.points_awarded or 0) for resp in responses)
+        attempt.status = 'completed'
+        attempt.completed_at = now
+        model.objects.filter(pk=attempt.pk).update(score=attempt.score, updated_at=now)
+        link_attempt_to_rounds(attempt, now=now)
+        attempt_completed.send(sender=model, attempt=attempt, responses=responses)
+    return responses
+
+
+def expire_overdue_attempts(model, now=None, batch_size=1000, stale_before=None):
+    """
+    Move overdue ``started`` attempts of ``model`` to ``expired``.
+
+    Attempts past their deadline (plus grace) are expired; with
+    ``stale_before``, untimed attempts created before it are expired too.
+    Rows are picked in ``created_at`` order off the status/created_at indexes
+    and updated with one UPDATE per batch. Returns the number expired.
+    """
+    now = now or timezone.now()
+    overdue = Q(deadline__lt=now - timedelta(seconds=QUIZ_DEADLINE_GRACE_SECONDS))
+    if stale_before is not None:
+        overdue |= Q(deadline__isnull=True, created_at__lt=stale_before)
+    candidates = (
+        model.objects
+        .filter(overdue, status='started', created_at__lt=now)
+        .order_by('created_at')
+        .values_list('pk', flat=True)
+    )
+    expired = 0
+    while True:
+        batch = list(candidates[:batch_size])
+        if not batch:
+            return expired
+        # Re-check the status so an attempt finalized meanwhile is left alone
+        expired += model.objects.filter(pk__in=batch, status='started').update(
+            status='expired',
+            updated_at=now,
+        )
@@ -1,3 +1,495 @@
-from django.test import TestCase
-
-# Create your tests here.
+import json
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from users.models import MyUser
+
+from .brackets import create_tournament
+from .challenge_links import link_attempt_to_rounds
+from .leaderboard_snapshots import build_snapshot, snapshot_positions
+from .lifecycle import run_challenge_lifecycle
+from .models import (
+    Challenge, ChallengeOutcome, ChallengeParticipant, ChallengeRound, ChallengeRoundAttempt, ChallengeStanding,
+    Choice, Church, ChurchCategory, ChurchRanking, GroupRanking, GroupTestQuizAttempt, Question, RankingBucket,
+    TestQuiz, TestQuizAttempt, TriviaGroup, UserHeadToHead, UserRanking,
+)
+from .ratings import AVERAGE_SCORE_MAX, record_challenge_outcome, replay_ratings
+from .ranking_rebuild import _ranges, rebuild_rankings
+from .rescoring import rescore_quiz
+from .scoring import get_answer_key
+from .submissions import (
+    AttemptLimitReached, grade_submission, save_group_attempt, save_user_attempt, start_attempt,
+)
+
+
+def make_quiz(owner, questions=3, **fields):
+    """A quiz of single-choice questions whose first choice is correct."""
+    quiz = TestQuiz.objects.create(name=fields.pop('name', 'Quiz'), created_by=owner, **fields)
+    for number in range(questions):
+        question = Question.objects.create(question_text=f'Question {number}', created_by=owner, points=2)
+        Choice.objects.create(question=question, choice_text='Right', is_correct=True)
+        Choice.objects.create(question=question, choice_text='Wrong')
+        quiz.questions.add(question)
+    return quiz
+
+
+def right_answers(quiz):
+    return {
+        f'question_{question.pk}': [str(choice.pk) for choice in question.choices.all() if choice.is_correct]
+        for question in quiz.questions.all()
+    }
+
+
+class TriviaTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = MyUser.objects.create_user(email='admin@example.com', password='secret', role='Admin')
+        cls.player = MyUser.objects.create_user(email='player@example.com', password='secret')
+        category = ChurchCategory.objects.create(name='Baptist')
+        cls.church = Church.objects.create(name='Grace', category=category, manager=cls.admin)
+        cls.group = TriviaGroup.objects.create(
+            name='Berea', category='Adults', church=cls.church, patron=cls.admin, captain=cls.admin,
+        )
+        cls.group.members.add(cls.player)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class StepwiseQuizTakeTests(TriviaTestCase):
+    def setUp(self):
+        self.quiz = make_quiz(self.admin, max_attempts=1)
+        self.url = reverse('quiz_take', kwargs={'slug': self.quiz.slug}) + '?stepwise=1'
+        self.client.force_login(self.player)
+
+    def test_opening_the_quiz_does_not_use_an_attempt(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertFalse(TestQuizAttempt.objects.filter(quiz=self.quiz).exists())
+
+    def test_first_saved_page_opens_the_attempt(self):
+        self.client.get(self.url)
+        self.client.post(self.url, {'page': 1, **right_answers(self.quiz)})
+        attempt = TestQuizAttempt.objects.get(quiz=self.quiz, user=self.player)
+        self.assertEqual(attempt.status, 'completed')
+        self.assertEqual(attempt.score, 6)
+
+    def test_post_without_opening_the_quiz_is_rejected(self):
+        response = self.client.post(self.url, {'page': 1, **right_answers(self.quiz)})
+        detail_url = reverse('quiz_detail', kwargs={'slug': self.quiz.slug})
+        self.assertRedirects(response, detail_url, fetch_redirect_response=False)
+        self.assertFalse(TestQuizAttempt.objects.filter(quiz=self.quiz).exists())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class TimedQuizTakeTests(TriviaTestCase):
+    def setUp(self):
+        self.quiz = make_quiz(self.admin, time_limit=10, max_attempts=2)
+        self.url = reverse('quiz_take', kwargs={'slug': self.quiz.slug})
+        self.detail_url = reverse('quiz_detail', kwargs={'slug': self.quiz.slug})
+
+    def open_quiz(self, minutes_ago=0):
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(minutes=minutes_ago)):
+            self.client.get(self.url)
+
+    def submit(self):
+        return self.client.post(self.url, right_answers(self.quiz))
+
+    def test_post_without_opening_the_quiz_is_rejected(self):
+        for login in (True, False):
+            with self.subTest(signed_in=login):
+                self.client.logout()
+                if login:
+                    self.client.force_login(self.player)
+                self.assertRedirects(self.submit(), self.detail_url, fetch_redirect_response=False)
+                self.assertNotIn('quiz_results', self.client.session)
+        self.assertFalse(TestQuizAttempt.objects.filter(quiz=self.quiz).exists())
+
+    def test_late_submission_is_rejected(self):
+        self.client.force_login(self.player)
+        self.open_quiz(minutes_ago=30)
+        self.assertRedirects(self.submit(), self.detail_url, fetch_redirect_response=False)
+        self.assertFalse(TestQuizAttempt.objects.filter(quiz=self.quiz).exists())
+
+    def test_reopening_an_abandoned_take_restarts_the_clock(self):
+        self.client.force_login(self.player)
+        self.open_quiz(minutes_ago=30)
+        self.open_quiz()
+        self.assertRedirects(self.submit(), reverse('quiz_results', kwargs={'slug': self.quiz.slug}))
+        self.assertEqual(TestQuizAttempt.objects.get(quiz=self.quiz, user=self.player).score, 6)
+
+
+class ExpireAttemptsTests(TriviaTestCase):
+    def test_sweep_expires_overdue_and_stale_attempts_only(self):
+        quiz = make_quiz(self.admin, max_attempts=3)
+        now = timezone.now()
+        overdue = start_attempt(quiz, self.player, deadline=now - timedelta(hours=1))
+        running = start_attempt(quiz, self.player, deadline=now + timedelta(hours=1))
+        untimed = start_attempt(quiz, self.player, deadline=None)
+        TestQuizAttempt.objects.filter(pk=untimed.pk).update(created_at=now - timedelta(days=2))
+
+        call_command('expire_attempts', stdout=StringIO())
+        statuses = dict(TestQuizAttempt.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[overdue.pk], statuses[running.pk], statuses[untimed.pk]], ['expired', 'started', 'started'],
+        )
+
+        call_command('expire_attempts', '--stale-hours', '24', stdout=StringIO())
+        self.assertEqual(TestQuizAttempt.objects.get(pk=untimed.pk).status, 'expired')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AttemptCounterTests(TriviaTestCase):
+    def take(self, quiz, user, group=None):
+        graded = grade_submission(get_answer_key(quiz), MultiValueDict(right_answers(quiz)))
+        if group is not None:
+            return save_group_attempt(quiz, group, user, graded)
+        return save_user_attempt(quiz, user, graded)
+
+    def test_attempt_numbers_count_up_per_taker(self):
+        quiz = make_quiz(self.admin, max_attempts=0)
+        numbers = [self.take(quiz, self.player).attempt_number for _ in range(3)]
+        self.assertEqual(numbers, [1, 2, 3])
+        self.assertEqual(self.take(quiz, self.admin).attempt_number, 1)
+        self.assertEqual(self.take(quiz, self.player, group=self.group).attempt_number, 1)
+
+    def test_max_attempts_is_enforced(self):
+        quiz = make_quiz(self.admin, max_attempts=2)
+        self.take(quiz, self.player)
+        self.take(quiz, self.player)
+        with self.assertRaises(AttemptLimitReached):
+            self.take(quiz, self.player)
+        self.assertEqual(TestQuizAttempt.objects.filter(quiz=quiz, user=self.player).count(), 2)
+        # Another taker still has their own attempts
+        self.assertEqual(self.take(quiz, self.admin).attempt_number, 1)
+
+        self.client.force_login(self.player)
+        response = self.client.get(reverse('quiz_take', kwargs={'slug': quiz.slug}))
+        detail_url = reverse('quiz_detail', kwargs={'slug': quiz.slug})
+        self.assertRedirects(response, detail_url, fetch_redirect_response=False)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class SubmissionTokenTests(TriviaTestCase):
+    def test_resubmitted_token_replays_the_first_attempt(self):
+        quiz = make_quiz(self.admin, max_attempts=3)
+        url = reverse('quiz_take', kwargs={'slug': quiz.slug})
+        results_url = reverse('quiz_results', kwargs={'slug': quiz.slug})
+        self.client.force_login(self.player)
+        token = self.client.get(url).context['submission_token']
+
+        data = {'submission_token': token, **right_answers(quiz)}
+        self.assertRedirects(self.client.post(url, data), results_url, fetch_redirect_response=False)
+        # A double click or retry after the page was rendered once
+        self.assertRedirects(self.client.post(url, data), results_url, fetch_redirect_response=False)
+
+        attempt = TestQuizAttempt.objects.get(quiz=quiz, user=self.player)
+        self.assertEqual(attempt.responses.count(), 3)
+        self.assertEqual(UserRanking.objects.get(user=self.player).points, 6)
+        self.assertEqual(self.client.session['quiz_results']['attempt_id'], attempt.pk)
+
+    def test_token_of_another_taker_is_not_replayed(self):
+        quiz = make_quiz(self.admin, max_attempts=3)
+        url = reverse('quiz_take', kwargs={'slug': quiz.slug})
+        self.client.force_login(self.admin)
+        token = self.client.get(url).context['submission_token']
+        self.client.post(url, {'submission_token': token, **right_answers(quiz)})
+
+        self.client.force_login(self.player)
+        self.client.get(url)
+        self.client.post(url, {'submission_token': token, **right_answers(quiz)})
+        self.assertFalse(TestQuizAttempt.objects.filter(quiz=quiz, user=self.player).exists())
+        self.assertNotEqual(
+            self.client.session.get('quiz_results', {}).get('attempt_id'),
+            TestQuizAttempt.objects.get(quiz=quiz, user=self.admin).pk,
+        )
+
+
+class RescoreRankingTests(TriviaTestCase):
+    def test_lowered_historical_score_is_floored_in_new_buckets(self):
+        quiz = make_quiz(self.admin)
+        graded = grade_submission(get_answer_key(quiz), MultiValueDict(right_answers(quiz)))
+        attempt = save_group_attempt(quiz, self.group, self.player, graded)
+        # Played long ago, before its period buckets were kept
+        long_ago = timezone.now() - timedelta(days=400)
+        GroupTestQuizAttempt.objects.filter(pk=attempt.pk).update(completed_at=long_ago)
+        RankingBucket.objects.all().delete()
+
+        question = quiz.questions.first()
+        question.choices.update(is_correct=False)
+        Choice.objects.filter(question=question, choice_text='Wrong').update(is_correct=True)
+        question.save()
+        result = rescore_quiz(quiz)
+
+        self.assertEqual(result.attempts_changed, 1)
+        self.assertEqual(GroupRanking.objects.get(group=self.group).points, 4)
+        self.assertEqual(ChurchRanking.objects.get(church=self.church).points, 4)
+        buckets = RankingBucket.objects.filter(group=self.group)
+        self.assertEqual(buckets.count(), 3)
+        self.assertFalse(buckets.exclude(points=0).exists())
+
+
+class ChallengeLinkTests(TriviaTestCase):
+    def test_only_the_first_attempt_per_round_is_linked(self):
+        quiz = make_quiz(self.admin, max_attempts=2)
+        challenge = Challenge.objects.create(name='Duel', mode='individual', status='active', created_by=self.admin)
+        participant = ChallengeParticipant.objects.create(challenge=challenge, user=self.player)
+        rnd = ChallengeRound.objects.create(challenge=challenge, round_number=1, quiz=quiz)
+        graded = grade_submission(get_answer_key(quiz), MultiValueDict(right_answers(quiz)))
+        first = save_user_attempt(quiz, self.player, graded)
+        retake = save_user_attempt(quiz, self.player, graded)
+        # A racing submission that missed the first link
+        link_attempt_to_rounds(retake)
+
+        link = ChallengeRoundAttempt.objects.get(participant=participant, round=rnd)
+        self.assertEqual(link.user_attempt_id, first.pk)
+
+    def test_one_attempt_fills_exactly_one_round(self):
+        quiz = make_quiz(self.admin, max_attempts=2)
+        challenge = Challenge.objects.create(
+            name='Best of three', mode='individual', status='active', best_of=3, created_by=self.admin,
+        )
+        participant = ChallengeParticipant.objects.create(challenge=challenge, user=self.player)
+        rounds = [ChallengeRound.objects.create(challenge=challenge, round_number=n, quiz=quiz) for n in (1, 2, 3)]
+        graded = grade_submission(get_answer_key(quiz), MultiValueDict(right_answers(quiz)))
+
+        first = save_user_attempt(quiz, self.player, graded)
+        self.assertEqual(
+            list(ChallengeRoundAttempt.objects.filter(participant=participant).values_list('round', 'user_attempt')),
+            [(rounds[0].pk, first.pk)],
+        )
+        second = save_user_attempt(quiz, self.player, graded)
+        self.assertEqual(
+            ChallengeRoundAttempt.objects.get(participant=participant, round=rounds[1]).user_attempt_id, second.pk,
+        )
+        self.assertFalse(ChallengeRoundAttempt.objects.filter(round=rounds[2]).exists())
+
+
+class ChallengeLiveTests(TriviaTestCase):
+    def setUp(self):
+        challenge = Challenge.objects.create(name='Duel', mode='individual', status='active', created_by=self.admin)
+        self.url = reverse('challenge_live', kwargs={'pk': challenge.pk})
+
+    def test_wsgi_viewers_poll_one_snapshot(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn('event: scoreboard\ndata: {', body)
+
+    async def test_asgi_viewers_get_a_stream(self):
+        response = await self.async_client.get(self.url)
+        self.assertTrue(response.streaming)
+        stream = aiter(response.streaming_content)
+        first = await anext(stream)
+        self.assertTrue(first.startswith(b'event: scoreboard\ndata: {'))
+        await stream.aclose()
+
+
+class TournamentQuizTests(TriviaTestCase):
+    def test_match_rounds_are_played_on_their_quiz(self):
+        quizzes = [make_quiz(self.admin, name=f'Round {number}') for number in (1, 2, 3)]
+        rival = MyUser.objects.create_user(email='rival@example.com', password='secret')
+        tournament = create_tournament(
+            'Cup', 'individual', 'single_elimination', [self.player, rival], self.admin, quizzes, best_of=3,
+        )
+        rounds = ChallengeRound.objects.filter(challenge__tournament_match__tournament=tournament)
+        self.assertEqual(
+            list(rounds.order_by('round_number').values_list('round_number', 'quiz__name')),
+            [(1, 'Round 1'), (2, 'Round 2'), (3, 'Round 3')],
+        )
+
+    def test_one_attempt_each_plays_only_the_open_stage(self):
+        quiz = make_quiz(self.admin, max_attempts=3)
+        players = [self.player] + [
+            MyUser.objects.create_user(email=f'player{number}@example.com', password='secret') for number in (2, 3, 4)
+        ]
+        tournament = create_tournament('League', 'individual', 'round_robin', players, self.admin, [quiz])
+        key = get_answer_key(quiz)
+        for user in players:
+            save_user_attempt(quiz, user, grade_submission(key, MultiValueDict(right_answers(quiz))))
+        run_challenge_lifecycle()
+
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.status, 'active')
+        self.assertEqual(tournament.current_stage, 2)
+        statuses = Challenge.objects.filter(tournament_match__tournament=tournament).values_list(
+            'tournament_match__stage', 'status',
+        )
+        self.assertEqual(
+            sorted(set(statuses)), [(1, 'completed'), (2, 'active'), (3, 'pending')],
+        )
+
+
+class ChallengeLifecycleTests(TriviaTestCase):
+    def setUp(self):
+        self.rival = MyUser.objects.create_user(email='rival@example.com', password='secret')
+        self.client.force_login(self.admin)
+
+    def _duel(self, **fields):
+        challenge = Challenge.objects.create(name='Duel', mode='individual', created_by=self.admin, **fields)
+        ChallengeParticipant.objects.create(challenge=challenge, user=self.player, is_active=True)
+        return challenge, ChallengeParticipant.objects.create(challenge=challenge, user=self.rival, is_active=False)
+
+    def _approve(self, challenge, participant):
+        url = reverse('challenge_participant_approve', kwargs={'pk': challenge.pk})
+        self.client.post(url, {'participant_id': participant.pk})
+        challenge.refresh_from_db()
+
+    def test_approval_opens_a_due_challenge(self):
+        challenge, invitee = self._duel()
+        self._approve(challenge, invitee)
+        self.assertEqual(challenge.status, 'active')
+
+    def test_approval_leaves_a_scheduled_challenge_pending(self):
+        challenge, invitee = self._duel(scheduled_at=timezone.now() + timedelta(days=1))
+        self._approve(challenge, invitee)
+        self.assertEqual(challenge.status, 'pending')
+
+    def test_fully_played_challenge_is_completed_and_rated(self):
+        quiz = make_quiz(self.admin)
+        challenge, invitee = self._duel(status='active')
+        ChallengeParticipant.objects.filter(pk=invitee.pk).update(is_active=True)
+        ChallengeRound.objects.create(challenge=challenge, round_number=1, quiz=quiz)
+        key = get_answer_key(quiz)
+        save_user_attempt(quiz, self.player, grade_submission(key, MultiValueDict(right_answers(quiz))))
+        self.assertEqual(run_challenge_lifecycle().completed, 0)
+
+        save_user_attempt(quiz, self.rival, grade_submission(key, MultiValueDict()))
+        result = run_challenge_lifecycle()
+
+        self.assertEqual(result.completed, 1)
+        challenge.refresh_from_db()
+        self.assertEqual(challenge.status, 'completed')
+        self.assertEqual(ChallengeOutcome.objects.get(challenge=challenge).winner.user, self.player)
+
+
+class GroupRecordTests(TriviaTestCase):
+    def setUp(self):
+        rival = TriviaGroup.objects.create(
+            name='Thyatira', category='Adults', church=self.church, patron=self.admin, captain=self.admin,
+        )
+        self.challenge = Challenge.objects.create(name='Cup', mode='group', status='completed', created_by=self.admin)
+        for rank, (group, score) in enumerate([(self.group, 5000), (rival, 0)], start=1):
+            participant = ChallengeParticipant.objects.create(challenge=self.challenge, group=group, is_active=True)
+            ChallengeStanding.objects.create(
+                challenge=self.challenge, participant=participant, rank=rank, total_score=score,
+            )
+
+    def assertCapped(self):
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.total_points, 5000)
+        self.assertEqual(self.group.average_score, AVERAGE_SCORE_MAX)
+
+    def test_average_score_is_capped(self):
+        record_challenge_outcome(self.challenge.pk)
+        self.assertCapped()
+
+    def test_replayed_average_score_is_capped(self):
+        replay_ratings()
+        self.assertCapped()
+
+
+class InactiveParticipantTests(TriviaTestCase):
+    def setUp(self):
+        self.rival = MyUser.objects.create_user(email='rival@example.com', password='secret')
+        self.declined = MyUser.objects.create_user(email='declined@example.com', password='secret')
+        self.challenge = Challenge.objects.create(
+            name='Duel', mode='individual', status='completed', created_by=self.admin,
+        )
+        for rank, (user, active, score) in enumerate(
+            [(self.player, True, 10), (self.rival, True, 4), (self.declined, False, 0)], start=1,
+        ):
+            participant = ChallengeParticipant.objects.create(challenge=self.challenge, user=user, is_active=active)
+            ChallengeStanding.objects.create(
+                challenge=self.challenge, participant=participant, rank=rank, total_score=score,
+            )
+
+    def assertUnrated(self):
+        ranking = UserRanking.objects.filter(user=self.declined).first()
+        self.assertTrue(ranking is None or (ranking.rating, ranking.rated_challenges) == (1500, 0))
+        self.assertEqual(UserRanking.objects.get(user=self.rival).rated_challenges, 1)
+
+    def test_declined_participant_is_not_rated(self):
+        record_challenge_outcome(self.challenge.pk)
+        self.assertUnrated()
+
+    def test_replay_skips_declined_participant(self):
+        record_challenge_outcome(self.challenge.pk)
+        replay_ratings()
+        self.assertUnrated()
+
+    def test_declined_participant_has_no_head_to_head_record(self):
+        record_challenge_outcome(self.challenge.pk)
+        recorded = UserHeadToHead.objects.values_list('user_id', 'opponent_id')
+        self.assertEqual(
+            sorted(recorded), sorted([(self.player.pk, self.rival.pk), (self.rival.pk, self.player.pk)]),
+        )
+        replay_ratings()
+        self.assertFalse(UserHeadToHead.objects.filter(Q(user=self.declined) | Q(opponent=self.declined)).exists())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PerformanceChartTests(TriviaTestCase):
+    def test_chart_merges_recent_buckets_with_the_old_monthly_history(self):
+        this_month = timezone.localdate().replace(day=1)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        RankingBucket.objects.create(user=self.player, granularity='month', period_start=this_month, points=7)
+        RankingBucket.objects.create(user=self.player, granularity='month', period_start=date(2000, 1, 1), points=99)
+        UserRanking.objects.create(user=self.player, metadata={
+            this_month.strftime('%Y-%m'): 2, last_month.strftime('%Y-%m'): 5, '2000-02': 3,
+        })
+
+        response = self.client.get(reverse('user_performance', kwargs={'pk': self.player.pk}))
+        labels = json.loads(response.context['ranking_chart_labels_json'])
+        data = dict(zip(labels, json.loads(response.context['ranking_chart_data_json'])))
+
+        self.assertEqual(len(labels), 12)
+        self.assertEqual(labels[-1], this_month.strftime('%Y-%m'))
+        # The bucket and the old history are added for the month the buckets started in
+        self.assertEqual(data[this_month.strftime('%Y-%m')], 9)
+        self.assertEqual(data[last_month.strftime('%Y-%m')], 5)
+        self.assertEqual(sum(data.values()), 14)
+
+
+class LeaderboardSnapshotTests(TriviaTestCase):
+    def setUp(self):
+        cache.clear()
+        for user, points in ((self.admin, 30), (self.player, 20)):
+            UserRanking.objects.create(user=user, points=points)
+
+    @mock.patch('home.leaderboard_snapshots.LEADERBOARD_SNAPSHOT_SIZE', 1)
+    def test_positions_outside_the_top_rows_are_looked_up_once(self):
+        snapshot = build_snapshot('individual')
+        self.assertEqual([row['id'] for row in snapshot['rows']], [self.admin.pk])
+        self.assertEqual(snapshot_positions(snapshot, [self.admin, self.player]), [
+            (self.admin, 30, 1), (self.player, 20, 2),
+        ])
+        # Cached for the life of the snapshot
+        UserRanking.objects.filter(user=self.player).update(points=40)
+        self.assertEqual(snapshot_positions(snapshot, [self.player]), [(self.player, 20, 2)])
+        self.assertEqual(snapshot_positions(build_snapshot('individual'), [self.player]), [(self.player, 40, 1)])
+
+
+class RankingRebuildTests(TriviaTestCase):
+    def test_rebuild_pages_over_players_and_restores_totals(self):
+        quiz = make_quiz(self.admin)
+        graded = grade_submission(get_answer_key(quiz), MultiValueDict(right_answers(quiz)))
+        save_user_attempt(quiz, self.admin, graded)
+        save_user_attempt(quiz, self.player, graded)
+        UserRanking.objects.update(points=0)
+
+        pages = [('user', user.pk, user.pk + 1) for user in sorted([self.admin, self.player], key=lambda user: user.pk)]
+        self.assertEqual(_ranges(1), pages)
+        result = rebuild_rankings(chunk_size=1)
+
+        self.assertEqual(result.users, 2)
+        self.assertEqual(list(UserRanking.objects.values_list('points', flat=True).distinct()), [6])
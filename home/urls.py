@@ -10,7 +10,7 @@ from .views import (
     CompetitionCreateView, CompetitionUpdateView, CompetitionDetailView, CompetitionPublicDetailView, CompetitionBookingView, LeaderboardView, AboutView,
     QuizListView, QuizDetailView, QuizTakeView, QuizResultsView, QuizCreateView, QuizUpdateView, QuizDeleteView, QuizManageQuestionsView,
     AttemptHistoryView, AttemptReviewView, GroupAttemptHistoryView, GroupAttemptReviewView, UserPerformanceView,
-    ChallengeCreateView, ChallengeDetailView, ChallengeListView, ChallengeAcceptView, ChallengeDeclineView, ChallengeSetRoundQuizView,
+    ChallengeCreateView, ChallengeDetailView, ChallengeLiveView, ChallengeListView, ChallengeAcceptView, ChallengeDeclineView, ChallengeSetRoundQuizView,
     ChallengeQuickQuizCreateView, ChallengeParticipantApproveView
 )
 
@@ -71,6 +71,7 @@ urlpatterns = [
     path('challenges/', ChallengeListView.as_view(), name='challenge_list'),
     path('challenges/new/', ChallengeCreateView.as_view(), name='challenge_create'),
     path('challenges/<int:pk>/', ChallengeDetailView.as_view(), name='challenge_detail'),
+    path('challenges/<int:pk>/live/', ChallengeLiveView.as_view(), name='challenge_live'),
     path('challenges/<int:pk>/accept/', ChallengeAcceptView.as_view(), name='challenge_accept'),
     path('challenges/<int:pk>/decline/', ChallengeDeclineView.as_view(), name='challenge_decline'),
     path('challenges/<int:pk>/participants/approve/', ChallengeParticipantApproveView.as_view(), name='challenge_participant_approve'),
@@ -7,15 +7,21 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.urls import reverse_lazy, reverse
 from django.utils import timezone
-from django.db.models import Count, Q, Sum, Avg
-from django.db import models
+from django.db.models import Count, F, Q, Sum, Avg, Prefetch
+from django.db import models, IntegrityError
+from django.utils.http import urlencode
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 import json
+from datetime import date
 from .models import (
     Church, TriviaGroup, QuestionCategory, Question, Choice,
     ActivityCategory, CompetitionActivity, Competition, Cohort, TestQuiz,
     TestQuizAttempt, GroupTestQuizAttempt, UserResponse, GroupResponse,
     ActivityInstruction, ActivityRule,
-    Challenge, ChallengeParticipant, ChallengeRound, ChallengeRoundAttempt
+    Challenge, ChallengeParticipant, ChallengeRound, ChallengeStanding,
+    ChurchRanking, RankingBucket, UserRanking,
 )
 from .forms import (
     ChurchForm, TriviaGroupForm, QuestionCategoryForm, QuestionForm, ChoiceForm,
@@ -23,6 +29,27 @@ from .forms import (
     ActivityInstructionForm, ActivityRuleForm, ChallengeCreateForm, QuickQuizCreateForm
 )
 from .competition_forms import CompetitionBookingForm
+from .head_to_head import head_to_head_records
+from .leaderboard_snapshots import get_snapshot, snapshot_positions
+from .leaderboards import BOARDS, PERIODS, position, user_entries
+from .live import (
+    LIVE_SCOREBOARD_HEARTBEAT, LIVE_SCOREBOARD_RETRY, challenge_topic, get_broker, publish_scoreboard,
+    scoreboard_message,
+)
+from .pagination import keyset_page
+from .question_sampler import sample_questions
+from .quiz_payload import get_quiz_payload
+from .scoring import get_answer_key
+from .shuffle import get_session_seed, pop_session_seed, seeded_shuffle
+from .standings import compute_standings, rebuild_standings, stored_round_scores, valid_participants
+from .submissions import (
+    QUIZ_PAGE_SIZE, QUIZ_STEPWISE_THRESHOLD, grade_submission, save_user_attempt, save_group_attempt,
+    get_started_attempt, start_attempt, save_page_responses, saved_answers, finalize_attempt,
+    AttemptLimitReached, has_attempts_left, attempt_deadline, is_past_deadline,
+    get_session_started_at, pop_session_started_at, new_submission_token, find_submitted_attempt
+)
+from .lifecycle import activate_if_due
+from .visibility import visible_challenge_ids
 from django.forms import inlineformset_factory
 from users.forms import QuickUserCreationForm
 from users.models import MyUser
@@ -49,8 +76,9 @@ class ChallengeCreateView(LoginRequiredMixin, CreateView):
         self.object.save()
         # Pre-create rounds per best_of or single round
         rounds = self.object.best_of or 1
-        for i in range(1, rounds + 1):
-            ChallengeRound.objects.create(challenge=self.object, round_number=i)
+        ChallengeRound.objects.bulk_create([
+            ChallengeRound(challenge=self.object, round_number=i) for i in range(1, rounds + 1)
+        ])
 
         messages.success(self.request, 'Challenge created.')
         return redirect('challenge_detail', pk=self.object.pk)
@@ -84,71 +112,31 @@ class ChallengeDetailView(DetailView):
                 user_is_participant = False
         can_join_individual = bool(user and user.is_authenticated and (not is_creator) and (ch.mode == 'individual') and (not user_is_participant))
         # Limit to valid participants (must have user or group, and match challenge mode)
-        base_participants_qs = ch.participants.select_related('user', 'group')
-        if ch.mode == 'individual':
-            base_participants_qs = base_participants_qs.filter(user__isnull=False)
-        else:
-            base_participants_qs = base_participants_qs.filter(group__isnull=False)
-        # Defensive: still ensure at least one identifier exists
-        base_participants_qs = base_participants_qs.filter(
-            models.Q(user__isnull=False) | models.Q(group__isnull=False)
-        )
-        participants = list(base_participants_qs)
+        participants = list(valid_participants(ch))
         rounds = list(ch.rounds.select_related('quiz').order_by('round_number'))
 
-        # Compute standings
-        standings = []
-        for p in participants:
-            # Aggregate scores from linked attempts
-            if ch.mode == 'individual':
-                qs = ChallengeRoundAttempt.objects.filter(participant=p, challenge=ch, user_attempt__isnull=False).select_related('user_attempt')
-                total_score = qs.aggregate(t=Sum('user_attempt__score'))['t'] or 0
-                # Completion time: sum of durations if available
-                total_time = 0
-                for link in qs:
-                    att = link.user_attempt
-                    if getattr(att, 'completed_at', None) and getattr(att, 'created_at', None):
-                        total_time += int((att.completed_at - att.created_at).total_seconds())
-            else:
-                qs = ChallengeRoundAttempt.objects.filter(participant=p, challenge=ch, group_attempt__isnull=False).select_related('group_attempt')
-                total_score = qs.aggregate(t=Sum('group_attempt__score'))['t'] or 0
-                total_time = 0
-                for link in qs:
-                    att = link.group_attempt
-                    if getattr(att, 'completed_at', None) and getattr(att, 'created_at', None):
-                        total_time += int((att.completed_at - att.created_at).total_seconds())
-
-            standings.append({
-                'participant': p,
-                'total_score': total_score,
-                'total_time': total_time,
-            })
-
-        # Per-round winners (by highest score that round)
-        round_results = []
-        for r in rounds:
-            round_row = {'round': r, 'scores': []}
-            best_score = None
-            winners = []
-            for p in participants:
-                if ch.mode == 'individual':
-                    qs = ChallengeRoundAttempt.objects.filter(challenge=ch, round=r, participant=p, user_attempt__isnull=False).select_related('user_attempt')
-                    score = qs.aggregate(t=Sum('user_attempt__score'))['t'] or 0
-                else:
-                    qs = ChallengeRoundAttempt.objects.filter(challenge=ch, round=r, participant=p, group_attempt__isnull=False).select_related('group_attempt')
-                    score = qs.aggregate(t=Sum('group_attempt__score'))['t'] or 0
-                round_row['scores'].append({'participant': p, 'score': score})
-                if best_score is None or score > best_score:
-                    best_score = score
-                    winners = [p]
-                elif score == best_score:
-                    winners.append(p)
-            round_row['best_score'] = best_score
-            round_row['winners'] = winners
-            round_results.append(round_row)
-
-        # Overall ranking with tie-breakers: total points, then total_time (smaller is better)
-        standings_sorted = sorted(standings, key=lambda x: (-x['total_score'], x['total_time']))
+        # Standings are materialized per participant; round winners come from the stored round scores
+        standing_rows = list(
+            ch.standings.select_related('participant__user', 'participant__group').order_by('rank', 'participant_id')
+        )
+        if participants and len(standing_rows) != len(participants):
+            # Not materialized yet (older challenge, or a participant just joined)
+            rebuild_standings(ch)
+            standing_rows = list(
+                ch.standings.select_related('participant__user', 'participant__group').order_by('rank', 'participant_id')
+            )
+        standings_sorted = [
+            {
+                'participant': row.participant,
+                'rank': row.rank,
+                'total_score': row.total_score,
+                'total_time': row.total_time,
+                'rounds_won': row.rounds_won,
+            }
+            for row in standing_rows
+        ]
+        scores = stored_round_scores(ch)
+        _, round_results = compute_standings(ch, participants, rounds, scores)
         # Inline quick quiz create form (creator only)
         quiz_form = QuickQuizCreateForm()
         # Determine if any round actually has meaningful results
@@ -157,9 +145,9 @@ class ChallengeDetailView(DetailView):
             for rr in round_results
         )
         # Determine if any attempt exists for this challenge (drives standings visibility)
-        has_any_attempts = ChallengeRoundAttempt.objects.filter(challenge=ch).exists()
+        has_any_attempts = bool(scores)
         # Additionally, detect if standings contain any non-zero metric
-        has_standings_results = any((s['total_score'] or 0) > 0 or (s['total_time'] or 0) > 0 for s in standings)
+        has_standings_results = any((s['total_score'] or 0) > 0 or (s['total_time'] or 0) > 0 for s in standings_sorted)
         ctx.update({
             'participants': participants,
             'rounds': rounds,
@@ -175,9 +163,78 @@ class ChallengeDetailView(DetailView):
             'any_participant_joined': any(bool(getattr(p, 'joined_at', None)) for p in participants),
             'is_creator': is_creator,
             'can_join_individual': can_join_individual,
+            'head_to_head': self._head_to_head(ch, participants, user),
         })
         return ctx
 
+    def _head_to_head(self, ch, participants, user):
+        """Stored records of the viewer's side against the other active participants."""
+        owner = 'group_id' if ch.mode == 'group' else 'user_id'
+        sides = [getattr(p, owner) for p in participants if getattr(p, owner) and p.is_active]
+        own = set()
+        if user and user.is_authenticated:
+            if ch.mode == 'individual':
+                own = {user.pk}
+            else:
+                own = set(
+                    TriviaGroup.objects
+                    .filter(Q(captain=user) | Q(patron=user) | Q(members=user))
+                    .values_list('pk', flat=True)
+                )
+        if not own and len(sides) == 2:
+            # Onlookers of a one-on-one challenge see the two sides' record
+            own = {sides[0]}
+        opponents = set(sides) - own
+        if not own or not opponents:
+            return []
+        return list(head_to_head_records(ch.mode, own, opponents).order_by('-played'))
+
+
+class ChallengeLiveView(View):
+    """
+    Server-Sent Events stream of a challenge's standings and round winners.
+    Under the ASGI application every viewer receives the same snapshot,
+    built once per change; under WSGI the scoreboard is polled instead
+    (see home.live).
+    """
+
+    async def get(self, request, pk):
+        challenge = await Challenge.objects.filter(pk=pk).afirst()
+        if challenge is None:
+            raise Http404('Challenge not found')
+        if not isinstance(request, ASGIRequest):
+            # A held stream would tie up a WSGI worker per viewer, and the
+            # in-process broker never hears of other workers' changes
+            message = await sync_to_async(scoreboard_message)(challenge)
+            response = HttpResponse(
+                f'retry: {LIVE_SCOREBOARD_RETRY * 1000}\nevent: scoreboard\ndata: {message}\n\n',
+                content_type='text/event-stream',
+            )
+            response['Cache-Control'] = 'no-cache'
+            return response
+        broker = get_broker()
+        topic = challenge_topic(challenge.pk)
+        initial = broker.last(topic)
+        if initial is None:
+            initial = await sync_to_async(publish_scoreboard)(challenge)
+        response = StreamingHttpResponse(self.stream(broker, topic, initial), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, broker, topic, initial):
+        yield f'event: scoreboard\ndata: {initial}\n\n'
+        updates = broker.subscribe(topic, timeout=LIVE_SCOREBOARD_HEARTBEAT)
+        try:
+            async for message in updates:
+                if message is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f'event: scoreboard\ndata: {message}\n\n'
+        finally:
+            # Drop the subscription as soon as the viewer disconnects
+            await updates.aclose()
+
 
 class ChallengeListView(ListView):
     model = Challenge
@@ -190,17 +247,19 @@ class ChallengeListView(ListView):
         qs = (
             Challenge.objects
             .select_related('created_by')
-            .prefetch_related('participants__user', 'participants__group', 'rounds')
+            .prefetch_related(
+                'participants__user', 'participants__group', 'rounds',
+                Prefetch(
+                    'standings',
+                    queryset=ChallengeStanding.objects
+                    .select_related('participant__user', 'participant__group')
+                    .order_by('rank', 'participant_id'),
+                ),
+            )
         )
         # If authenticated, show challenges related to the user; otherwise show recently created challenges
         if user.is_authenticated:
-            qs = qs.filter(
-                Q(created_by=user) |
-                Q(participants__user=user) |
-                Q(participants__group__members=user) |
-                Q(participants__group__captain=user) |
-                Q(participants__group__patron=user)
-            ).distinct()
+            qs = qs.filter(pk__in=visible_challenge_ids(user))
 
         # Optional filters
         status_filter = self.request.GET.get('status')
@@ -215,10 +274,18 @@ class ChallengeListView(ListView):
         if search_query:
             qs = qs.filter(Q(name__icontains=search_query) | Q(description__icontains=search_query))
 
-        return qs.order_by('-created_at')
+        return qs.order_by('-created_at', '-pk')
+
+    def paginate_queryset(self, queryset, page_size):
+        # Keyset pagination: pages are addressed by the last challenge seen, not an offset
+        cursor = self.request.GET.get('after')
+        challenges, self.next_cursor = keyset_page(queryset, cursor, page_size)
+        return None, None, challenges, bool(cursor or self.next_cursor)
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        ctx['next_cursor'] = self.next_cursor
+        ctx['is_first_page'] = not self.request.GET.get('after')
         ctx['status_filter'] = self.request.GET.get('status', '')
         ctx['mode_filter'] = self.request.GET.get('mode', '')
         ctx['search_query'] = self.request.GET.get('q', '')
@@ -281,10 +348,8 @@ class ChallengeParticipantApproveView(LoginRequiredMixin, View):
         if not p.joined_at:
             p.joined_at = timezone.now()
         p.save(update_fields=['is_active', 'joined_at'])
-        # Activation rule: becomes active when at least 1 invitee accepted
-        if ch.status == 'pending':
-            ch.status = 'active'
-            ch.save(update_fields=['status'])
+        # Opens now only if it is due and has enough participants (see home.lifecycle)
+        activate_if_due(ch.pk)
         messages.success(request, 'Participant approved.')
         return redirect('challenge_detail', pk=pk)
 
@@ -341,41 +406,8 @@ class ChallengeQuickQuizCreateView(LoginRequiredMixin, View):
                 base_counts[primary] += 1 if diff > 0 else -1
                 total_alloc = sum(base_counts.values())
 
-            # Query available pools per difficulty
-            available = {}
-            for diff_key in ['Easy', 'Medium', 'Hard']:
-                available[diff_key] = list(
-                    Question.objects
-                    .filter(is_active=True, activities__in=activities, difficulty=diff_key)
-                    .distinct()
-                    .order_by('?')
-                )
-
-            # Take up to allocated, track shortages
-            chosen = []
-            shortages = 0
-            for diff_key, need in base_counts.items():
-                pool = available.get(diff_key, [])
-                take = min(len(pool), need)
-                if take > 0:
-                    chosen.extend(pool[:take])
-                selected_counts[diff_key] = take
-                shortages += max(0, need - take)
-
-            # Redistribute shortages across other pools with remaining items
-            if shortages > 0:
-                # Build a flat list of remaining items across difficulties
-                remaining = []
-                for diff_key, pool in available.items():
-                    already = selected_counts[diff_key]
-                    remaining.extend(pool[already:])
-                # Already randomized by order_by('?'), so just slice
-                if remaining:
-                    extra = remaining[:shortages]
-                    chosen.extend(extra)
-                    # Update counts per difficulty for reporting
-                    for q in extra:
-                        selected_counts[q.difficulty] = selected_counts.get(q.difficulty, 0) + 1
+            # Draw from cached candidate ids; only the chosen rows are fetched
+            chosen, selected_counts = sample_questions([a.pk for a in activities], base_counts)
 
             # Trim in case of overfill (defensive)
             chosen = chosen[:quiz_size]
@@ -479,6 +511,9 @@ class ChurchDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['trivia_groups'] = self.object.trivia_groups.filter(is_active=True)
+        ranking = ChurchRanking.objects.filter(church=self.object).first()
+        context['ranking'] = ranking
+        context['church_rank'] = position('church', ranking.points) if ranking and self.object.is_active else None
         return context
 
 
@@ -566,6 +601,12 @@ class TriviaGroupDetailView(DetailView):
             .order_by('-group_points', '-answers_count', 'first_name')
         )
         context['members_with_stats'] = members_with_stats
+        # Record against the most-played rivals (materialized by home.head_to_head)
+        context['head_to_head'] = (
+            self.object.head_to_head
+            .select_related('opponent')
+            .order_by('-played', '-last_played_at')[:10]
+        )
         return context
 
 
@@ -669,8 +710,33 @@ class ChurchListView(ListView):
     context_object_name = 'churches'
     paginate_by = 12
     
+    SORT_CHOICES = [
+        ('name', 'Name'),
+        ('points', 'Points'),
+        ('rating', 'Rating'),
+        ('wins', 'Challenge Wins'),
+    ]
+    SORT_ORDERING = {
+        'points': (F('ranking__points').desc(nulls_last=True), 'name'),
+        'rating': (F('ranking__rating').desc(nulls_last=True), 'name'),
+        'wins': (F('ranking__challenge_wins').desc(nulls_last=True), 'name'),
+    }
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort', 'name')
+        return sort if sort in self.SORT_ORDERING else 'name'
+
     def get_queryset(self):
-        queryset = Church.objects.filter(is_active=True).select_related('category').order_by('name')
+        queryset = (
+            Church.objects
+            .filter(is_active=True)
+            .select_related('category', 'ranking')
+            .order_by(*self.SORT_ORDERING.get(self.get_sort(), ('name',)))
+        )
+
+        # Competitive standing filter (reads the ChurchRanking rollup)
+        if self.request.GET.get('competing'):
+            queryset = queryset.filter(ranking__points__gt=0)
         
         # Search functionality
         search_query = self.request.GET.get('search', '')
@@ -699,6 +765,9 @@ class ChurchListView(ListView):
         context['search_query'] = self.request.GET.get('search', '')
         context['category_filter'] = self.request.GET.get('category', '')
         context['location_filter'] = self.request.GET.get('location', '')
+        context['sort'] = self.get_sort()
+        context['sort_choices'] = self.SORT_CHOICES
+        context['competing'] = bool(self.request.GET.get('competing'))
         context['categories'] = Church.objects.values_list('category__name', 'category__slug').distinct()
         context['locations'] = Church.objects.values_list('location', flat=True).distinct().exclude(location='')
         context['total_churches'] = self.get_queryset().count()
@@ -1155,32 +1224,32 @@ class UserPerformanceView(DetailView):
         # Memberships
         context['member_groups'] = user.trivia_groups.all()
 
-        # Ranking chart data from UserRanking.metadata (monthly buckets {'YYYY-MM': points})
-        try:
-            ranking = getattr(user, 'ranking', None)
-            meta = (ranking.metadata or {}) if ranking else {}
-            # Build last 6 months window to ensure chart has axes
-            from datetime import date
-            today = timezone.now().date()
-            months = []
-            y, m = today.year, today.month
-            for _ in range(6):
-                months.append(f"{y:04d}-{m:02d}")
-                m -= 1
-                if m == 0:
-                    m = 12
-                    y -= 1
-            months.reverse()
-            # If meta has keys outside window, merge and sort
-            keys = set(months) | set(meta.keys())
-            labels = sorted(keys)
-            data = [int((meta or {}).get(k, 0) or 0) for k in labels]
-            context['ranking_chart_labels_json'] = json.dumps(labels)
-            context['ranking_chart_data_json'] = json.dumps(data)
-        except Exception:
-            # Fallback to empty series
-            context['ranking_chart_labels_json'] = json.dumps([])
-            context['ranking_chart_data_json'] = json.dumps([])
+        # Ranking chart data: the user's monthly buckets over the last 12 months
+        today = timezone.localdate()
+        months = []
+        y, m = today.year, today.month
+        for _ in range(12):
+            months.append(f"{y:04d}-{m:02d}")
+            m -= 1
+            if m == 0:
+                m = 12
+                y -= 1
+        labels = months[::-1]
+        buckets = {
+            start.strftime('%Y-%m'): points
+            for start, points in RankingBucket.objects
+            .filter(user=user, granularity='month', period_start__gte=date.fromisoformat(f'{labels[0]}-01'))
+            .values_list('period_start', 'points')
+        }
+        # Points from before the buckets were kept only exist in the old
+        # {'YYYY-MM': points} history on UserRanking.metadata; the month the
+        # buckets started in has points in both, so the two are added
+        history = UserRanking.objects.filter(user=user).values_list('metadata', flat=True).first() or {}
+        for label in labels:
+            if label in history:
+                buckets[label] = buckets.get(label, 0) + int(history[label] or 0)
+        context['ranking_chart_labels_json'] = json.dumps(labels)
+        context['ranking_chart_data_json'] = json.dumps([buckets.get(label, 0) for label in labels])
 
         return context
 
@@ -1616,30 +1685,32 @@ class TriviaGroupListView(ListView):
         return context
 
 
-class LeaderboardView(TemplateView):
+class LeaderboardView(ListView):
     template_name = 'home/leaderboard.html'
-    
+    context_object_name = 'entries'
+    paginate_by = 20
+
+    def get_board(self):
+        board = self.request.GET.get('board')
+        return board if board in BOARDS else 'individual'
+
+    def get_period(self):
+        period = self.request.GET.get('period')
+        return period if period in PERIODS else None
+
+    def get_queryset(self):
+        self.snapshot = get_snapshot(self.get_board(), self.get_period())
+        return self.snapshot['rows']
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Top performing groups
-        top_groups = TriviaGroup.objects.filter(
-            is_active=True, 
-            total_competitions__gt=0
-        ).order_by('-average_score', '-wins')[:10]
-        
-        # Top performing churches
-        top_churches = Church.objects.filter(
-            is_active=True,
-            trivia_groups__total_competitions__gt=0
-        ).annotate(
-            total_wins=models.Sum('trivia_groups__wins'),
-            total_competitions=models.Sum('trivia_groups__total_competitions'),
-            avg_score=models.Avg('trivia_groups__average_score')
-        ).order_by('-avg_score', '-total_wins')[:10]
-        
-        context['top_groups'] = top_groups
-        context['top_churches'] = top_churches
+        board = self.get_board()
+        period = self.get_period()
+        context['board'] = board
+        context['boards'] = BOARDS
+        context['period'] = period
+        context['periods'] = PERIODS
+        context['my_positions'] = snapshot_positions(self.snapshot, user_entries(board, self.request.user))
         return context
 
 
@@ -1713,16 +1784,18 @@ class QuizDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        quiz = self.get_object()
+        quiz = self.object
+        payload = get_quiz_payload(quiz)
         
         # Check if user can access this quiz
         context['can_take_quiz'] = quiz.is_available_to_user(self.request.user)
-        context['question_count'] = quiz.get_question_count()
-        context['estimated_duration'] = quiz.get_estimated_duration()
-        context['total_points'] = quiz.calculate_total_points()
+        context['question_count'] = payload['question_count']
+        context['estimated_duration'] = payload['estimated_duration']
+        context['total_points'] = payload['total_points']
         
         # Get questions for preview
-        context['questions'] = quiz.questions.all()[:5]  # Show first 5 questions
+        context['questions'] = payload['questions'][:5]  # Show first 5 questions
+        context['remaining_question_count'] = max(0, payload['question_count'] - 5)
         
         # Provide user groups for quick launch as group
         user = self.request.user
@@ -1743,8 +1816,16 @@ class QuizTakeView(DetailView):
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
     
+    def get_object(self, queryset=None):
+        # dispatch() already loaded the quiz; avoid re-fetching it per method
+        quiz = getattr(self, 'quiz', None)
+        if quiz is not None:
+            return quiz
+        return super().get_object(queryset)
+
     def dispatch(self, request, *args, **kwargs):
         self.quiz = self.get_object()
+        self.payload = get_quiz_payload(self.quiz)
         # In this view we allow anonymous users to take public quizzes even if requires_authentication is True
         # Still block inactive quizzes, and block non-public quizzes for anonymous users
         if not self.quiz.is_active:
@@ -1756,7 +1837,7 @@ class QuizTakeView(DetailView):
             return redirect('quiz_detail', slug=self.quiz.slug)
 
         # Check if quiz has questions
-        if self.quiz.get_question_count() == 0:
+        if self.payload['question_count'] == 0:
             messages.error(request, 'This quiz has no questions.')
             return redirect('quiz_detail', slug=self.quiz.slug)
 
@@ -1787,38 +1868,154 @@ class QuizTakeView(DetailView):
         if self.quiz.participation == 'Individual':
             self.selected_group = None
 
+        # Stepwise mode: signed-in takers get pages saved into a started attempt
+        self.stepwise = request.user.is_authenticated and (
+            request.GET.get('stepwise') in ['1', 'true', 'True', 'yes', 'on']
+            or bool((self.quiz.metadata or {}).get('stepwise'))
+            or self.payload['question_count'] > QUIZ_STEPWISE_THRESHOLD
+        )
+
         return super().dispatch(request, *args, **kwargs)
+
+    def _page_bounds(self, raw_page):
+        page_count = max(1, -(-self.payload['question_count'] // QUIZ_PAGE_SIZE))
+        try:
+            page = int(raw_page or 1)
+        except (TypeError, ValueError):
+            page = 1
+        page = min(max(page, 1), page_count)
+        return page, page_count
+
+    def _take_url(self, **params):
+        query = {}
+        if self.selected_group:
+            query['group_id'] = self.selected_group.id
+        if self.request.GET.get('stepwise'):
+            query['stepwise'] = self.request.GET['stepwise']
+        query.update(params)
+        url = reverse('quiz_take', kwargs={'slug': self.quiz.slug})
+        return f'{url}?{urlencode(query)}' if query else url
+
+    def _store_results(self, answer_key, score, correct_answers, **extra):
+        total_points = sum(entry.points for entry in answer_key.entries.values())
+        percentage = (score / total_points * 100) if total_points > 0 else 0
+        self.request.session['quiz_results'] = {
+            'quiz_id': self.quiz.id,
+            'quiz_name': self.quiz.name,
+            'score': score,
+            'total_points': total_points,
+            'percentage': round(percentage, 1),
+            'correct_answers': correct_answers,
+            'total_questions': len(answer_key.question_ids),
+            'passed': percentage >= self.quiz.passing_score,
+            'timestamp': timezone.now().isoformat(),
+            **extra,
+        }
     
+    def _submission_deadline(self, group_id=None):
+        """
+        (deadline, rejection) for a single-page take, timed from when its page
+        was first rendered. A timed quiz posted without a recorded start, or
+        past its deadline, gets a rejection response instead.
+        """
+        started_at = pop_session_started_at(self.request.session, self.quiz.id, group_id)
+        if started_at is None:
+            if self.quiz.time_limit:
+                return None, self._reject_ended_session(group_id)
+            return None, None
+        deadline = attempt_deadline(self.quiz, started_at)
+        if is_past_deadline(deadline):
+            return deadline, self._reject_late(group_id)
+        return deadline, None
+
+    def _reject_ended_session(self, group_id=None):
+        pop_session_seed(self.request.session, self.quiz.id, group_id)
+        messages.error(self.request, 'Your quiz session has ended. Please start again.')
+        return redirect('quiz_detail', slug=self.quiz.slug)
+
+    def _reject_late(self, group_id=None):
+        pop_session_seed(self.request.session, self.quiz.id, group_id)
+        messages.error(self.request, 'Time is up. Your answers arrived after the time limit and were not recorded.')
+        return redirect('quiz_detail', slug=self.quiz.slug)
+
+    def _reject_attempt_limit(self):
+        messages.error(self.request, 'You have used all attempts allowed for this quiz.')
+        return redirect('quiz_detail', slug=self.quiz.slug)
+
+    def get(self, request, *args, **kwargs):
+        self.attempt = None
+        if self.stepwise:
+            self.attempt = get_started_attempt(self.quiz, request.user, self.selected_group)
+            if self.attempt is not None and is_past_deadline(self.attempt.deadline):
+                # Time ran out while away: score only what was saved in time
+                messages.warning(request, 'Time is up. Answers saved before the time limit were scored.')
+                return self._finish_stepwise(self.attempt, get_answer_key(self.quiz))
+            # No attempt is opened (or counted) until the first page is saved
+            if self.attempt is None and not has_attempts_left(self.quiz, request.user, self.selected_group):
+                return self._reject_attempt_limit()
+        elif request.user.is_authenticated and not has_attempts_left(self.quiz, request.user, self.selected_group):
+            return self._reject_attempt_limit()
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        quiz = self.get_object()
-        
-        # Get all questions for the quiz
-        questions = quiz.questions.all().prefetch_related('choices')
-        # Mark questions that should allow multiple selection and collect their ids
-        allow_multiple_ids = []
+        quiz = self.object
+        payload = self.payload
+        questions = payload['questions']
+        saved = {}
+        question_offset = 0
+        group_id = self.selected_group.id if self.selected_group else None
+
+        if self.stepwise:
+            attempt = self.attempt
+            if attempt is not None:
+                shuffle_seed = attempt.shuffle_seed
+                deadline = attempt.deadline
+                saved = saved_answers(attempt)
+            else:
+                # Not started yet: the clock and choice order come from the session
+                shuffle_seed = get_session_seed(self.request.session, quiz.id, group_id)
+                deadline = attempt_deadline(quiz, get_session_started_at(self.request.session, quiz, group_id))
+            page, page_count = self._page_bounds(self.request.GET.get('page'))
+            question_offset = (page - 1) * QUIZ_PAGE_SIZE
+            questions = questions[question_offset:question_offset + QUIZ_PAGE_SIZE]
+            context.update({
+                'stepwise': True,
+                'page_number': page,
+                'page_count': page_count,
+                'is_last_page': page == page_count,
+                'attempt': attempt,
+            })
+        else:
+            shuffle_seed = get_session_seed(self.request.session, quiz.id, group_id)
+            context['submission_token'] = new_submission_token()
+            deadline = None
+            if quiz.time_limit:
+                deadline = attempt_deadline(quiz, get_session_started_at(self.request.session, quiz, group_id))
+
+        # Serialized questions from the cached payload; choices get the taker's seeded order
+        # and, in stepwise mode, any answers already saved for this attempt
+        page_questions = []
         for q in questions:
-            try:
-                correct_count = q.choices.filter(is_correct=True).count()
-            except Exception:
-                correct_count = 0
-            q.allow_multiple = (getattr(q, 'question_type', 'single') == 'multiple') or (correct_count > 1)
-            # Debug print for server logs
-            try:
-                print(f"[QUIZ_TAKE] quiz={quiz.slug} qid={q.id} correct_count={correct_count} qtype={getattr(q, 'question_type', None)} allow_multiple={q.allow_multiple}")
-            except Exception:
-                pass
-            if q.allow_multiple:
-                allow_multiple_ids.append(q.id)
-            # Randomize choices for display
-            try:
-                q.shuffled_choices = list(q.choices.all().order_by('?'))
-            except Exception:
-                q.shuffled_choices = list(q.choices.all())
-        context['questions'] = questions
-        context['allow_multiple_ids'] = allow_multiple_ids
-        context['question_count'] = questions.count()
-        context['time_limit'] = quiz.time_limit
+            selected_ids, saved_text = saved.get(q['id'], (set(), ''))
+            page_questions.append(dict(
+                q,
+                saved_text=saved_text,
+                shuffled_choices=[
+                    dict(c, selected=c['id'] in selected_ids)
+                    for c in seeded_shuffle(q['choices'], shuffle_seed, q['id'])
+                ],
+            ))
+        context['questions'] = page_questions
+        context['question_offset'] = question_offset
+        context['allow_multiple_ids'] = payload['allow_multiple_ids']
+        context['question_count'] = payload['question_count']
+        context['estimated_duration'] = payload['estimated_duration']
+        context['time_limit'] = payload['time_limit']
+        # Seconds left on the server-side clock; the page timer never runs past it
+        context['time_remaining'] = (
+            max(0, int((deadline - timezone.now()).total_seconds())) if deadline else None
+        )
         context['instructions'] = quiz.instructions
         # Participation selection is done on detail page; hide in-page selection
         user = self.request.user
@@ -1827,87 +2024,107 @@ class QuizTakeView(DetailView):
         context['requires_group'] = False
         
         return context
+
+    def post_stepwise(self, request, answer_key):
+        """Save one page into the started attempt; finalize after the last page."""
+        quiz = self.quiz
+        user = request.user
+        attempt = get_started_attempt(quiz, user, self.selected_group)
+        if attempt is None:
+            # First saved page: open the attempt, timed from when the quiz was first shown
+            group_id = self.selected_group.id if self.selected_group else None
+            started_at = pop_session_started_at(request.session, quiz.id, group_id)
+            if started_at is None:
+                return self._reject_ended_session(group_id)
+            deadline = attempt_deadline(quiz, started_at)
+            if is_past_deadline(deadline):
+                return self._reject_late(group_id)
+            try:
+                attempt = start_attempt(
+                    quiz, user, self.selected_group,
+                    shuffle_seed=get_session_seed(request.session, quiz.id, group_id),
+                    deadline=deadline,
+                )
+            except AttemptLimitReached:
+                return self._reject_attempt_limit()
+
+        if is_past_deadline(attempt.deadline):
+            # Late page is dropped; the attempt is scored on what was saved in time
+            messages.warning(request, 'Time is up. Answers saved before the time limit were scored.')
+            return self._finish_stepwise(attempt, answer_key)
+
+        page, page_count = self._page_bounds(request.POST.get('page'))
+        offset = (page - 1) * QUIZ_PAGE_SIZE
+        page_ids = answer_key.question_ids[offset:offset + QUIZ_PAGE_SIZE]
+        save_page_responses(attempt, user, grade_submission(answer_key, request.POST, question_ids=page_ids))
+
+        action = request.POST.get('action')
+        if action == 'prev':
+            return redirect(self._take_url(page=max(1, page - 1)))
+        if page < page_count and action != 'finish':
+            return redirect(self._take_url(page=page + 1))
+        return self._finish_stepwise(attempt, answer_key)
+
+    def _replay_submission(self, attempt, answer_key):
+        attempt_type = 'group' if isinstance(attempt, GroupTestQuizAttempt) else 'individual'
+        results = self.request.session.get('quiz_results') or {}
+        if (results.get('attempt_id'), results.get('attempt_type')) != (attempt.id, attempt_type):
+            # The first response never reached this session; rebuild its summary
+            correct_answers = attempt.responses.filter(points_awarded__gt=0).count()
+            self._store_results(
+                answer_key, attempt.score, correct_answers,
+                attempt_id=attempt.id,
+                attempt_type=attempt_type,
+            )
+        return redirect('quiz_results', slug=self.quiz.slug)
+
+    def _finish_stepwise(self, attempt, answer_key):
+        quiz = self.quiz
+        request = self.request
+        responses = finalize_attempt(attempt, request.user, answer_key)
+        if responses is None:
+            # Another request finalized this attempt first
+            return redirect('quiz_results', slug=quiz.slug)
+        pop_session_seed(request.session, quiz.id, self.selected_group.id if self.selected_group else None)
+        self._store_results(
+            answer_key,
+            attempt.score,
+            sum(1 for resp in responses if resp.points_awarded > 0),
+            attempt_id=attempt.id,
+            attempt_type='group' if self.selected_group else 'individual',
+        )
+        return redirect('quiz_results', slug=quiz.slug)
     
     def post(self, request, *args, **kwargs):
-        quiz = self.get_object()
-
-        # Process quiz submission
-        questions = quiz.questions.all()
-        score = 0
-        total_points = 0
-        correct_answers = 0
-        # For results page deep-link to review
-        attempt_id_for_results = None
-        attempt_type_for_results = None
-
-        # Helper to score a single question using POST data; returns (points_awarded, selected_choice_ids, text_answer)
-        def score_question(question):
-            if question.question_type == 'open':
-                ta = request.POST.get(f'question_{question.id}_text', '').strip()
-                return 0, [], ta
-            name = f'question_{question.id}'
-            ids = request.POST.getlist(name)
-            # If user selected only one or the form used radios, fallback to single value
-            if not ids:
-                cid = request.POST.get(name)
-                if not cid:
-                    return 0, [], ''
-                try:
-                    c = Choice.objects.get(id=cid, question=question)
-                except Choice.DoesNotExist:
-                    return 0, [], ''
-                pts = question.points if c.is_correct else 0
-                return pts, [c.id], ''
-            # Multiple selection path
-            choices = list(Choice.objects.filter(id__in=ids, question=question))
-            if not choices:
-                return 0, [], ''
-            selected_set = {c.id for c in choices}
-            correct_set = set(question.choices.filter(is_correct=True).values_list('id', flat=True))
-            denom = len(correct_set)
-            if denom == 0:
-                return 0, list(selected_set), ''
-            if question.penalty == 0:
-                correct_selected = len(selected_set & correct_set)
-                pts = int(round(question.points * (correct_selected / denom))) if correct_selected > 0 else 0
-            else:
-                correct_selected = len(selected_set & correct_set)
-                wrong_selected = len(selected_set - correct_set)
-                base = question.points * (correct_selected / denom)
-                pts = int(round(base - (question.penalty * wrong_selected)))
-                if pts < 0:
-                    pts = 0
-            return pts, list(selected_set), ''
+        quiz = self.quiz
+
+        # Grade the submission in memory against the compiled (cached) answer key
+        answer_key = get_answer_key(quiz)
+        if self.stepwise:
+            return self.post_stepwise(request, answer_key)
 
         # Anonymous users: session-only practice flow (store selections for review)
         if not request.user.is_authenticated:
-            selections = []
-            for question in questions:
-                total_points += question.points
-                pts, selected_ids, text_answer = score_question(question)
-                score += pts
-                if pts > 0:
-                    correct_answers += 1
-                selections.append({
-                    'question_id': question.id,
-                    'selected_ids': selected_ids,
-                    'text_answer': text_answer,
-                })
-
-            percentage = (score / total_points * 100) if total_points > 0 else 0
-            passed = percentage >= quiz.passing_score
-            request.session['quiz_results'] = {
-                'quiz_id': quiz.id,
-                'quiz_name': quiz.name,
-                'score': score,
-                'total_points': total_points,
-                'percentage': round(percentage, 1),
-                'correct_answers': correct_answers,
-                'total_questions': questions.count(),
-                'passed': passed,
-                'timestamp': timezone.now().isoformat(),
-                'selections': selections,
-            }
+            _, rejection = self._submission_deadline()
+            if rejection is not None:
+                return rejection
+            graded = grade_submission(answer_key, request.POST)
+            score = sum(answer.points_awarded for answer in graded)
+            correct_answers = sum(1 for answer in graded if answer.points_awarded > 0)
+            shuffle_seed = pop_session_seed(request.session, quiz.id)
+            selections = [
+                {
+                    'question_id': answer.question_id,
+                    'selected_ids': answer.selected_ids,
+                    'text_answer': answer.text_answer,
+                }
+                for answer in graded
+            ]
+            self._store_results(
+                answer_key, score, correct_answers,
+                selections=selections,
+                shuffle_seed=shuffle_seed,
+            )
             return redirect('quiz_results', slug=quiz.slug)
 
         # Authenticated users: persist attempts and responses
@@ -1926,100 +2143,52 @@ class QuizTakeView(DetailView):
             except TriviaGroup.DoesNotExist:
                 group = None
 
-        if use_group:
-            # Compute next attempt number for this group/quiz
-            next_num = (GroupTestQuizAttempt.objects.filter(quiz=quiz, group=group).count() + 1)
-            attempt = GroupTestQuizAttempt.objects.create(
-                quiz=quiz,
-                group=group,
-                initiated_by=user,
-                attempt_number=next_num,
-                status='completed',
-            )
-            for question in questions:
-                total_points += question.points
-                pts, selected_ids, text_answer = score_question(question)
-                score += pts
-                if pts > 0:
-                    correct_answers += 1
-                # Build metadata for penalty accounting
-                correct_set = set(question.choices.filter(is_correct=True).values_list('id', flat=True))
-                selected_set = set(selected_ids)
-                wrong_selected = len(selected_set - correct_set) if selected_set else 0
-                resp_meta = {
-                    'wrong_selected': wrong_selected,
-                    'question_penalty': int(getattr(question, 'penalty', 0) or 0),
-                }
-                resp = GroupResponse.objects.create(
-                    attempt=attempt,
-                    group=group,
-                    question=question,
-                    responded_by=user,
-                    text_answer=text_answer or None,
-                    points_awarded=pts,
-                    metadata=resp_meta,
-                )
-                if selected_ids:
-                    resp.selected_choices.set(selected_ids)
-            attempt.score = score
-            attempt.completed_at = timezone.now()
-            attempt.save(update_fields=['score', 'completed_at'])
-            attempt_id_for_results = attempt.id
-            attempt_type_for_results = 'group'
-        else:
-            # Individual attempt
-            next_num = (TestQuizAttempt.objects.filter(quiz=quiz, user=user).count() + 1)
-            attempt = TestQuizAttempt.objects.create(
-                quiz=quiz,
-                user=user,
-                attempt_number=next_num,
-                status='completed',
-            )
-            for question in questions:
-                total_points += question.points
-                pts, selected_ids, text_answer = score_question(question)
-                score += pts
-                if pts > 0:
-                    correct_answers += 1
-                # Build metadata for penalty accounting
-                correct_set = set(question.choices.filter(is_correct=True).values_list('id', flat=True))
-                selected_set = set(selected_ids)
-                wrong_selected = len(selected_set - correct_set) if selected_set else 0
-                resp_meta = {
-                    'wrong_selected': wrong_selected,
-                    'question_penalty': int(getattr(question, 'penalty', 0) or 0),
-                }
-                resp = UserResponse.objects.create(
-                    attempt=attempt,
-                    question=question,
-                    text_answer=text_answer or None,
-                    points_awarded=pts,
-                    metadata=resp_meta,
-                )
-                if selected_ids:
-                    resp.selected_choices.set(selected_ids)
-            attempt.score = score
-            attempt.completed_at = timezone.now()
-            attempt.save(update_fields=['score', 'completed_at'])
-            attempt_id_for_results = attempt.id
-            attempt_type_for_results = 'individual'
+        # A retried or double-clicked submit replays the attempt it already created
+        token = request.POST.get('submission_token') or None
+        previous = find_submitted_attempt(token, quiz, user=user, group=group if use_group else None)
+        if previous is not None:
+            return self._replay_submission(previous, answer_key)
+
+        session_group_id = group.id if use_group else None
+        deadline, rejection = self._submission_deadline(session_group_id)
+        if rejection is not None:
+            return rejection
+
+        graded = grade_submission(answer_key, request.POST)
+        score = sum(answer.points_awarded for answer in graded)
+        correct_answers = sum(1 for answer in graded if answer.points_awarded > 0)
+
+        # Record the seed the taker saw so the review can reproduce choice order
+        shuffle_seed = pop_session_seed(request.session, quiz.id, session_group_id) or ''
+
+        # Attempt, responses and selected choices are written in one transaction
+        attempt_fields = {'shuffle_seed': shuffle_seed, 'deadline': deadline, 'submission_token': token}
+        try:
+            if use_group:
+                attempt = save_group_attempt(quiz, group, user, graded, **attempt_fields)
+                attempt_type_for_results = 'group'
+            else:
+                attempt = save_user_attempt(quiz, user, graded, **attempt_fields)
+                attempt_type_for_results = 'individual'
+        except AttemptLimitReached:
+            return self._reject_attempt_limit()
+        except IntegrityError:
+            # A concurrent request with the same token won the insert
+            previous = find_submitted_attempt(token, quiz, user=user, group=group if use_group else None)
+            if previous is None:
+                if not token:
+                    raise
+                # Token belongs to someone else's attempt
+                messages.error(request, 'This submission could not be recorded. Please take the quiz again.')
+                return redirect('quiz_detail', slug=quiz.slug)
+            return self._replay_submission(previous, answer_key)
 
         # Store summary for results page
-        percentage = (score / total_points * 100) if total_points > 0 else 0
-        passed = percentage >= quiz.passing_score
-        request.session['quiz_results'] = {
-            'quiz_id': quiz.id,
-            'quiz_name': quiz.name,
-            'score': score,
-            'total_points': total_points,
-            'percentage': round(percentage, 1),
-            'correct_answers': correct_answers,
-            'total_questions': questions.count(),
-            'passed': passed,
-            'timestamp': timezone.now().isoformat(),
-            'attempt_id': attempt_id_for_results if request.user.is_authenticated else None,
-            'attempt_type': attempt_type_for_results if request.user.is_authenticated else None,
-        }
+        self._store_results(
+            answer_key, score, correct_answers,
+            attempt_id=attempt.id,
+            attempt_type=attempt_type_for_results,
+        )
         return redirect('quiz_results', slug=quiz.slug)
 
 
@@ -2035,29 +2204,31 @@ class QuizResultsView(DetailView):
         
         # Get results from session
         results = self.request.session.get('quiz_results', {})
-        if not results or results.get('quiz_id') != self.get_object().id:
+        if not results or results.get('quiz_id') != self.object.id:
             messages.error(self.request, 'No quiz results found.')
-            return redirect('quiz_detail', slug=self.get_object().slug)
+            return redirect('quiz_detail', slug=self.object.slug)
         
         context['results'] = results
         # For anonymous users, build a lightweight review dataset
         if not self.request.user.is_authenticated:
             selections = results.get('selections') or []
-            q_by_id = {q.id: q for q in self.get_object().questions.all().prefetch_related('choices')}
+            q_by_id = {q['id']: q for q in get_quiz_payload(self.object)['questions']}
             review_items = []
             for s in selections:
                 q = q_by_id.get(s.get('question_id'))
                 if not q:
                     continue
-                correct_ids = set(q.choices.filter(is_correct=True).values_list('id', flat=True))
+                choices = seeded_shuffle(q['choices'], results.get('shuffle_seed'), q['id'])
+                correct_ids = {c['id'] for c in choices if c['is_correct']}
                 selected_ids = set(s.get('selected_ids') or [])
                 review_items.append({
                     'question': q,
+                    'choices': choices,
                     'selected_ids': selected_ids,
                     'correct_ids': correct_ids,
-                    'is_correct': (selected_ids == correct_ids) if q.question_type != 'open' else None,
+                    'is_correct': (selected_ids == correct_ids) if q['question_type'] != 'open' else None,
                     'text_answer': s.get('text_answer') or '',
-                    'points': q.points,
+                    'points': q['points'],
                 })
             context['anon_review_items'] = review_items
         return context
@@ -2109,10 +2280,13 @@ class AttemptReviewView(LoginRequiredMixin, DetailView):
         items = []
         for resp in responses:
             q = resp.question
-            correct_ids = set(q.choices.filter(is_correct=True).values_list('id', flat=True))
-            selected_ids = set(resp.selected_choices.values_list('id', flat=True))
+            # Use prefetched rows; replay the choice order the taker saw
+            choices = seeded_shuffle(q.choices.all(), attempt.shuffle_seed, q.id)
+            correct_ids = {c.id for c in choices if c.is_correct}
+            selected_ids = {c.id for c in resp.selected_choices.all()}
             items.append({
                 'question': q,
+                'choices': choices,
                 'selected_ids': selected_ids,
                 'correct_ids': correct_ids,
                 'is_correct': (selected_ids == correct_ids) if q.question_type != 'open' else None,
@@ -2183,10 +2357,13 @@ class GroupAttemptReviewView(LoginRequiredMixin, DetailView):
         items = []
         for resp in responses:
             q = resp.question
-            correct_ids = set(q.choices.filter(is_correct=True).values_list('id', flat=True))
-            selected_ids = set(resp.selected_choices.values_list('id', flat=True))
+            # Use prefetched rows; replay the choice order the taker saw
+            choices = seeded_shuffle(q.choices.all(), attempt.shuffle_seed, q.id)
+            correct_ids = {c.id for c in choices if c.is_correct}
+            selected_ids = {c.id for c in resp.selected_choices.all()}
             items.append({
                 'question': q,
+                'choices': choices,
                 'selected_ids': selected_ids,
                 'correct_ids': correct_ids,
                 'is_correct': (selected_ids == correct_ids) if q.question_type != 'open' else None,
@@ -0,0 +1,100 @@
+"""
+Index of which users can see which challenges.
+
+A user sees a challenge they created, take part in directly, or whose
+participating group they belong to, captain or patron. Those facts are
+kept in ChallengeVisibility as (user, challenge, reason) rows, so a
+challenge list is one indexed lookup on user instead of five joins and a
+DISTINCT. Rows are recomputed per challenge whenever its creator, its
+participants or one of its groups change (see ``home.signals``); only the
+difference against the stored rows is written.
+"""
+from django.db import transaction
+
+from .models import Challenge, ChallengeParticipant, ChallengeVisibility, TriviaGroup
+
+
+def _expected_rows(challenge_ids):
+    """Set of (user_id, challenge_id, reason) the given challenges should have."""
+    rows = set()
+    for challenge_id, creator_id in Challenge.objects.filter(pk__in=challenge_ids).values_list('pk', 'created_by_id'):
+        rows.add((creator_id, challenge_id, 'creator'))
+    participants = (
+        ChallengeParticipant.objects
+        .filter(challenge_id__in=challenge_ids)
+        .values_list('challenge_id', 'user_id', 'group_id', 'group__captain_id', 'group__patron_id')
+    )
+    challenges_by_group = {}
+    for challenge_id, user_id, group_id, captain_id, patron_id in participants:
+        if user_id:
+            rows.add((user_id, challenge_id, 'participant'))
+        if group_id:
+            challenges_by_group.setdefault(group_id, set()).add(challenge_id)
+            rows.add((captain_id, challenge_id, 'captain'))
+            rows.add((patron_id, challenge_id, 'patron'))
+    if challenges_by_group:
+        members = (
+            TriviaGroup.objects
+            .filter(pk__in=list(challenges_by_group), members__isnull=False)
+            .values_list('pk', 'members')
+        )
+        for group_id, user_id in members:
+            for challenge_id in challenges_by_group[group_id]:
+                rows.add((user_id, challenge_id, 'member'))
+    return rows
+
+
+def refresh_challenge_visibility(*challenge_ids):
+    """Bring the visibility rows of the given challenges up to date."""
+    challenge_ids = list({pk for pk in challenge_ids if pk})
+    if not challenge_ids:
+        return
+    with transaction.atomic():
+        expected = _expected_rows(challenge_ids)
+        stored = dict(
+            ((user_id, challenge_id, reason), pk)
+            for pk, user_id, challenge_id, reason in ChallengeVisibility.objects
+            .filter(challenge_id__in=challenge_ids)
+            .values_list('pk', 'user_id', 'challenge_id', 'reason')
+        )
+        stale = [pk for row, pk in stored.items() if row not in expected]
+        if stale:
+            ChallengeVisibility.objects.filter(pk__in=stale).delete()
+        ChallengeVisibility.objects.bulk_create(
+            [
+                ChallengeVisibility(user_id=user_id, challenge_id=challenge_id, reason=reason)
+                for user_id, challenge_id, reason in expected
+                if (user_id, challenge_id, reason) not in stored
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+def refresh_group_visibility(*group_ids):
+    """Refresh every challenge the given groups take part in."""
+    refresh_challenge_visibility(*set(
+        ChallengeParticipant.objects
+        .filter(group_id__in=[pk for pk in group_ids if pk])
+        .values_list('challenge_id', flat=True)
+    ))
+
+
+def rebuild_visibility(batch_size=500):
+    """Recompute the whole index, ``batch_size`` challenges at a time; returns challenges processed."""
+    challenge_ids = Challenge.objects.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    last_pk = 0
+    while True:
+        batch = list(challenge_ids.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1]
+        refresh_challenge_visibility(*batch)
+        total += len(batch)
+    return total
+
+
+def visible_challenge_ids(user):
+    """Subquery of the ids of the challenges ``user`` can see."""
+    return ChallengeVisibility.objects.filter(user=user).values('challenge_id')